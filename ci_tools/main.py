@@ -12,7 +12,11 @@ from python.utils.filesystem_util import *
 from python.build.build_manager import *
 from python.container.container_manager import *
 from python.release.release import *
+from python.release.release_manifest import apply_delta
+from python.release.seekable_zstd import extract_members
 from python.executor.command_executor import *
+from python.build.build_telemetry import BuildTelemetry, TELEMETRY_DB_NAME
+import concurrent.futures
 
 
 logger = get_logger()
@@ -36,8 +40,11 @@ class MainApplication:
         pass
         # FilesystemUtil.create_dir(OUTPUT_DIR, empty_if_exists=True)
 
-    def check_os_info(self):
-        os_type, os_version, os_arch = self.os_info
+    def get_matrix_os_infos(self):
+        return [tuple(target.split(",")) for target in self.args.matrix.split(";") if target.strip()]
+
+    def check_os_info(self, os_info=None):
+        os_type, os_version, os_arch = os_info or self.os_info
         assert os_arch in SUPPORTED_ARCHS
         assert os_type in SUPPORTED_OS
 
@@ -49,6 +56,8 @@ class MainApplication:
                             help='The components to be build, donat split')
         parser.add_argument('-install-nexus', action='store_true', help='install nexus ')
         parser.add_argument('-upload-nexus', action='store_true', help='upload components rpms to nexus')
+        parser.add_argument('-retry-failed-uploads', action='store_true',
+                            help='upload again only the packages that failed in previous nexus uploads')
         parser.add_argument('-repo-sync', action='store_true', help='sync the os repo from remote mirror to local disk')
         parser.add_argument('-upload-os-pkgs', action='store_true', help='upload os pkgs to nexus')
         parser.add_argument('-pkg-nexus', action='store_true', help='create the nexus package with os repo')
@@ -58,14 +67,26 @@ class MainApplication:
                             help='clean components that already build')
         parser.add_argument('-clean-all', action='store_true', help='rebuild all packages')
         parser.add_argument('-build-all', action='store_true', help='build all packages')
+        parser.add_argument('-resume', action='store_true',
+                            help='continue failed component builds without cleaning them when their inputs are unchanged')
         parser.add_argument('-os-info', metavar='os_info', type=str, default="",
                             help='the release params: os_name,os_version,arch exp:centos,7,x86_64')
+        parser.add_argument('-matrix', metavar='matrix', type=str, default="",
+                            help='build several targets concurrently, exp:centos,7,x86_64;centos,8,x86_64')
         parser.add_argument('-stack', metavar='stack', type=str, default="ambari", help='The stack to be build')
         parser.add_argument('-parallel', metavar='parallel', type=int, default=3,
-                            help='The parallel build threads used in build')
+                            help='The parallel build threads used in build, shared by all targets of a -matrix build')
+        parser.add_argument('-warm-containers', action='store_true',
+                            help='create and provision the build containers ahead of builds, for -os-info or all images')
+        parser.add_argument('-build-report', action='store_true',
+                            help='show build durations, failures and regressions recorded by previous builds')
         parser.add_argument('-release', action='store_true', help='make  bigdata platform release')
         parser.add_argument('-incremental-tar', metavar='incremental_tar', type=str,
                             help='Incrementally update a release.')
+        parser.add_argument('-apply-delta', metavar='apply_delta', type=str, default="",
+                            help='update this release in place with a delta archive made by an incremental release')
+        parser.add_argument('-extract-components', metavar='extract_components', type=str, default="",
+                            help='extract the rpms of -components from a zstd release archive into this release')
         # Add more arguments as needed
         args = parser.parse_args()
         return args
@@ -75,20 +96,81 @@ class MainApplication:
             self.check_os_info()
             self.nexus_manager.install_and_configure_nexus()
 
+    def warm_containers_if_needed(self):
+        if self.args.warm_containers:
+            os_infos = [self.os_info] if self.args.os_info else None
+            ContainerManager.warm_pool(self.path_manager, os_infos, self.nexus_manager.get_maven_mirror_url())
+
     def build_components_if_needed(self):
         if self.args.release:
             print("do release will skip build")
             return
-        if self.args.build_all or self.args.components:
+        if self.args.build_report:
+            return
+        if self.args.matrix and (self.args.build_all or self.args.components):
+            self.build_matrix(self.get_matrix_os_infos())
+        elif self.args.build_all or self.args.components:
             self.check_os_info()
 
-            container_manager = ContainerManager(self.os_info, PathManager(self.ci_config))
+            container_manager = ContainerManager(self.os_info, PathManager(self.ci_config, self.os_info),
+                                                 self.nexus_manager.get_maven_mirror_url())
             container_manager.create_container()
             components_str = self.args.components or ",".join(ALL_COMPONENTS)
 
             self.build_manager = BuildManager(self.ci_config, container_manager)
             self.build_manager.build_components(self.args.clean_all, self.args.clean_components, components_str,
-                                                self.args.stack, self.args.parallel)
+                                                self.args.stack, self.args.parallel, resume=self.args.resume)
+
+    def build_target(self, os_info, parallel, resource_share, maven_mirror_url):
+        path_manager = PathManager(self.ci_config, os_info)
+        container_manager = ContainerManager(os_info, path_manager, maven_mirror_url)
+        container_manager.create_container()
+        components_str = self.args.components or ",".join(ALL_COMPONENTS)
+        build_manager = BuildManager(self.ci_config, container_manager)
+        build_manager.build_components(self.args.clean_all, self.args.clean_components, components_str,
+                                       self.args.stack, parallel, target=get_target_name(os_info),
+                                       resource_share=resource_share, resume=self.args.resume)
+
+    def build_matrix(self, os_infos):
+        for os_info in os_infos:
+            self.check_os_info(os_info)
+        bigtop_dirs = [PathManager(self.ci_config, os_info).bigtop_project_dir for os_info in os_infos]
+        if len(set(bigtop_dirs)) != len(bigtop_dirs):
+            raise Exception(f"matrix build needs a bigtop tree per target, set bigtop.matrix_prj_dirs in "
+                            f"{CI_CONF_NAME}, exp: {get_target_name(os_infos[0])}: /path/to/bigtop")
+        # -parallel bounds the component builds of all targets together, each target gets an equal share of the host.
+        parallel = max(1, self.args.parallel // len(os_infos))
+        resource_share = 1.0 / len(os_infos)
+        logger.info(f"matrix build of {os_infos}, {parallel} parallel builds per target")
+
+        maven_mirror_url = self.nexus_manager.get_maven_mirror_url()
+        failed_targets = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(os_infos)) as executor:
+            futures = {executor.submit(self.build_target, os_info, parallel, resource_share, maven_mirror_url): os_info
+                       for os_info in os_infos}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                    logger.info(f"matrix target {futures[future]} built successfully")
+                except Exception as e:
+                    logger.error(f"matrix target {futures[future]} failed: {e}")
+                    failed_targets.append(futures[future])
+        if failed_targets:
+            raise Exception(f"matrix build failed for {failed_targets}, check the logs")
+
+    def build_report_if_needed(self):
+        if self.args.build_report:
+            db_path = os.path.join(OUTPUT_DIR, TELEMETRY_DB_NAME)
+            if not os.path.exists(db_path):
+                logger.info(f"no build telemetry recorded yet in {db_path}")
+                return
+            components = self.args.components.split(",") if self.args.components else None
+            if self.args.matrix:
+                targets = [get_target_name(os_info) for os_info in self.get_matrix_os_infos()]
+            else:
+                targets = BuildTelemetry(db_path).get_targets()
+            for target in targets:
+                print(BuildTelemetry(db_path, target).format_report(components))
 
     def upload_to_nexus_if_needed(self):
         if self.args.upload_nexus:
@@ -96,6 +178,10 @@ class MainApplication:
             components_arr = components_str.split(",")
             self.nexus_manager.upload_bigdata_components(components_arr)
 
+    def retry_failed_uploads_if_needed(self):
+        if self.args.retry_failed_uploads:
+            self.nexus_manager.retry_failed_uploads()
+
     def sync_repo_if_needed(self):
         if self.args.repo_sync:
             self.check_os_info()
@@ -124,6 +210,23 @@ class MainApplication:
                                            self.args.incremental_tar)
             self.release_manager.package()
 
+    def apply_delta_if_needed(self):
+        if self.args.apply_delta:
+            pigz_path = self.path_manager.pigz_path if os.path.exists(self.path_manager.pigz_path) else "gzip"
+            apply_delta(self.args.apply_delta, PRJDIR, pigz_path)
+
+    def extract_components_if_needed(self):
+        if self.args.extract_components:
+            if not self.args.components:
+                raise Exception("-extract-components needs -components")
+            comps = self.args.components.split(",")
+            # only the frames holding the rpm dirs of the components are decompressed
+            rpms_dir = os.path.relpath(self.path_manager.get_rpm_dir(PRJDIR), os.path.dirname(PRJDIR))
+            prefixes = [os.path.join(rpms_dir, comp) for comp in comps]
+            extract_members(self.args.extract_components,
+                            lambda name: any(name == p or name.startswith(p + "/") for p in prefixes),
+                            os.path.dirname(PRJDIR))
+
     def upload_os_packages_if_needed(self):
         if self.args.upload_os_pkgs:
             self.nexus_manager.upload_os_packages()
@@ -131,13 +234,18 @@ class MainApplication:
     def run(self):
         self.initialize()
         self.install_nexus_if_needed()
+        self.warm_containers_if_needed()
         self.build_components_if_needed()
+        self.build_report_if_needed()
         self.upload_to_nexus_if_needed()
+        self.retry_failed_uploads_if_needed()
         self.sync_repo_if_needed()
         self.deploy_cluster_if_needed()
         self.generate_conf_if_needed()
         self.package_nexus_if_needed()
         self.release_if_needed()
+        self.apply_delta_if_needed()
+        self.extract_components_if_needed()
         self.upload_os_packages_if_needed()
 
 def check_config():
@@ -2,7 +2,7 @@ import os
 import atexit
 import signal
 import subprocess
-import concurrent.futures
+import threading
 from python.common.basic_logger import get_logger
 from python.common.constants import *
 from python.utils.os_utils import *
@@ -14,9 +14,22 @@ import argparse
 import sys
 import traceback
 from python.utils.filesystem_util import *
+from python.build.build_scheduler import BuildScheduler
+from python.build.build_cache import BuildCache
+from python.build.resource_allocator import ResourceAllocator, ProcessTreeMonitor, get_host_cpus, get_host_memory_mb
+from python.build.build_log import BuildLogMultiplexer
+from python.build.build_telemetry import BuildTelemetry, TELEMETRY_DB_NAME
+from python.build.build_janitor import BuildDirJanitor
+import statistics
+import time
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-SUCCESS_FILE = os.path.join(OUTPUT_DIR, 'success_components.json')
+SUCCESS_FILE_NAME = 'success_components.json'
+# written into build/<component> when a build fails, -resume continues the build if its inputs are unchanged
+CHECKPOINT_FILE_NAME = '.ci_checkpoint.json'
+DEFAULT_BUILD_DIR_BUDGET_GB = 100
+# Let concurrent maven builds (components and matrix targets) share the local repository safely, maven >= 3.9.
+MAVEN_LOCK_OPTS = "-Daether.syncContext.named.factory=file-lock -Daether.syncContext.named.nameMapper=file-gav"
 
 logger = get_logger()
 
@@ -25,11 +38,28 @@ class BigtopBuilder(object):
 
     def __init__(self, conf):
         self.conf = conf
+        # set for matrix builds, targets keep their state and logs apart
+        self.target = conf.get("target")
         self.success_components = self.load_success_components()
+        self.success_lock = threading.Lock()
+        self.build_cache = None
+        self.resource_allocator = None
+        self.telemetry = None
+        self.janitor = None
+        self.log_multiplexer = BuildLogMultiplexer()
+        self.pending_count = 0
+        self.started_count = 0
         # store all subprocess PID
         self.child_pids = []
         atexit.register(self.kill_child_processes)
-        FilesystemUtil.create_dir(OUTPUT_DIR, empty_if_exists=False)
+        FilesystemUtil.create_dir(self.get_output_dir(), empty_if_exists=False)
+        FilesystemUtil.create_dir(self.get_log_dir(), empty_if_exists=False)
+
+    def get_output_dir(self):
+        return os.path.join(OUTPUT_DIR, self.target) if self.target else OUTPUT_DIR
+
+    def get_log_dir(self):
+        return os.path.join(LOGS_DIR, self.target) if self.target else LOGS_DIR
 
     def get_bigtop_working_dir(self):
         ci_conf = self.get_ci_conf()
@@ -38,6 +68,57 @@ class BigtopBuilder(object):
         else:
             return ci_conf["bigtop"]["prj_dir"]
 
+    def get_bigtop_dl_dir(self):
+        ci_conf = self.get_ci_conf()
+        if ci_conf["bigtop"]["use_docker"]:
+            return os.path.join(ci_conf["docker"]["volumes"]["bigtop"], "dl")
+        else:
+            return ci_conf["bigtop"]["dl_dir"]
+
+    def get_build_cache_dir(self):
+        # Same filesystem as the bigtop output dir so cached packages are hard links, not copies.
+        return os.path.join(self.get_bigtop_working_dir(), "build_cache")
+
+    def get_build_dir(self, component):
+        return os.path.join(self.get_bigtop_working_dir(), "build", component)
+
+    def load_checkpoint(self, component):
+        checkpoint_file = os.path.join(self.get_build_dir(component), CHECKPOINT_FILE_NAME)
+        if not os.path.exists(checkpoint_file):
+            return None
+        with open(checkpoint_file, 'r') as f:
+            return json.load(f)
+
+    def save_checkpoint(self, component, failed_task):
+        build_dir = self.get_build_dir(component)
+        os.makedirs(build_dir, exist_ok=True)
+        # Sources fetched by the failed build are part of the key, recompute it so the next run sees the same key.
+        self.build_cache.refresh_keys()
+        checkpoint = {"key": self.build_cache.compute_key(component, self.get_build_flavor()),
+                      "failed_task": failed_task, "time": datetime.now().isoformat()}
+        with open(os.path.join(build_dir, CHECKPOINT_FILE_NAME), 'w') as f:
+            json.dump(checkpoint, f)
+        logger.info(f"{component} checkpoint saved, failed task {failed_task}")
+
+    def can_resume(self, component):
+        if not self.conf.get("resume"):
+            return False
+        checkpoint = self.load_checkpoint(component)
+        if checkpoint is None:
+            return False
+        if checkpoint["key"] != self.build_cache.compute_key(component, self.get_build_flavor()):
+            logger.info(f"{component} inputs changed since the failed build, rebuild it from scratch")
+            return False
+        logger.info(f"{component} resumes from the failed task {checkpoint['failed_task']}")
+        return True
+
+    def get_build_dir_budget(self):
+        return int(self.get_ci_conf()["bigtop"].get("build_dir_budget_gb", DEFAULT_BUILD_DIR_BUDGET_GB)) * 1024 ** 3
+
+    def get_build_flavor(self):
+        # Build options that change the produced packages, part of every build cache key.
+        return f"stack={self.conf['stack']}"
+
     # bigdata prj will be mounted on docker
     def get_prj_dir(self):
         ci_conf = self.get_ci_conf()
@@ -102,7 +183,8 @@ class BigtopBuilder(object):
 
         template = Template(m_conf)
         # 渲染模板
-        result = template.render({"maven_local_repo_path": maven_local_repo_path})
+        result = template.render({"maven_local_repo_path": maven_local_repo_path,
+                                  "maven_mirror_url": self.conf.get("maven_mirror_url")})
         maven_conf_file = os.path.join(maven_conf_path, "settings.xml")
         with open(maven_conf_file, 'w') as fp:
             fp.write(result)
@@ -180,43 +262,102 @@ class BigtopBuilder(object):
         #     if os.path.exists(file_path):
         #         os.remove(file_path)
 
-    def get_compile_command(self, component):
+    def get_gradle_command(self):
         ci_conf = self.get_ci_conf()
         if ci_conf["bigtop"]["use_docker"]:
-            cmd = f". /etc/profile.d/bigtop.sh;./gradlew {component}-clean {component}-pkg -PbuildThreads=2C"
+            return ". /etc/profile.d/bigtop.sh;./gradlew"
         else:
-            cmd = f"./gradlew {component}-clean {component}-pkg"
+            return "./gradlew"
+
+    def get_compile_command(self, component, build_threads, clean=True):
+        # Without the clean task gradle skips the steps bigtop already stamped as done in build/<component>.
+        clean_task = f"{component}-clean " if clean else ""
+        cmd = f"{self.get_gradle_command()} {clean_task}{component}-pkg -PbuildThreads={build_threads}"
 
         if self.conf["stack"] == "ambari":
             cmd += " -PpkgSuffix -PparentDir=/usr/bigtop"
         return cmd
 
-    def compile_component(self, component, working_dir):
-        compile_command = self.get_compile_command(component)
-        logger.info(f"{component} start compile, compile infos will be  write to {component}.log {working_dir}")
-        log_path = os.path.join(LOGS_DIR, f"{component}.log")
+    def get_build_env(self):
+        env_vars = os.environ.copy()
+        env_vars["MAVEN_OPTS"] = f'{env_vars.get("MAVEN_OPTS", "")} {MAVEN_LOCK_OPTS}'.strip()
+        return env_vars
+
+    def get_cpu_share(self):
+        # A matrix build gives every target a share of the host.
+        return max(1, int(get_host_cpus() * self.conf.get("resource_share", 1.0)))
+
+    def get_memory_share(self):
+        return int(get_host_memory_mb() * self.conf.get("resource_share", 1.0))
+
+    def download_sources(self, component, working_dir, component_log):
+        # The download dir is shared by all matrix targets, only one of them fetches a component's sources at a time.
+        lock_file = os.path.join(self.get_bigtop_dl_dir(), ".locks", f"{component}.lock")
+        with file_lock(lock_file):
+            process = subprocess.Popen(f"{self.get_gradle_command()} {component}-download", shell=True,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=working_dir,
+                                       env=self.get_build_env())
+            component_log.pump(process.stdout)
+            return process.wait()
+
+    def next_unstarted_count(self):
+        with self.success_lock:
+            unstarted = self.pending_count - self.started_count
+            self.started_count += 1
+            return max(1, unstarted)
 
-        with open(log_path, "w") as log_file:
+    def compile_component(self, component, working_dir):
+        allocation = self.resource_allocator.acquire(component, self.next_unstarted_count())
+        self.janitor.acquire(component)
+        compile_command = self.get_compile_command(component, allocation["threads"],
+                                                   clean=not self.can_resume(component))
+        logger.info(f"{component} start compile, compile infos will be  write to {component}.log.gz {working_dir}")
+        log_path = os.path.join(self.get_log_dir(), f"{component}.log.gz")
+
+        peak_rss_mb = None
+        exit_status = -1
+        success = False
+        start_time = time.time()
+        component_log = self.log_multiplexer.open(component, log_path)
+        try:
             if component == "ambari-metrics":
                 #todo ubuntu 改为python3-dev
-                process = subprocess.Popen("yum install -y python3-devel", shell=True, stdout=log_file, stderr=subprocess.STDOUT,
-                                           cwd=working_dir)
+                process = subprocess.Popen("yum install -y python3-devel", shell=True, stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT, cwd=working_dir)
+                component_log.pump(process.stdout)
                 process.wait()
 
 
-            process = subprocess.Popen(compile_command, shell=True, stdout=log_file, stderr=subprocess.STDOUT,
-                                       cwd=working_dir)
+            if self.target and self.download_sources(component, working_dir, component_log) != 0:
+                logger.error(f"Failed to download sources of {component}")
+                return False, component
+
+            process = subprocess.Popen(compile_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       cwd=working_dir, env=self.get_build_env())
             logger.info(f"compile command is {compile_command}, command submitted, wait for compile finish")
             self.child_pids.append(process.pid)
+            monitor = ProcessTreeMonitor(process.pid)
+            monitor.start()
 
+            component_log.pump(process.stdout)
             exit_status = process.wait()
+            peak_rss_mb = monitor.stop()
 
             if exit_status != 0:
                 logger.error(f"Failed to compile {component}")
+                self.save_checkpoint(component, component_log.failed_task)
                 return False, component
 
-            logger.info(f"Successfully compiled {component}")
+            success = True
+            logger.info(f"Successfully compiled {component}, peak rss {peak_rss_mb}MB")
             return True, component
+        finally:
+            self.log_multiplexer.close(component, success)
+            self.resource_allocator.release(component)
+            rpm_files = FilesystemUtil.recursive_glob(os.path.join(working_dir, "output", component),
+                                                      suffix=".rpm") if success else []
+            self.telemetry.record(component, start_time, time.time(), exit_status, peak_rss_mb=peak_rss_mb,
+                                  log_size=os.path.getsize(log_path), rpm_files=rpm_files)
 
     def build(self):
         components = self.conf["components"].split(",") if self.conf["components"] else []
@@ -226,7 +367,11 @@ class BigtopBuilder(object):
 
         failed_components = []
 
+        self.build_cache = BuildCache(self.get_build_cache_dir(), bigtop_working_dir, self.get_bigtop_dl_dir(),
+                                      COMPONENT_DEPENDENCIES)
+
         if clean_all:
+            # The build cache is kept, components whose inputs are unchanged are restored from it.
             self.success_components = {}
             self.save_success_components()
             for component in components:
@@ -235,59 +380,87 @@ class BigtopBuilder(object):
         if len(clean_components) > 0:
             for component in clean_components:
                 self.clean_bigtop_git_prj(component)
+                self.build_cache.invalidate(component)
+                FilesystemUtil.delete(os.path.join(self.get_build_dir(component), CHECKPOINT_FILE_NAME))
                 if component in self.success_components:
                     del self.success_components[component]
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.conf["max_workers"]) as executor:
-            future_to_component = {}
-
-            if "hadoop" in components and "hadoop" not in self.success_components.keys():
-                first_task_future = executor.submit(self.compile_component, "hadoop", bigtop_working_dir)
-                # use Future.result() lock until hadoop finished build，cause other build task depends on hadoop
-                success, component = first_task_future.result()
-                self.clean_after_build(component)
-                if success:
-                    self.success_components[component] = datetime.now().isoformat()
-                    self.save_success_components()
-                else:
-                    logger.info("build hadoop failed")
-                    failed_components.append(component)
-                    return failed_components
-
-            for component in components:
-                if component not in self.success_components.keys() and component.strip() != "hadoop":
-                    future = executor.submit(self.compile_component, component, bigtop_working_dir)
-                    future_to_component[future] = component
-
-            logger.info(f"future_to_component : {len(future_to_component)} {future_to_component}")
-
-            if len(future_to_component) > 0:
-                for future in concurrent.futures.as_completed(list(future_to_component.keys())):
-                    try:
-                        success, component = future.result()
-                        if success:
-                            self.clean_after_build(component)
-                            logger.info(f"build success {component} {success}")
-                            self.success_components[component] = datetime.now().isoformat()
-                            self.save_success_components()
-                        else:
-                            failed_components.append(component)
-                            logger.info(f"Error build failed {component}")
-                    except Exception as exc:
-                        logger.error(f"{component} generated an exception: {exc}")
-                        logger.error(traceback.format_exc())
+        self.janitor = BuildDirJanitor(os.path.join(bigtop_working_dir, "build"), self.get_build_dir_budget())
+        self.janitor.start()
+        self.telemetry = BuildTelemetry(os.path.join(OUTPUT_DIR, TELEMETRY_DB_NAME), self.target)
+        pending_components = []
+        for component in [comp.strip() for comp in components]:
+            key = self.build_cache.compute_key(component, self.get_build_flavor())
+            if self.build_cache.lookup(component, key):
+                logger.info(f"{component} inputs unchanged, restore packages from build cache")
+                self.build_cache.restore(component, key)
+                self.record_success(component)
+                self.telemetry.record(component, time.time(), time.time(), 0, cache_hit=True)
+            else:
+                pending_components.append(component)
+        logger.info(f"components to build: {pending_components}")
+        self.pending_count = len(pending_components)
+        self.started_count = 0
+        self.resource_allocator = ResourceAllocator(self.conf["max_workers"],
+                                                    self.telemetry.get_peak_rss(pending_components),
+                                                    total_cpus=self.get_cpu_share(),
+                                                    total_memory_mb=self.get_memory_share())
+        scheduler = BuildScheduler(pending_components, COMPONENT_DEPENDENCIES, self.conf["max_workers"],
+                                   weights=self.get_schedule_weights(pending_components))
+        try:
+            succeeded, failed, skipped = scheduler.run(
+                lambda component: self.build_component(component, bigtop_working_dir))
+        finally:
+            self.log_multiplexer.stop()
+            self.janitor.stop()
+        failed_components.extend(failed)
+        failed_components.extend(skipped)
         return failed_components
 
-    def clean_after_build(self, component):
-        ci_conf = self.get_ci_conf()
-        bigtop_dir = self.get_bigtop_working_dir()
-        if len(bigtop_dir) < 2:
-            raise Exception(f"clean_after_build: get wrong bigtop_dir {bigtop_dir}")
+    def get_schedule_weights(self, components):
+        # Past build durations make the longest chains start first, unknown components count as a typical build.
+        durations = self.telemetry.get_median_durations(components)
+        default_duration = statistics.median(durations.values()) if durations else 1
+        return {comp: durations.get(comp, default_duration) for comp in components}
+
+    def build_component(self, component, working_dir):
+        success, component = self.compile_component(component, working_dir)
+        if success:
+            success = self.verify_packages(component, working_dir)
+        if not success:
+            # The build dir is kept for -resume, the janitor removes it when the disk budget runs out.
+            self.janitor.release(component)
+            logger.info(f"Error build failed {component}")
+            return False
+
+        self.build_cache.refresh_keys()
+        self.build_cache.store(component, self.build_cache.compute_key(component, self.get_build_flavor()))
+        self.janitor.release(component, remove=True)
+        logger.info(f"build success {component} {success}")
+        self.record_success(component)
+        return True
+
+    def record_success(self, component):
+        with self.success_lock:
+            self.success_components[component] = datetime.now().isoformat()
+            self.save_success_components()
 
-        buid_dir = os.path.join(bigtop_dir, f"build/{component}")
-        output = subprocess.check_output(f"rm -rf {buid_dir}", shell=True)
-        # shutil.rmtree(buid_dir, ignore_errors=True)
-        logger.info(f"{buid_dir} clean_after_build finished  {output}")
+    def verify_packages(self, component, working_dir):
+        rpm_files = FilesystemUtil.recursive_glob(os.path.join(working_dir, "output", component), suffix=".rpm")
+        if not rpm_files:
+            logger.error(f"{component} build produced no packages")
+            return False
+        empty_files = [fp for fp in rpm_files if os.path.getsize(fp) == 0]
+        if empty_files:
+            logger.error(f"{component} build produced empty packages {empty_files}")
+            return False
+        if shutil.which("rpm"):
+            result = subprocess.run(["rpm", "-K", "--nosignature"] + rpm_files, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, universal_newlines=True)
+            if result.returncode != 0:
+                logger.error(f"{component} packages failed the digest check: {result.stdout}")
+                return False
+        return True
 
     def config_host_env(self):
         ci_conf = self.get_ci_conf()
@@ -298,8 +471,9 @@ class BigtopBuilder(object):
         self.set_web_compile_envirment()
 
     def load_success_components(self):
-        if os.path.exists(SUCCESS_FILE):
-            with open(SUCCESS_FILE, 'r') as f:
+        success_file = os.path.join(self.get_output_dir(), SUCCESS_FILE_NAME)
+        if os.path.exists(success_file):
+            with open(success_file, 'r') as f:
                 res = json.load(f)
                 logger.info(f"load_success_components: {res}")
                 return res
@@ -307,7 +481,7 @@ class BigtopBuilder(object):
             return {}
 
     def save_success_components(self):
-        with open(SUCCESS_FILE, 'w') as f:
+        with open(os.path.join(self.get_output_dir(), SUCCESS_FILE_NAME), 'w') as f:
             logger.info(f"save_success_components: {self.success_components} ")
             json.dump(self.success_components, f)
 
@@ -0,0 +1,228 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import threading
+from datetime import datetime
+
+from python.common.basic_logger import get_logger
+from python.utils.filesystem_util import *
+
+logger = get_logger()
+
+CACHE_MANIFEST_NAME = "manifest.json"
+
+
+class BuildCache:
+    """
+    Content addressed cache of component build outputs.
+    The key of a component is a hash over everything its package depends on: the bigtop.bom entry, the common and
+    rpm packaging files (specs, patches, scripts), the source tarballs in the download dir, the build flavor, the
+    build OS and the keys of its prerequisites, so a change propagates to every dependent component.
+    Keys are computed by the build worker threads outside the lock, a key computed across a refresh is computed again.
+    """
+
+    def __init__(self, cache_dir, bigtop_dir, dl_dir, dependencies, keep_entries=2):
+        self.cache_dir = cache_dir
+        self.bigtop_dir = bigtop_dir
+        self.dl_dir = dl_dir
+        self.dependencies = dependencies
+        self.keep_entries = keep_entries
+        self.keys = {}
+        # incremented by every refresh of the keys
+        self.keys_generation = 0
+        self.file_hashes = {}
+        self.keys_lock = threading.Lock()
+        FilesystemUtil.create_dir(self.cache_dir, empty_if_exists=False)
+
+    def get_output_dir(self, component):
+        return os.path.join(self.bigtop_dir, "output", component)
+
+    def get_entry_dir(self, component, key):
+        return os.path.join(self.cache_dir, component, key)
+
+    def get_bom_entry(self, component):
+        bom_file = os.path.join(self.bigtop_dir, "bigtop.bom")
+        if not os.path.exists(bom_file):
+            return ""
+        with open(bom_file, 'r') as f:
+            bom = f.read()
+
+        match = re.search(r"['\"]%s['\"]\s*\{" % re.escape(component), bom)
+        if not match:
+            # Unknown layout, depend on the whole bom rather than miss a change.
+            return bom
+        depth = 0
+        for i in range(match.end() - 1, len(bom)):
+            if bom[i] == "{":
+                depth += 1
+            elif bom[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    return bom[match.start():i + 1]
+        return bom[match.start():]
+
+    def get_package_files(self, component):
+        package_dirs = [os.path.join(self.bigtop_dir, "bigtop-packages/src/common", component),
+                        os.path.join(self.bigtop_dir, "bigtop-packages/src/rpm", component)]
+        files = []
+        for package_dir in package_dirs:
+            files.extend(FilesystemUtil.recursive_glob(package_dir))
+        return sorted(files)
+
+    def get_tarball_names(self, component):
+        """File names of the source tarballs of component: the tarball destinations of its bom entry."""
+        entry = self.get_bom_entry(component)
+        if not re.match(r"['\"]%s['\"]" % re.escape(component), entry):
+            return []
+        name = re.search(r"\bname\s*=\s*['\"]([^'\"]+)['\"]", entry)
+        base = re.search(r"\bversion\s*\{[^}]*\bbase\s*=\s*['\"]([^'\"]+)['\"]", entry)
+        pkg = re.search(r"\bversion\s*\{[^}]*\bpkg\s*=\s*['\"]([^'\"]+)['\"]", entry)
+        variables = {"name": name.group(1) if name else component, "version.base": base.group(1) if base else ""}
+        variables["version.pkg"] = pkg.group(1) if pkg else variables["version.base"]
+        names = []
+        for destination in re.findall(r"\bdestination\s*=\s*['\"]([^'\"]+)['\"]", entry):
+            for variable, value in variables.items():
+                destination = destination.replace("${%s}" % variable, value)
+            destination = destination.replace("$name", variables["name"])
+            if "$" in destination:
+                logger.warning(f"build cache: can not expand the tarball {destination} of {component}")
+                continue
+            names.append(destination)
+        return names
+
+    def get_source_files(self, component):
+        if not self.dl_dir or not os.path.isdir(self.dl_dir):
+            return []
+        file_paths = [os.path.join(self.dl_dir, filename) for filename in self.get_tarball_names(component)]
+        return sorted(file_path for file_path in file_paths if os.path.isfile(file_path))
+
+    def get_platform_id(self):
+        os_release = ""
+        if os.path.exists("/etc/os-release"):
+            with open("/etc/os-release", 'r') as f:
+                os_release = f.read()
+        return f"{platform.machine()}\n{os_release}"
+
+    def hash_file(self, file_path):
+        stat = os.stat(file_path)
+        cache_key = (file_path, stat.st_size, stat.st_mtime_ns)
+        if cache_key not in self.file_hashes:
+            self.file_hashes[cache_key] = sha256_file(file_path)
+        return self.file_hashes[cache_key]
+
+    def refresh_keys(self):
+        # Inputs such as source tarballs may appear during a build, keys are recomputed before storing outputs.
+        with self.keys_lock:
+            self.keys = {}
+            self.keys_generation += 1
+
+    def compute_key(self, component, build_flavor):
+        while True:
+            with self.keys_lock:
+                if component in self.keys:
+                    return self.keys[component]
+                generation = self.keys_generation
+            # the source tarballs are hashed without holding the lock
+            key = self.hash_inputs(component, build_flavor)
+            with self.keys_lock:
+                # a refresh meanwhile may have changed the keys of the dependencies read by hash_inputs
+                if generation == self.keys_generation:
+                    if component not in self.keys:
+                        self.keys[component] = key
+                        logger.info(f"build cache key of {component}: {key}")
+                    return self.keys[component]
+
+    def hash_inputs(self, component, build_flavor):
+        h = hashlib.sha256()
+        h.update(f"component:{component}\nflavor:{build_flavor}\n".encode())
+        h.update(self.get_platform_id().encode())
+        h.update(self.get_bom_entry(component).encode())
+        for file_path in self.get_package_files(component):
+            h.update(f"package:{os.path.relpath(file_path, self.bigtop_dir)}:{self.hash_file(file_path)}\n".encode())
+        for file_path in self.get_source_files(component):
+            h.update(f"source:{os.path.basename(file_path)}:{self.hash_file(file_path)}\n".encode())
+        for dep in sorted(self.dependencies.get(component, [])):
+            h.update(f"dependency:{dep}:{self.compute_key(dep, build_flavor)}\n".encode())
+        return h.hexdigest()
+
+    def load_manifest(self, component, key):
+        manifest_file = os.path.join(self.get_entry_dir(component, key), CACHE_MANIFEST_NAME)
+        if not os.path.exists(manifest_file):
+            return None
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+
+    def lookup(self, component, key):
+        manifest = self.load_manifest(component, key)
+        if manifest is None:
+            return False
+        entry_dir = self.get_entry_dir(component, key)
+        for relative_path, size in manifest["files"].items():
+            cached_file = os.path.join(entry_dir, "files", relative_path)
+            if not os.path.isfile(cached_file) or os.path.getsize(cached_file) != size:
+                logger.warning(f"build cache entry {entry_dir} is incomplete, ignore it")
+                return False
+        return True
+
+    def restore(self, component, key):
+        """Place the cached packages of component into the bigtop output dir."""
+        manifest = self.load_manifest(component, key)
+        entry_dir = self.get_entry_dir(component, key)
+        output_dir = self.get_output_dir(component)
+
+        existing = {os.path.relpath(fp, output_dir): os.path.getsize(fp) for fp in
+                    FilesystemUtil.recursive_glob(output_dir)} if os.path.isdir(output_dir) else {}
+        if existing == manifest["files"]:
+            logger.info(f"build cache: {output_dir} already matches {key}")
+            return
+
+        FilesystemUtil.create_dir(output_dir, empty_if_exists=True)
+        for relative_path in manifest["files"]:
+            dest = os.path.join(output_dir, relative_path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            FilesystemUtil.link_or_copy(os.path.join(entry_dir, "files", relative_path), dest)
+        logger.info(f"build cache: restored {len(manifest['files'])} files of {component} from {entry_dir}")
+
+    def store(self, component, key):
+        output_dir = self.get_output_dir(component)
+        if not os.path.isdir(output_dir):
+            logger.warning(f"build cache: {output_dir} does not exist, nothing to store for {component}")
+            return
+
+        entry_dir = self.get_entry_dir(component, key)
+        tmp_dir = f"{entry_dir}.tmp"
+        FilesystemUtil.delete(tmp_dir)
+        files = {}
+        for file_path in FilesystemUtil.recursive_glob(output_dir):
+            relative_path = os.path.relpath(file_path, output_dir)
+            dest = os.path.join(tmp_dir, "files", relative_path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            FilesystemUtil.link_or_copy(file_path, dest)
+            files[relative_path] = os.path.getsize(file_path)
+
+        with open(os.path.join(tmp_dir, CACHE_MANIFEST_NAME), 'w') as f:
+            json.dump({"component": component, "key": key, "created": datetime.now().isoformat(), "files": files}, f,
+                      indent=4)
+        FilesystemUtil.delete(entry_dir)
+        os.rename(tmp_dir, entry_dir)
+        logger.info(f"build cache: stored {len(files)} files of {component} as {key}")
+        self.prune(component)
+
+    def prune(self, component):
+        component_dir = os.path.join(self.cache_dir, component)
+        entries = [os.path.join(component_dir, d) for d in os.listdir(component_dir)]
+        entries = sorted([d for d in entries if os.path.isdir(d)], key=os.path.getmtime, reverse=True)
+        for entry in entries[self.keep_entries:]:
+            logger.info(f"build cache: prune {entry}")
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def invalidate(self, component):
+        component_dir = os.path.join(self.cache_dir, component)
+        if os.path.exists(component_dir):
+            logger.info(f"build cache: invalidate {component}")
+            shutil.rmtree(component_dir, ignore_errors=True)
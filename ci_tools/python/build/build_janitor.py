@@ -0,0 +1,115 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import os
+import shutil
+import threading
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger()
+
+
+def get_dir_size(path):
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(root, filename)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class BuildDirJanitor(threading.Thread):
+    """
+    Remove component build dirs in the background.
+    Dirs of verified builds are removed as soon as they are released. The dirs of failed builds are kept so the next
+    run can resume them, but when all build dirs together exceed budget_bytes the oldest ones are removed, except the
+    dirs of builds that are running.
+    """
+
+    def __init__(self, build_root, budget_bytes):
+        super().__init__(daemon=True)
+        self.build_root = build_root
+        self.budget_bytes = budget_bytes
+        self.removable = []
+        self.in_use = set()
+        # components whose build dir is being deleted, outside the lock
+        self.removing = set()
+        self.condition = threading.Condition()
+        self.stopped = False
+
+    def get_build_dir(self, component):
+        return os.path.join(self.build_root, component)
+
+    def acquire(self, component):
+        with self.condition:
+            # only the build of this component waits for a removal of its dir in progress
+            while component in self.removing:
+                self.condition.wait()
+            self.in_use.add(component)
+            if component in self.removable:
+                self.removable.remove(component)
+
+    def release(self, component, remove=False):
+        with self.condition:
+            self.in_use.discard(component)
+            if remove:
+                self.removable.append(component)
+            self.condition.notify_all()
+
+    def remove_unused(self, component):
+        """Remove the build dir of component unless it is in use, acquire waits for a removal in progress."""
+        build_dir = self.get_build_dir(component)
+        with self.condition:
+            if component in self.in_use or component in self.removing or not os.path.exists(build_dir):
+                return False
+            self.removing.add(component)
+        try:
+            shutil.rmtree(build_dir, ignore_errors=True)
+        finally:
+            with self.condition:
+                self.removing.discard(component)
+                self.condition.notify_all()
+        return True
+
+    def remove(self, component):
+        if self.remove_unused(component):
+            logger.info(f"build janitor: removed {self.get_build_dir(component)}")
+
+    def enforce_budget(self):
+        if not os.path.isdir(self.build_root):
+            return
+        build_dirs = [os.path.join(self.build_root, d) for d in os.listdir(self.build_root)]
+        build_dirs = sorted([d for d in build_dirs if os.path.isdir(d)], key=os.path.getmtime)
+        sizes = {d: get_dir_size(d) for d in build_dirs}
+        total = sum(sizes.values())
+        for build_dir in build_dirs:
+            if total <= self.budget_bytes:
+                break
+            # a build may have started since the sizes were taken, in_use is checked again at the removal
+            if not self.remove_unused(os.path.basename(build_dir)):
+                continue
+            logger.info(f"build janitor: build dirs used {total // 1024 ** 2}MB of "
+                        f"{self.budget_bytes // 1024 ** 2}MB, removed {build_dir}")
+            total -= sizes[build_dir]
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.removable and not self.stopped:
+                    self.condition.wait()
+                if not self.removable and self.stopped:
+                    break
+                component = self.removable.pop(0)
+            self.remove(component)
+            self.enforce_budget()
+
+    def stop(self):
+        """Finish the pending removals and check the budget once more."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.is_alive():
+            self.join()
+        self.enforce_budget()
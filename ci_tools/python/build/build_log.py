@@ -0,0 +1,134 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import collections
+import gzip
+import re
+import threading
+import time
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger()
+
+GRADLE_TASK_PATTERN = re.compile(r"^> Task (:\S+)")
+MAVEN_MODULE_PATTERN = re.compile(r"^\[INFO\] Building (.+?)\s+\[(\d+)/(\d+)\]")
+MAVEN_GOAL_PATTERN = re.compile(r"^\[INFO\] --- (\S+) .*@ (\S+) ---")
+RPMBUILD_PHASE_PATTERN = re.compile(r"^Executing\((%\w+)\)")
+FAILED_TASK_PATTERN = re.compile(r"Execution failed for task '(:[^']+)'")
+ERROR_PATTERN = re.compile(r"^(\[ERROR\]|FAILURE:|BUILD FAILED|\* What went wrong:|RPM build errors:|error:|Error:|"
+                           r"ERROR:)")
+ERROR_CONTEXT_LINES = 20
+ERROR_BLOCK_MAX_LINES = 60
+TAIL_LINES = 30
+
+
+class ComponentLog:
+    """Compressed log of one component build that keeps track of its current phase and its error blocks."""
+
+    def __init__(self, component, log_path, flush_interval=5):
+        self.component = component
+        self.log_path = log_path
+        self.log_file = gzip.open(log_path, 'wt', compresslevel=6, encoding='utf-8', errors='replace')
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self.start_time = time.time()
+        self.phase = "starting"
+        self.failed_task = None
+        self.error_blocks = collections.deque(maxlen=2)
+        self.context_left = 0
+        self.tail = collections.deque(maxlen=TAIL_LINES)
+        self.lines = 0
+
+    def write_line(self, line):
+        self.log_file.write(line)
+        self.lines += 1
+        self.parse_line(line.rstrip("\n"))
+        if time.time() - self.last_flush > self.flush_interval:
+            # Sync flush keeps the log readable with zcat while the build is running.
+            self.log_file.flush()
+            self.last_flush = time.time()
+
+    def pump(self, stream):
+        for raw_line in iter(stream.readline, b''):
+            self.write_line(raw_line.decode('utf-8', errors='replace'))
+
+    def parse_line(self, line):
+        self.tail.append(line)
+        match = MAVEN_MODULE_PATTERN.match(line)
+        if match:
+            self.phase = f"maven {match.group(2)}/{match.group(3)} {match.group(1)}"
+        else:
+            match = GRADLE_TASK_PATTERN.match(line) or RPMBUILD_PHASE_PATTERN.match(line)
+            if match:
+                self.phase = match.group(1)
+            else:
+                match = MAVEN_GOAL_PATTERN.match(line)
+                if match and self.phase.startswith("maven"):
+                    self.phase = f"{self.phase.split(' (')[0]} ({match.group(1)})"
+
+        match = FAILED_TASK_PATTERN.search(line)
+        if match:
+            self.failed_task = match.group(1)
+
+        if ERROR_PATTERN.match(line):
+            if self.context_left <= 0:
+                self.error_blocks.append([])
+            self.context_left = ERROR_CONTEXT_LINES
+        if self.context_left > 0:
+            block = self.error_blocks[-1]
+            if len(block) < ERROR_BLOCK_MAX_LINES:
+                block.append(line)
+            self.context_left -= 1
+
+    def get_progress(self):
+        elapsed = int(time.time() - self.start_time) // 60
+        return f"{self.component}: {self.phase} ({elapsed}m)"
+
+    def get_error_excerpt(self):
+        if not self.error_blocks:
+            return "\n".join(self.tail)
+        return "\n...\n".join("\n".join(block) for block in self.error_blocks)
+
+    def close(self):
+        self.log_file.close()
+
+
+class BuildLogMultiplexer:
+    """Collect the logs of all running component builds and periodically report their progress on one line."""
+
+    def __init__(self, report_interval=60):
+        self.report_interval = report_interval
+        self.logs = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.reporter = None
+
+    def open(self, component, log_path):
+        component_log = ComponentLog(component, log_path)
+        with self.lock:
+            self.logs[component] = component_log
+            if self.reporter is None:
+                self.reporter = threading.Thread(target=self.report_progress, daemon=True)
+                self.reporter.start()
+        return component_log
+
+    def close(self, component, success):
+        with self.lock:
+            component_log = self.logs.pop(component)
+        component_log.close()
+        if not success:
+            logger.error(f"{component} build failed, last errors from {component_log.log_path}:\n"
+                         f"{component_log.get_error_excerpt()}")
+
+    def get_progress_line(self):
+        with self.lock:
+            return " | ".join(component_log.get_progress() for component_log in self.logs.values())
+
+    def report_progress(self):
+        while not self.stopped.wait(self.report_interval):
+            progress = self.get_progress_line()
+            if progress:
+                logger.info(f"build progress | {progress}")
+
+    def stop(self):
+        self.stopped.set()
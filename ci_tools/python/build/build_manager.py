@@ -23,8 +23,8 @@ class BuildManager:
         self.ci_config = ci_config
         self.executor = CommandExecutor
 
-    def clean_logs(self):
-        log_files = glob.glob(os.path.join(LOGS_DIR, '*.log'))
+    def clean_logs(self, log_dir=LOGS_DIR):
+        log_files = glob.glob(os.path.join(log_dir, '*.log')) + glob.glob(os.path.join(log_dir, '*.log.gz'))
         for log_file in log_files:
             try:
                 os.remove(log_file)
@@ -38,12 +38,18 @@ class BuildManager:
         else:
             return PRJDIR
 
-    def build_components(self, clean_all, clean_components, components_str, stack, parallel):
-        self.clean_logs()
+    def build_components(self, clean_all, clean_components, components_str, stack, parallel, target=None,
+                         resource_share=1.0, resume=False):
+        # target and resource_share are set by matrix builds, where several targets share the host.
+        log_dir = os.path.join(LOGS_DIR, target) if target else LOGS_DIR
+        os.makedirs(log_dir, exist_ok=True)
+        self.clean_logs(log_dir)
         prj_dir = self.get_prj_dir()
 
         build_args = {"clean_all": clean_all, "clean_components": clean_components, "components": components_str,
-                      "stack": stack, "max_workers": parallel}
+                      "stack": stack, "max_workers": parallel, "resume": resume}
+        if target:
+            build_args.update({"target": target, "resource_share": resource_share})
 
         build_args_str = json.dumps(build_args)
         build_args_str_quoted = shlex.quote(build_args_str)
@@ -56,7 +62,12 @@ class BuildManager:
             # execute the build command inside the container
             build_cmd = f'source ./venv.sh && {build_cmd}'
             cmd = ['/bin/bash', '-c', build_cmd]
-            exit_code, output = self.executor.execute_docker_command(self.container_manager, cmd, workdir=prj_dir)
+            # the output is streamed to the log, only its tail is kept for the error message
+            log_file = os.path.join(log_dir, "container_build.log")
+            timeout = self.ci_config["docker"].get("build_timeout")
+            exit_code, output = self.executor.execute_docker_command(self.container_manager, cmd, workdir=prj_dir,
+                                                                     log_file=log_file, timeout=timeout)
+            self.container_manager.record_build()
         else:
             # If no container is provided, execute the build command locally
             env_vars = os.environ.copy()
@@ -0,0 +1,117 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import heapq
+import concurrent.futures
+import traceback
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger()
+
+
+class BuildScheduler:
+    """
+    Schedule component builds over their dependency graph.
+    A component is submitted as soon as all of its prerequisites have been built; among the ready components the
+    one with the longest remaining chain (critical path) is started first.
+    """
+
+    def __init__(self, components, dependencies, max_workers, weights=None):
+        self.components = list(dict.fromkeys(components))
+        self.max_workers = max(1, max_workers)
+        self.weights = weights or {}
+        # Prerequisites outside the requested set are assumed to be built already.
+        self.prerequisites = {comp: [dep for dep in dependencies.get(comp, []) if dep in self.components] for comp in
+                              self.components}
+        self.dependents = {comp: [] for comp in self.components}
+        for comp, deps in self.prerequisites.items():
+            for dep in deps:
+                self.dependents[dep].append(comp)
+        self.check_cycles()
+        self.priorities = self.critical_path_lengths()
+
+    def check_cycles(self):
+        visiting, visited = set(), set()
+
+        def visit(comp, path):
+            if comp in visited:
+                return
+            if comp in visiting:
+                raise Exception(f"component dependency cycle detected: {' -> '.join(path + [comp])}")
+            visiting.add(comp)
+            for dep in self.prerequisites[comp]:
+                visit(dep, path + [comp])
+            visiting.remove(comp)
+            visited.add(comp)
+
+        for comp in self.components:
+            visit(comp, [])
+
+    def get_weight(self, comp):
+        return self.weights.get(comp, 1)
+
+    def critical_path_lengths(self):
+        # Longest weighted path from each component to the end of the graph, itself included.
+        lengths = {}
+
+        def length(comp):
+            if comp not in lengths:
+                lengths[comp] = self.get_weight(comp) + max([length(d) for d in self.dependents[comp]], default=0)
+            return lengths[comp]
+
+        for comp in self.components:
+            length(comp)
+        return lengths
+
+    def run(self, build_func):
+        """
+        Build all components with build_func(component) -> bool.
+        Returns (succeeded, failed, skipped); skipped components had a failed prerequisite.
+        """
+        remaining = {comp: len(deps) for comp, deps in self.prerequisites.items()}
+        ready = []
+        for comp in self.components:
+            if remaining[comp] == 0:
+                heapq.heappush(ready, (-self.priorities[comp], self.components.index(comp), comp))
+
+        succeeded, failed, skipped = [], [], []
+        logger.info(f"build schedule priorities: {self.priorities}")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while ready or running:
+                while ready and len(running) < self.max_workers:
+                    _, _, comp = heapq.heappop(ready)
+                    logger.info(f"scheduling {comp}, critical path length {self.priorities[comp]}")
+                    running[executor.submit(build_func, comp)] = comp
+
+                done, _ = concurrent.futures.wait(list(running.keys()),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    comp = running.pop(future)
+                    try:
+                        success = future.result()
+                    except Exception as exc:
+                        logger.error(f"{comp} generated an exception: {exc}")
+                        logger.error(traceback.format_exc())
+                        success = False
+
+                    if success:
+                        succeeded.append(comp)
+                        for dependent in self.dependents[comp]:
+                            remaining[dependent] -= 1
+                            if remaining[dependent] == 0:
+                                heapq.heappush(ready, (-self.priorities[dependent],
+                                                       self.components.index(dependent), dependent))
+                    else:
+                        failed.append(comp)
+                        self.skip_dependents(comp, skipped)
+
+        return succeeded, failed, skipped
+
+    def skip_dependents(self, comp, skipped):
+        for dependent in self.dependents[comp]:
+            if dependent not in skipped:
+                logger.error(f"skip {dependent}, its prerequisite {comp} failed")
+                skipped.append(dependent)
+                self.skip_dependents(dependent, skipped)
@@ -0,0 +1,139 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import os
+import sqlite3
+import statistics
+import time
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger()
+
+TELEMETRY_DB_NAME = "build_telemetry.db"
+# a build this much slower than its median is reported as a regression
+REGRESSION_RATIO = 1.3
+HISTORY_LIMIT = 10
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    target TEXT NOT NULL,
+    component TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    exit_status INTEGER NOT NULL,
+    cache_hit INTEGER NOT NULL DEFAULT 0,
+    peak_rss_mb INTEGER,
+    log_size INTEGER,
+    rpm_count INTEGER,
+    rpm_size INTEGER
+)
+"""
+
+
+class BuildTelemetry:
+    """Per component build records kept in a local SQLite database."""
+
+    def __init__(self, db_path, target="", run_id=None):
+        self.db_path = db_path
+        self.target = target or ""
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S")
+        with self.connect() as conn:
+            conn.execute(CREATE_TABLE_SQL)
+            conn.execute("CREATE INDEX IF NOT EXISTS builds_component ON builds (target, component, start_time)")
+
+    def connect(self):
+        # Matrix targets write from several containers, wait for the lock instead of failing.
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    def record(self, component, start_time, end_time, exit_status, cache_hit=False, peak_rss_mb=None, log_size=None,
+               rpm_files=None):
+        rpm_files = rpm_files or []
+        rpm_size = sum(os.path.getsize(fp) for fp in rpm_files if os.path.exists(fp))
+        with self.connect() as conn:
+            conn.execute("INSERT INTO builds (run_id, target, component, start_time, end_time, exit_status, cache_hit, "
+                         "peak_rss_mb, log_size, rpm_count, rpm_size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (self.run_id, self.target, component, start_time, end_time, exit_status, int(cache_hit),
+                          peak_rss_mb, log_size, len(rpm_files), rpm_size))
+
+    def get_durations(self, component, limit=HISTORY_LIMIT):
+        with self.connect() as conn:
+            rows = conn.execute("SELECT end_time - start_time FROM builds WHERE target = ? AND component = ? AND "
+                                "exit_status = 0 AND cache_hit = 0 ORDER BY start_time DESC LIMIT ?",
+                                (self.target, component, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_median_durations(self, components):
+        """Median duration in seconds of the recent successful builds, for components that have any."""
+        durations = {}
+        for component in components:
+            history = self.get_durations(component)
+            if history:
+                durations[component] = statistics.median(history)
+        return durations
+
+    def get_peak_rss(self, components):
+        peaks = {}
+        with self.connect() as conn:
+            for component in components:
+                row = conn.execute("SELECT peak_rss_mb FROM builds WHERE target = ? AND component = ? AND "
+                                   "peak_rss_mb IS NOT NULL ORDER BY start_time DESC LIMIT 1",
+                                   (self.target, component)).fetchone()
+                if row:
+                    peaks[component] = row[0]
+        return peaks
+
+    def get_targets(self):
+        with self.connect() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT target FROM builds ORDER BY target").fetchall()]
+
+    def get_report(self, components=None):
+        """One summary per component: build counts, failures, last and median duration and regressions."""
+        with self.connect() as conn:
+            rows = conn.execute("SELECT component, start_time, end_time, exit_status, cache_hit, peak_rss_mb, "
+                                "log_size, rpm_size FROM builds WHERE target = ? ORDER BY start_time",
+                                (self.target,)).fetchall()
+        report = {}
+        for component, start_time, end_time, exit_status, cache_hit, peak_rss_mb, log_size, rpm_size in rows:
+            if components and component not in components:
+                continue
+            entry = report.setdefault(component, {"builds": 0, "failures": 0, "cache_hits": 0, "durations": [],
+                                                  "peak_rss_mb": None, "log_size": None, "rpm_size": None,
+                                                  "last_build": None})
+            entry["builds"] += 1
+            entry["last_build"] = time.strftime("%Y-%m-%d %H:%M", time.localtime(start_time))
+            if cache_hit:
+                entry["cache_hits"] += 1
+            elif exit_status != 0:
+                entry["failures"] += 1
+            else:
+                entry["durations"].append(end_time - start_time)
+                entry.update({"peak_rss_mb": peak_rss_mb, "log_size": log_size, "rpm_size": rpm_size})
+
+        for component, entry in report.items():
+            durations = entry.pop("durations")[-HISTORY_LIMIT:]
+            entry["last_duration"] = durations[-1] if durations else None
+            entry["median_duration"] = statistics.median(durations[:-1]) if len(durations) > 1 else None
+            entry["regression"] = bool(entry["median_duration"] and
+                                       entry["last_duration"] > entry["median_duration"] * REGRESSION_RATIO)
+        return report
+
+    def format_report(self, components=None):
+        def minutes(seconds):
+            return "-" if seconds is None else f"{seconds / 60:.1f}m"
+
+        def megabytes(size):
+            return "-" if size is None else f"{size / 1024 / 1024:.0f}MB"
+
+        lines = [f"build report {self.target or 'local'}",
+                 f"{'component':<22}{'builds':>7}{'failed':>7}{'cached':>7}{'last':>9}{'median':>9}{'rss':>9}"
+                 f"{'log':>9}{'rpms':>9}  last build"]
+        for component, entry in sorted(self.get_report(components).items()):
+            flag = "  REGRESSION" if entry["regression"] else ""
+            rss = "-" if entry["peak_rss_mb"] is None else f"{entry['peak_rss_mb']}MB"
+            lines.append(f"{component:<22}{entry['builds']:>7}{entry['failures']:>7}{entry['cache_hits']:>7}"
+                         f"{minutes(entry['last_duration']):>9}{minutes(entry['median_duration']):>9}{rss:>9}"
+                         f"{megabytes(entry['log_size']):>9}{megabytes(entry['rpm_size']):>9}  "
+                         f"{entry['last_build']}{flag}")
+        return "\n".join(lines)
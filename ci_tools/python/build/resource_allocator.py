@@ -0,0 +1,129 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import os
+import threading
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger()
+
+
+def get_host_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_host_memory_mb():
+    with open("/proc/meminfo", 'r') as f:
+        for line in f:
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1]) // 1024
+    return 0
+
+
+def get_process_tree_rss_kb(root_pid):
+    """Sum the resident memory of root_pid and all of its descendants."""
+    children = {}
+    rss = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status", 'r') as f:
+                ppid, vm_rss = None, 0
+                for line in f:
+                    if line.startswith("PPid:"):
+                        ppid = int(line.split()[1])
+                    elif line.startswith("VmRSS:"):
+                        vm_rss = int(line.split()[1])
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+        rss[int(entry)] = vm_rss
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class ProcessTreeMonitor(threading.Thread):
+    """Sample the memory of a build process tree and keep its peak."""
+
+    def __init__(self, pid, interval=5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_kb = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak_rss_kb = max(self.peak_rss_kb, get_process_tree_rss_kb(self.pid))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak_rss_kb // 1024
+
+
+class ResourceAllocator:
+    """
+    Split the host CPUs and memory across the component builds running at the same time.
+    Threads are handed out when a build starts: the free CPUs are divided over the build slots that can still be
+    filled, so CPUs returned by a finished build go to the builds started after it. A build is only admitted when
+    the memory it needed last time (peak_rss_history, component -> MB) is available, unless nothing else is running.
+    """
+
+    def __init__(self, max_workers, peak_rss_history=None, total_cpus=None, total_memory_mb=None,
+                 reserved_memory_mb=2048):
+        self.max_workers = max(1, max_workers)
+        self.total_cpus = total_cpus or get_host_cpus()
+        self.total_memory_mb = max(1, (total_memory_mb or get_host_memory_mb()) - reserved_memory_mb)
+        self.history = peak_rss_history or {}
+        self.allocations = {}
+        self.condition = threading.Condition()
+
+    def get_memory_budget_mb(self, component):
+        default_budget = self.total_memory_mb // self.max_workers
+        peak_rss_mb = self.history.get(component)
+        if peak_rss_mb:
+            # Leave some headroom over the last observed peak.
+            return min(self.total_memory_mb, int(peak_rss_mb * 1.2))
+        return default_budget
+
+    def used(self):
+        threads = sum(a["threads"] for a in self.allocations.values())
+        memory_mb = sum(a["memory_mb"] for a in self.allocations.values())
+        return threads, memory_mb
+
+    def acquire(self, component, unstarted):
+        """
+        Block until component can run and return its allocation {"threads": n, "memory_mb": m}.
+        unstarted is the number of components that have not been started yet, this one included.
+        """
+        memory_mb = self.get_memory_budget_mb(component)
+        with self.condition:
+            while self.allocations and self.used()[1] + memory_mb > self.total_memory_mb:
+                logger.info(f"{component} waits for memory: needs {memory_mb}MB, "
+                            f"used {self.used()[1]}MB of {self.total_memory_mb}MB")
+                self.condition.wait()
+
+            used_threads, _ = self.used()
+            free_cpus = max(1, self.total_cpus - used_threads)
+            slots = max(1, min(self.max_workers - len(self.allocations), unstarted))
+            allocation = {"threads": max(1, free_cpus // slots), "memory_mb": memory_mb}
+            self.allocations[component] = allocation
+            logger.info(f"allocate {allocation} to {component}, running: {self.allocations}")
+            return allocation
+
+    def release(self, component):
+        with self.condition:
+            self.allocations.pop(component, None)
+            logger.info(f"release resources of {component}, running: {self.allocations}")
+            self.condition.notify_all()
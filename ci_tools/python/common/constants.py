@@ -39,6 +39,10 @@ RELEASE_JDK_TAR_FILE = os.path.join(PRJDIR, JDK_TAR_RELATIVE_PATH)
 UDH_NEXUS_REPO_PATH = "udh3"
 UDH_NEXUS_REPO_PACKAGES_PATH = f"{UDH_NEXUS_REPO_PATH}/Packages"
 UDH_NEXUS_REPO_NAME = "yum"
+MAVEN_PROXY_GROUP_NAME = "udh-maven"
+MAVEN_PROXY_REMOTES = {"udh-maven-central": "https://maven.aliyun.com/repository/central",
+                       "udh-maven-public": "https://maven.aliyun.com/repository/public",
+                       "udh-maven-apache-snapshots": "https://maven.aliyun.com/repository/apache-snapshots"}
 HTTPD_TPL_FILE = os.path.join(PRJDIR, "ci_tools/resources/templates/httpd.conf.tpl")
 HTTPD_CONF_FILE = "/etc/httpd/conf/httpd.conf"
 APACHE2_TPL_FILE = os.path.join(PRJDIR, "ci_tools/resources/templates/apache2.conf.tpl")
@@ -53,4 +57,10 @@ ALL_COMPONENTS = ["hadoop", "spark", "hive", "hbase", "zookeeper", "kafka", "fli
                   "ambari-infra", "ambari-metrics", "bigtop-select", "bigtop-jsvc", "bigtop-groovy", "bigtop-utils",
                   "bigtop-ambari-mpack"]
 
+# component -> components whose build outputs (jars in the local maven repo) it needs; absent means no prerequisites
+COMPONENT_DEPENDENCIES = {"tez": ["hadoop"], "hbase": ["hadoop", "zookeeper"], "hive": ["hadoop", "tez", "hbase"],
+                          "spark": ["hadoop", "hive"], "flink": ["hadoop"], "ranger": ["hadoop", "hive", "hbase"],
+                          "kyuubi": ["spark"], "alluxio": ["hadoop"], "knox": ["hadoop"], "celeborn": ["spark"],
+                          "trino": ["hive"], "ambari-metrics": ["hadoop", "hbase"]}
+
 DOCKER_IMAGE_MAP = {"centos_7_x86_64": "bigtop/slaves:trunk-centos-7", "centos_8_x86_64": "bigtop/slaves:trunk-rockylinux-8", "centos_8_aarch64": "bigtop/slaves:3.2.1-rockylinux-8-aarch64"}
\ No newline at end of file
@@ -10,9 +10,16 @@ from pathlib import Path
 
 logger = get_logger()
 
+
+def get_target_name(os_info):
+    os_type, os_version, os_arch = os_info
+    return f"{os_type}_{os_version}_{os_arch}"
+
+
 class PathManager:
-    def __init__(self, ci_config):
+    def __init__(self, ci_config, os_info=None):
         self.ci_config = ci_config
+        self.os_info = os_info
         self.release_output_dir = self.ci_config["udh_release_output_dir"]
         self.incremental_release_dir = os.path.join(self.release_output_dir, "release_tmp")
 
@@ -29,9 +36,9 @@ class PathManager:
 
         self.pigz_path = os.path.join(PRJ_BIN_DIR, "pigz")
         self.centos7_pg_10_source_dir = self.ci_config["centos7_pg_10_dir"]
-        self.compiled_pkg_out_dir = os.path.join(self.ci_config["bigtop"]["prj_dir"], "output")
+        self.bigtop_project_dir = self.get_bigtop_project_dir()
+        self.compiled_pkg_out_dir = os.path.join(self.bigtop_project_dir, "output")
 
-        self.bigtop_project_dir = self.ci_config["bigtop"]["prj_dir"]
         self.bigtop_local_maven_repo_dir = self.ci_config["bigtop"]["local_maven_repo_dir"]
         self.bigtop_dl_dir = self.ci_config["bigtop"]["dl_dir"]
         self.bigtop_docker_volume_dir = self.ci_config["docker"]["volumes"]["bigtop"]
@@ -40,6 +47,13 @@ class PathManager:
 
         self.current_prj_dir = self.get_current_prj_dir()
 
+    def get_bigtop_project_dir(self):
+        # Targets of a matrix build run concurrently, each of them builds in its own bigtop tree.
+        matrix_prj_dirs = self.ci_config["bigtop"].get("matrix_prj_dirs") or {}
+        if self.os_info and get_target_name(self.os_info) in matrix_prj_dirs:
+            return matrix_prj_dirs[get_target_name(self.os_info)]
+        return self.ci_config["bigtop"]["prj_dir"]
+
     def get_current_prj_dir(self):
         if self.ci_config["bigtop"]["use_docker"]:
             return self.ci_config["docker"]["volumes"]["prj"]
@@ -7,16 +7,31 @@ from python.common.path_manager import *
 import os
 import json
 import shlex
+import hashlib
+import threading
+import collections
+import time
+from datetime import datetime
 import docker
 logger = get_logger()
 
+CONTAINER_POOL_STATE_FILE = os.path.join(OUTPUT_DIR, 'container_pool.json')
+MAVEN_SETTINGS_TEMPLATE_FILE = os.path.join(PRJDIR, 'ci_tools/python/build/templates/maven/settings.xml.j2')
+ENV_FINGERPRINT_LABEL = "udh.env_fingerprint"
+DEFAULT_MAX_CONTAINER_BUILDS = 20
+EXEC_OUTPUT_TAIL_BYTES = 64 * 1024
+EXEC_POLL_INTERVAL = 5
+# matrix builds update the pool state from several threads
+POOL_STATE_LOCK = threading.Lock()
+
 
 
 
 class ContainerManager:
 
-    def __init__(self, os_info, path_manager: PathManager):
+    def __init__(self, os_info, path_manager: PathManager, maven_mirror_url=None):
         self.path_manager = path_manager
+        self.maven_mirror_url = maven_mirror_url
         self.client = docker.from_env()
         self.image = DOCKER_IMAGE_MAP.get(self.get_fullos(os_info))
         self.volumes = self.get_volumes()
@@ -47,8 +62,12 @@ class ContainerManager:
         return volumes
 
     # Set different environments inside the container based on different tasks.
+    def get_setup_args(self):
+        return {"prepare_env": True, "local_repo": self.path_manager.bigtop_local_maven_repo_dir,
+                "maven_mirror_url": self.maven_mirror_url}
+
     def setup_environment(self):
-        conf_args = {"prepare_env": True, "local_repo": self.path_manager.bigtop_local_maven_repo_dir}
+        conf_args = self.get_setup_args()
         conf_str = json.dumps(conf_args)
         conf_str_quoted = shlex.quote(conf_str)
 
@@ -63,17 +82,85 @@ class ContainerManager:
         # self.execute_command(['/bin/bash', '-c', cmd_install])
         # print("only ambari need install python3-devel ")
 
+    def get_env_fingerprint(self):
+        # Everything setup_environment depends on: a change forces a freshly provisioned container.
+        h = hashlib.sha256()
+        h.update(json.dumps({"image": self.image, "volumes": self.volumes, "setup": self.get_setup_args()},
+                            sort_keys=True).encode())
+        for file_path in [BUILD_SCRIPT, MAVEN_SETTINGS_TEMPLATE_FILE]:
+            with open(file_path, 'rb') as f:
+                h.update(f.read())
+        return h.hexdigest()
+
+    def get_image_id(self):
+        try:
+            return self.client.images.get(self.image).id
+        except docker.errors.ImageNotFound:
+            logger.info(f"Image {self.image} not found locally, pulling it")
+            return self.client.images.pull(self.image).id
+
+    def load_pool_state(self):
+        if os.path.exists(CONTAINER_POOL_STATE_FILE):
+            with open(CONTAINER_POOL_STATE_FILE, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_pool_state(self, state):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        with open(CONTAINER_POOL_STATE_FILE, 'w') as f:
+            json.dump(state, f, indent=4)
+
+    def get_max_builds(self):
+        return self.path_manager.ci_config["docker"].get("max_container_builds", DEFAULT_MAX_CONTAINER_BUILDS)
+
+    def is_healthy(self, container):
+        try:
+            container.reload()
+            if container.status != "running":
+                logger.info(f"Container {self.name} is {container.status}, starting it")
+                container.start()
+                container.reload()
+            exit_code, _ = container.exec_run(cmd=['/bin/bash', '-c', 'true'])
+            return container.status == "running" and exit_code == 0
+        except docker.errors.APIError as e:
+            logger.warning(f"Container {self.name} health check failed: {e}")
+            return False
+
+    def find_reusable_container(self, image_id, fingerprint):
+        try:
+            existing_container = self.client.containers.get(self.name)
+        except docker.errors.NotFound:
+            logger.info("Container does not exist. Creating a new one.")
+            return None
+
+        builds = self.load_pool_state().get(self.name, {}).get("builds", 0)
+        labels = existing_container.labels or {}
+        if existing_container.image.id != image_id:
+            reason = "image changed"
+        elif labels.get(ENV_FINGERPRINT_LABEL) != fingerprint:
+            reason = "environment changed"
+        elif builds >= self.get_max_builds():
+            reason = f"recycled after {builds} builds"
+        elif not self.is_healthy(existing_container):
+            reason = "health check failed"
+        else:
+            logger.info(f"Reusing warm container {self.name} {existing_container.short_id}, builds: {builds}")
+            return existing_container
+
+        logger.info(f"Existing container {self.name} can not be reused ({reason}), removing it")
+        if existing_container.status == "running":
+            existing_container.stop()
+        existing_container.remove()
+        logger.info(f"Existing container removed: {self.name}")
+        return None
+
     def create_container(self):
         try:
-            # Check if container already exists and remove it
-            try:
-                existing_container = self.client.containers.get(self.name)
-                if existing_container.status == "running":
-                    existing_container.stop()
-                existing_container.remove()
-                logger.info(f"Existing container removed: {self.name}")
-            except docker.errors.NotFound:
-                logger.info("Container does not exist. Creating a new one.")
+            image_id = self.get_image_id()
+            fingerprint = self.get_env_fingerprint()
+            self.container = self.find_reusable_container(image_id, fingerprint)
+            if self.container is not None:
+                return
 
             # Create and start a new container
             self.container = self.client.containers.run(
@@ -82,16 +169,38 @@ class ContainerManager:
                 name=self.name,
                 volumes=self.volumes,
                 network_mode='host',
+                labels={ENV_FINGERPRINT_LABEL: fingerprint},
                 tty=True
             )
             logger.info(f"Container created: {self.container.short_id}")
 
             self.setup_environment()
+            with POOL_STATE_LOCK:
+                state = self.load_pool_state()
+                state[self.name] = {"builds": 0, "image_id": image_id, "created": datetime.now().isoformat()}
+                self.save_pool_state(state)
         except docker.errors.ContainerError as e:
             logger.error(f"Container creation failed: {e}")
         except Exception as e:
             logger.error(f"Exception occurred while creating container: {e}")
 
+    def record_build(self):
+        with POOL_STATE_LOCK:
+            state = self.load_pool_state()
+            container_state = state.setdefault(self.name, {"builds": 0})
+            container_state["builds"] = container_state.get("builds", 0) + 1
+            container_state["last_build"] = datetime.now().isoformat()
+            self.save_pool_state(state)
+
+    @staticmethod
+    def warm_pool(path_manager, os_infos=None, maven_mirror_url=None):
+        """Create and provision the build containers ahead of the builds, one per OS/arch."""
+        if not os_infos:
+            os_infos = [tuple(fullos.split("_", 2)) for fullos in DOCKER_IMAGE_MAP.keys()]
+        for os_info in os_infos:
+            logger.info(f"Warming build container for {os_info}")
+            ContainerManager(os_info, PathManager(path_manager.ci_config, os_info), maven_mirror_url).create_container()
+
     def remove_container(self):
         try:
             if self.container:
@@ -101,23 +210,61 @@ class ContainerManager:
         except Exception as e:
             logger.error(f"Exception occurred while removing container: {e}")
 
-    def execute_command(self, command, workdir=None):
+    def stream_exec_output(self, exec_id, log_file, tail):
+        tail_size = 0
+        sink = open(log_file, 'ab') if log_file else None
+        try:
+            for chunk in self.client.api.exec_start(exec_id, stream=True):
+                if sink:
+                    sink.write(chunk)
+                    sink.flush()
+                tail.append(chunk)
+                tail_size += len(chunk)
+                while tail_size > EXEC_OUTPUT_TAIL_BYTES and len(tail) > 1:
+                    tail_size -= len(tail.popleft())
+        finally:
+            if sink:
+                sink.close()
+
+    def kill_exec(self, exec_id):
+        pid = self.client.api.exec_inspect(exec_id).get("Pid")
+        if pid:
+            logger.info(f"Killing docker exec process tree {pid}")
+            kill_process_tree(pid)
+
+    def execute_command(self, command, workdir=None, log_file=None, timeout=None, cancel_event=None):
+        """
+        Run command in the container and stream its output to log_file as it arrives.
+        Only the last EXEC_OUTPUT_TAIL_BYTES of output are kept and returned. The command is killed when it runs
+        longer than timeout seconds or when cancel_event is set.
+        """
         if not self.container:
             logger.error("No container is available to execute the command.")
             return -1, "No container"
         try:
-            exec_log = self.container.exec_run(
-                cmd=command,
-                workdir=workdir
-            )
-            exit_code = exec_log.exit_code
-            # Check if the output is a stream or bytes
-            if hasattr(exec_log.output, 'decode'):
-                # If it's bytes, decode it to a string
-                output_str = exec_log.output.decode('utf-8')
-            else:
-                # If it's a stream, read and decode it
-                output_str = exec_log.output.read().decode('utf-8')
+            exec_id = self.client.api.exec_create(self.container.id, cmd=command, workdir=workdir)["Id"]
+            tail = collections.deque()
+            reader = threading.Thread(target=self.stream_exec_output, args=(exec_id, log_file, tail), daemon=True)
+            reader.start()
+
+            deadline = time.time() + timeout if timeout else None
+            while reader.is_alive():
+                reader.join(EXEC_POLL_INTERVAL)
+                if not reader.is_alive():
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.error(f"Docker command cancelled: {command}")
+                    self.kill_exec(exec_id)
+                    break
+                if deadline and time.time() > deadline:
+                    logger.error(f"Docker command timed out after {timeout}s: {command}")
+                    self.kill_exec(exec_id)
+                    break
+            reader.join(EXEC_POLL_INTERVAL)
+
+            exit_code = self.client.api.exec_inspect(exec_id).get("ExitCode")
+            exit_code = -1 if exit_code is None else exit_code
+            output_str = b"".join(tail).decode('utf-8', errors='replace')
 
             if exit_code == 0:
                 logger.info(f"Docker command executed successfully: {command}")
@@ -132,4 +279,4 @@ class ContainerManager:
             return -1, str(e)
         except Exception as e:
             logger.error(f"Exception occurred while executing docker command: {e}")
-            return -1, str(e)
\ No newline at end of file
+            return -1, str(e)
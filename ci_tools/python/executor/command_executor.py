@@ -49,6 +49,8 @@ class CommandExecutor:
             return exit_status
 
     @staticmethod
-    def execute_docker_command(container_manager: ContainerManager, command, workdir=None):
-        exit_code, output = container_manager.execute_command(command, workdir)
+    def execute_docker_command(container_manager: ContainerManager, command, workdir=None, log_file=None,
+                               timeout=None, cancel_event=None):
+        exit_code, output = container_manager.execute_command(command, workdir, log_file=log_file, timeout=timeout,
+                                                              cancel_event=cancel_event)
         return exit_code, output
\ No newline at end of file
@@ -11,6 +11,8 @@ import subprocess
 import time
 import pwd
 from python.nexus.nexus_client import NexusClient
+from python.release.archive_writer import read_archive
+from python.release.seekable_zstd import read_index
 from python.utils.os_utils import *
 
 logger = get_logger()
@@ -70,11 +72,18 @@ class Installer:
         if extension == ".gz" or extension == ".bz2":
             with tarfile.open(file_path, "r") as tar:
                 return self._get_top_level_dir_name_from_members(tar.getnames())
+        elif extension == ".zst":
+            # a seekable release lists its members in its index, no need to decompress it
+            index = read_index(file_path)
+            if index is not None:
+                return self._get_top_level_dir_name_from_members([name for name, _, _ in index])
+            with read_archive(file_path) as tar:
+                return self._get_top_level_dir_name_from_members([member.name for member in tar])
         elif extension == ".zip":
             with zipfile.ZipFile(file_path, "r") as zip_ref:
                 return self._get_top_level_dir_name_from_members(zip_ref.namelist())
         else:
-            raise ValueError(f"Unsupported file extension: {extension}. Only .tar.gz, .bz2 and .zip are supported.")
+            raise ValueError(f"Unsupported file extension: {extension}. Only .tar.gz, .bz2, .zst and .zip are supported.")
 
     def _get_top_level_dir_name_from_members(self, members):
         top_level_dirs = {name.split("/", 1)[0] for name in members}
@@ -110,10 +119,13 @@ class Installer:
         elif extension == ".bz2":
             # Use tar command to extract .bz2 file
             run_shell_command(['tar', '-xjf', file_path, '-C', self.comp_dir, '--strip-components=1'])
+        elif extension == ".zst":
+            run_shell_command(['tar', '-I', 'zstd --long=31', '-xf', file_path, '-C', self.comp_dir,
+                               '--strip-components=1'])
         elif extension == ".zip":
             run_shell_command(['unzip', '-d', self.install_dir, file_path])
         else:
-            raise ValueError(f"Unsupported file extension: {extension}. Only .tar.gz, .tar.bz2 and .zip are supported.")
+            raise ValueError(f"Unsupported file extension: {extension}. Only .tar.gz, .tar.bz2, .tar.zst and .zip are supported.")
 
     def fetch_and_unpack(self):
         self.download_package()
@@ -0,0 +1,234 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger(name="nexus_client", log_file="nexus_client.log")
+
+# a request slower than this many times the best recent latency counts as a latency spike
+LATENCY_SPIKE_RATIO = 3
+PROGRESS_INTERVAL = 30
+
+
+class MultipartFileBody:
+    """
+    multipart/form-data body that reads the file while it is sent instead of encoding it in memory.
+    requests streams objects with read() and uses __len__ for the Content-Length header.
+    """
+
+    def __init__(self, fields, file_field, file_path, chunk_size=1024 * 1024):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        preamble = b""
+        for name, value in fields.items():
+            preamble += (f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                         f"{value}\r\n").encode()
+        preamble += (f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{file_field}\"; "
+                     f"filename=\"{os.path.basename(file_path)}\"\r\n"
+                     f"Content-Type: application/octet-stream\r\n\r\n").encode()
+        self.parts = [preamble, None, f"\r\n--{self.boundary}--\r\n".encode()]
+        self.length = len(preamble) + os.path.getsize(file_path) + len(self.parts[2])
+        self.file = None
+        self.part_index = 0
+        self.part_offset = 0
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.chunk_size
+        while self.part_index < len(self.parts):
+            part = self.parts[self.part_index]
+            if part is None:
+                if self.file is None:
+                    self.file = open(self.file_path, 'rb')
+                data = self.file.read(size)
+                if data:
+                    return data
+                self.file.close()
+            else:
+                data = part[self.part_offset:self.part_offset + size]
+                self.part_offset += len(data)
+                if data:
+                    return data
+            self.part_index += 1
+            self.part_offset = 0
+        return b""
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class TokenBucket:
+    """Allow rate requests per second on average with bursts of up to burst requests, rate 0 means no limit."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """
+    Bound the requests in flight and adapt the bound: it grows by one after a full window of healthy requests and is
+    halved on a server error or a latency spike.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=None):
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = initial_limit or max(min_limit, self.max_limit // 2)
+        self.in_flight = 0
+        self.successes = 0
+        self.best_latency = None
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            while self.in_flight >= self.limit:
+                await self.condition.wait()
+            self.in_flight += 1
+
+    async def release(self, latency, server_error):
+        async with self.condition:
+            self.in_flight -= 1
+            spike = self.best_latency is not None and latency > self.best_latency * LATENCY_SPIKE_RATIO
+            if not server_error:
+                self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+            if server_error or spike:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.successes = 0
+                logger.info(f"upload concurrency down to {self.limit}, server_error:{server_error} "
+                            f"latency:{latency:.1f}s")
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            # wake only as many waiters as there are free slots
+            free_slots = self.limit - self.in_flight
+            if free_slots > 0:
+                self.condition.notify(free_slots)
+
+
+class AsyncUploader:
+    """
+    Upload many files with asyncio: max_concurrency workers take the items from a queue, in flight requests are
+    bounded by an AdaptiveLimiter, every host has its own TokenBucket rate limit and the blocking requests of
+    upload_func run on a thread pool sharing one HTTP session.
+    upload_func(item) returns the HTTP status code, item is a (file_path, url, ...) tuple.
+    """
+
+    def __init__(self, upload_func, max_concurrency, rate_limit=0):
+        self.upload_func = upload_func
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limit = rate_limit
+        self.buckets = {}
+        self.limiter = None
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.done_bytes = 0
+        self.start_time = None
+        # file_path -> last status code of the failed uploads, None when no response was received
+        self.failure_statuses = {}
+
+    def get_bucket(self, host):
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate_limit)
+        return self.buckets[host]
+
+    def get_progress(self):
+        elapsed = max(time.time() - self.start_time, 0.001)
+        return (f"uploaded {self.done_files}/{self.total_files} files, {self.done_bytes // 1024 ** 2}/"
+                f"{self.total_bytes // 1024 ** 2}MB, {self.done_bytes / 1024 ** 2 / elapsed:.1f}MB/s, "
+                f"{self.done_files / elapsed:.1f} files/s, concurrency {self.limiter.limit}")
+
+    async def report_progress(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            logger.info(self.get_progress())
+
+    async def upload_one(self, executor, host, item):
+        file_path = item[0]
+        await self.limiter.acquire()
+        status_code, start = None, time.monotonic()
+        try:
+            await self.get_bucket(host).acquire()
+            start = time.monotonic()
+            status_code = await asyncio.get_event_loop().run_in_executor(executor, self.upload_func, item)
+        except Exception as e:
+            logger.error(f"Upload resulted in an exception for {file_path}: {e}")
+        finally:
+            await self.limiter.release(time.monotonic() - start, status_code is None or status_code >= 500)
+        success = status_code is not None and 200 <= status_code < 300
+        if success:
+            self.done_files += 1
+            self.done_bytes += os.path.getsize(file_path)
+        else:
+            self.failure_statuses[file_path] = status_code
+            logger.error(f"Upload failed for {file_path}, status code: {status_code}")
+        return success
+
+    async def upload_worker(self, executor, queue, get_host, results):
+        while not queue.empty():
+            index, item = queue.get_nowait()
+            results[index] = await self.upload_one(executor, get_host(item), item)
+
+    async def upload_items(self, items, get_host):
+        self.limiter = AdaptiveLimiter(self.max_concurrency)
+        self.total_files = len(items)
+        self.total_bytes = sum(os.path.getsize(item[0]) for item in items)
+        self.start_time = time.time()
+        queue = asyncio.Queue()
+        for index_item in enumerate(items):
+            queue.put_nowait(index_item)
+        results = [False] * len(items)
+        reporter = asyncio.ensure_future(self.report_progress())
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                # a bounded pool of workers, the limiter never has more waiters than max_concurrency
+                workers = min(self.max_concurrency, len(items))
+                await asyncio.gather(*[self.upload_worker(executor, queue, get_host, results)
+                                       for _ in range(workers)])
+        finally:
+            reporter.cancel()
+        logger.info(self.get_progress())
+        return [item for item, success in zip(items, results) if not success]
+
+    def run(self, items, get_host=lambda item: ""):
+        """Upload all items and return the ones that failed."""
+        if not items:
+            return []
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.upload_items(items, get_host))
+        finally:
+            loop.close()
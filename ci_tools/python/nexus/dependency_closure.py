@@ -0,0 +1,174 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import os
+import re
+import shutil
+import subprocess
+from collections import deque
+
+import yaml
+
+from python.common.basic_logger import get_logger
+from python.common.constants import ANSIBLE_PRJ_DIR
+
+logger = get_logger(name="nexus_sync", log_file="nexus_sync.log")
+
+PLAYBOOK_ROLES_DIR = os.path.join(ANSIBLE_PRJ_DIR, "playbooks/roles")
+# vars file the playbooks load on each os, see the include_vars of roles/common
+PLAYBOOK_VARS_FILES = {
+    "centos7": "redhat-7.yml",
+    "centos8": "redhat-8.yml",
+    "openeuler22": "redhat-22.yml",
+    "kylinv10": "kylin_linux_advanced_server.yml",
+}
+# roles that install packages from lists in their vars files
+PLAYBOOK_PACKAGE_ROLES = ["common", "database"]
+# installed by the ambari roles, their requires come with the bigtop rpms
+AMBARI_PACKAGES = ["ambari-agent", "ambari-server"]
+
+
+def rpm_vercmp(a, b):
+    """Compare two version or release strings the way rpm does, return -1, 0 or 1."""
+    if a == b:
+        return 0
+    segments_a = re.findall(r"~|\d+|[a-zA-Z]+", a)
+    segments_b = re.findall(r"~|\d+|[a-zA-Z]+", b)
+    while segments_a or segments_b:
+        seg_a = segments_a.pop(0) if segments_a else None
+        seg_b = segments_b.pop(0) if segments_b else None
+        # a tilde sorts before anything, even the end of the string
+        if seg_a == "~" or seg_b == "~":
+            if seg_a != seg_b:
+                return -1 if seg_a == "~" else 1
+            continue
+        if seg_a is None or seg_b is None:
+            return -1 if seg_a is None else 1
+        if seg_a.isdigit() != seg_b.isdigit():
+            # numeric segments are newer than alpha ones
+            return 1 if seg_a.isdigit() else -1
+        if seg_a.isdigit():
+            seg_a, seg_b = int(seg_a), int(seg_b)
+        if seg_a != seg_b:
+            return 1 if seg_a > seg_b else -1
+    return 0
+
+
+def compare_evr(pinfo_a, pinfo_b):
+    for key in ("epoch", "ver", "rel"):
+        result = rpm_vercmp(pinfo_a.get(key) or "0", pinfo_b.get(key) or "0")
+        if result:
+            return result
+    return 0
+
+
+def get_capability_name(requirement):
+    """'jdk >= 1.8' -> 'jdk', rpmlib() requires are satisfied by rpm itself and give None."""
+    name = requirement.strip().split(" ")[0]
+    if not name or name.startswith("rpmlib(") or name.startswith("("):
+        # rich dependencies are not resolved, their alternatives are usually pulled in by other requires
+        return None
+    return name
+
+
+def load_playbook_packages(os_key, roles_dir=PLAYBOOK_ROLES_DIR):
+    """Names of the packages the playbook roles install on os_key, exp: centos7."""
+    vars_file_name = PLAYBOOK_VARS_FILES.get(os_key)
+    if vars_file_name is None:
+        raise Exception(f"no playbook vars file known for {os_key}")
+    roles_vars = {}
+    for role in PLAYBOOK_PACKAGE_ROLES:
+        vars_file = os.path.join(roles_dir, role, "vars", vars_file_name)
+        if os.path.exists(vars_file):
+            with open(vars_file, 'r') as f:
+                roles_vars[role] = yaml.safe_load(f) or {}
+
+    packages = list(AMBARI_PACKAGES)
+    for role_vars in roles_vars.values():
+        for key, value in role_vars.items():
+            if key == "versioned_packages":
+                packages.extend(name for item in value for name in item["pkg_name"].split())
+            elif key == "packages" or key.endswith("_packages"):
+                packages.extend(value)
+    # the only template used in the package lists
+    major_version = str(roles_vars.get("database", {}).get("postgres_major_version", ""))
+    return [re.sub(r"{{\s*postgres_major_version\s*}}", major_version, name) for name in packages]
+
+
+def query_rpm_files(rpm_files, query):
+    result = subprocess.run(["rpm", "-qp", query] + rpm_files, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    if result.returncode != 0:
+        raise Exception(f"rpm -qp {query} failed: {result.stderr}")
+    return {line.strip() for line in result.stdout.splitlines() if line.strip()}
+
+
+def load_bigtop_capabilities(rpm_files):
+    """(requires, provides) of the bigtop rpms, requires they satisfy themselves are left out."""
+    if not rpm_files:
+        return [], set()
+    if not shutil.which("rpm"):
+        raise Exception("rpm is required to read the requires of the bigtop packages")
+    provides = {get_capability_name(p) for p in query_rpm_files(rpm_files, "--provides")}
+    provides.update(query_rpm_files(rpm_files, "--queryformat=[%{FILENAMES}\\n]"))
+    requires = {get_capability_name(r) for r in query_rpm_files(rpm_files, "--requires")}
+    return sorted(r for r in requires if r and r not in provides), provides
+
+
+class DependencyClosure:
+    """
+    Resolve the set of packages needed to install some seed packages from the provides and requires of the
+    repo metadata. Version constraints are not evaluated, every capability is satisfied by the newest package
+    providing it, preferring a package of the same name.
+    """
+
+    def __init__(self):
+        # name -> newest (repo_key, pinfo) of that name
+        self.packages = {}
+        # capability -> names of the packages providing it
+        self.providers = {}
+        self.missing = set()
+
+    def add_package(self, repo_key, pinfo):
+        current = self.packages.get(pinfo["name"])
+        if current is not None and compare_evr(current[1], pinfo) >= 0:
+            return
+        self.packages[pinfo["name"]] = (repo_key, pinfo)
+        for capability in [pinfo["name"]] + pinfo.get("provides", []) + pinfo.get("files", []):
+            self.providers.setdefault(capability, set()).add(pinfo["name"])
+
+    def get_provider(self, capability):
+        names = self.providers.get(capability)
+        if not names:
+            return None
+        if capability in names:
+            return capability
+        # the same capability resolves to the same package on every run
+        return sorted(names)[0]
+
+    def resolve(self, seeds):
+        """Return {repo_key: {name: pinfo}} of the seeds and everything they require."""
+        resolved = {}
+        queue = deque(seeds)
+        seen = set()
+        while queue:
+            capability = queue.popleft()
+            if capability is None or capability in seen:
+                continue
+            seen.add(capability)
+            name = self.get_provider(capability)
+            if name is None:
+                self.missing.add(capability)
+                continue
+            if name in resolved:
+                continue
+            repo_key, pinfo = self.packages[name]
+            resolved[name] = (repo_key, pinfo)
+            queue.extend(get_capability_name(r) for r in pinfo.get("requires", []))
+
+        closure = {}
+        for name, (repo_key, pinfo) in resolved.items():
+            closure.setdefault(repo_key, {})[name] = pinfo
+        if self.missing:
+            logger.warning(f"{len(self.missing)} capabilities have no provider in the os repos: {sorted(self.missing)}")
+        logger.info(f"dependency closure of {len(set(seeds))} seeds: {len(resolved)} of {len(self.packages)} packages")
+        return closure
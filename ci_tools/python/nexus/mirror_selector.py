@@ -0,0 +1,132 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger(name="nexus_sync", log_file="nexus_sync.log")
+
+PROBE_BYTES = 512 * 1024
+# weight of the newest sample in the throughput average
+EWMA_ALPHA = 0.3
+MAX_CONSECUTIVE_FAILURES = 3
+# a mirror slower than this fraction of the fastest one is demoted
+SLOW_RATIO = 0.2
+DEMOTE_SECONDS = 300
+
+
+class Mirror:
+    def __init__(self, url):
+        self.url = url
+        self.latency = None
+        # bytes per second
+        self.throughput = None
+        self.failures = 0
+        self.demoted_until = 0
+
+    def is_healthy(self, now):
+        # a mirror whose probe failed is tried again once its demotion expires, unmeasured until it succeeds
+        return self.demoted_until <= now
+
+    def __repr__(self):
+        throughput = "-" if self.throughput is None else f"{self.throughput / 1024 ** 2:.1f}MB/s"
+        latency = "-" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        return f"{self.url} ({throughput}, {latency})"
+
+
+class MirrorSelector:
+    """
+    Spread downloads over the mirrors of a repo.
+    Mirrors are ranked by a probe of latency and throughput, then picked at random weighted by their throughput, which
+    is updated from every download. A mirror that fails repeatedly or falls far behind the fastest one is demoted for a
+    while; when all mirrors are demoted the best of them is still used.
+    """
+
+    def __init__(self, urls, session=None, timeout=(5, 30)):
+        self.mirrors = [Mirror(url) for url in urls]
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.lock = threading.Lock()
+
+    def probe_mirror(self, mirror, sample_path):
+        url = urljoin(mirror.url, sample_path)
+        try:
+            start = time.time()
+            with self.session.get(url, headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"}, stream=True,
+                                  timeout=self.timeout) as response:
+                latency = time.time() - start
+                if response.status_code not in (200, 206):
+                    raise Exception(f"status code {response.status_code}")
+                received = 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    received += len(chunk)
+                    if received >= PROBE_BYTES:
+                        break
+            elapsed = max(time.time() - start, 0.001)
+            mirror.latency, mirror.throughput, mirror.failures = latency, received / elapsed, 0
+        except Exception as e:
+            logger.warning(f"mirror {mirror.url} probe failed: {e}")
+            mirror.throughput = None
+            mirror.demoted_until = time.time() + DEMOTE_SECONDS
+
+    def probe(self, sample_path):
+        """Measure every mirror by fetching the start of sample_path, a file all mirrors have."""
+        if len(self.mirrors) == 1:
+            # nothing to choose from, do not spend a request on it
+            self.mirrors[0].throughput = self.mirrors[0].throughput or 1
+            return self.get_ranking()
+        with ThreadPoolExecutor(max_workers=len(self.mirrors)) as executor:
+            list(executor.map(lambda mirror: self.probe_mirror(mirror, sample_path), self.mirrors))
+        ranking = self.get_ranking()
+        logger.info(f"mirror ranking: {ranking}")
+        return ranking
+
+    def get_ranking(self):
+        now = time.time()
+        return sorted(self.mirrors, key=lambda m: (not m.is_healthy(now), -(m.throughput or 0)))
+
+    def pick(self, exclude=()):
+        with self.lock:
+            now = time.time()
+            candidates = [m for m in self.mirrors if m.url not in exclude]
+            healthy = [m for m in candidates if m.is_healthy(now)]
+            if not healthy:
+                # every mirror is demoted, fall back to the best known one
+                return sorted(candidates, key=lambda m: -(m.throughput or 0))[0].url if candidates else None
+            # an unmeasured mirror gets the weight of the slowest measured one until a download measures it
+            measured = [m.throughput for m in healthy if m.throughput is not None]
+            default_weight = min(measured) if measured else 1
+            return random.choices(healthy, weights=[m.throughput or default_weight for m in healthy])[0].url
+
+    def report(self, url, success, size=0, seconds=0):
+        with self.lock:
+            mirror = next(m for m in self.mirrors if m.url == url)
+            now = time.time()
+            if not success:
+                mirror.failures += 1
+                if mirror.failures >= MAX_CONSECUTIVE_FAILURES:
+                    self.demote(mirror, now, f"{mirror.failures} consecutive failures")
+                return
+            mirror.failures = 0
+            if size and seconds > 0:
+                sample = size / seconds
+                mirror.throughput = sample if mirror.throughput is None else \
+                    EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * mirror.throughput
+            if mirror.throughput is None:
+                return
+            healthy = [m for m in self.mirrors if m.is_healthy(now)]
+            best = max(m.throughput or 0 for m in healthy) if healthy else 0
+            if len(healthy) > 1 and mirror.throughput < best * SLOW_RATIO:
+                self.demote(mirror, now, f"throughput {mirror.throughput / 1024 ** 2:.2f}MB/s, "
+                                         f"best {best / 1024 ** 2:.2f}MB/s")
+
+    def demote(self, mirror, now, reason):
+        mirror.demoted_until = now + DEMOTE_SECONDS
+        mirror.failures = 0
+        logger.warning(f"demote mirror {mirror.url} for {DEMOTE_SECONDS}s: {reason}")
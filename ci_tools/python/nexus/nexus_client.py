@@ -1,6 +1,10 @@
+import gzip
+import random
 import time
+import xml.etree.ElementTree as ET
 
 import requests
+from requests.adapters import HTTPAdapter
 from python.common.basic_logger import get_logger
 import os
 import glob
@@ -9,16 +13,89 @@ from python.utils.os_utils import *
 import json
 from functools import wraps
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+from python.nexus.async_uploader import AsyncUploader, MultipartFileBody
+from python.nexus.upload_ledger import UploadLedger, UPLOAD_LEDGER_FILE_NAME
 
 logger = get_logger(name="nexus_client", log_file="nexus_client.log")
 
+DEFAULT_UPLOAD_THREADS = 10
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (10, 300)
+# longest wait for nexus to publish the repodata of uploaded packages
+DEFAULT_REPODATA_TIMEOUT = 15 * 60
+REPODATA_POLL_INTERVAL = 10
+REPODATA_SAMPLE_SIZE = 5
+REPO_NS = "{http://linux.duke.edu/metadata/repo}"
+COMMON_NS = "{http://linux.duke.edu/metadata/common}"
+# statuses worth another attempt, any other status is final
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+DEFAULT_MAX_RETRIES = 4
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+
+
+def retry(max_retries=DEFAULT_MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """
+    Retry a request function that returns an HTTP status code when the status is retryable or the connection failed,
+    waiting a random time up to base_delay * 2^attempt between attempts.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_retries + 1):
+                try:
+                    status_code = func(*args, **kwargs)
+                    if status_code not in RETRYABLE_STATUS_CODES:
+                        return status_code
+                    reason = f"status {status_code}"
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt == max_retries:
+                        raise
+                    reason = str(e)
+                if attempt == max_retries:
+                    return status_code
+                delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                logger.info(f"{func.__name__} failed with {reason}, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+        return wrapper
+
+    return decorator
+
 
 class NexusClient:
-    def __init__(self, server_host, username, password):
+    def __init__(self, server_host, username, password, upload_threads=DEFAULT_UPLOAD_THREADS,
+                 timeout=DEFAULT_TIMEOUT, upload_rate_limit=0, repodata_timeout=DEFAULT_REPODATA_TIMEOUT,
+                 ledger_file=None):
         self.server_host = server_host
         self.server_por = "8081"
         self.auth = (username, password)
+        # upper bound of the concurrent uploads, the uploader adapts the actual concurrency below it
+        self.upload_threads = upload_threads
+        # uploads per second, 0 for no limit
+        self.upload_rate_limit = upload_rate_limit
+        self.repodata_timeout = repodata_timeout
+        self.ledger = UploadLedger(ledger_file or os.path.join(OUTPUT_DIR, UPLOAD_LEDGER_FILE_NAME))
+        self.timeout = timeout
+        self.session = self.create_session()
+        # repo_name -> {path: asset}, the repo is listed once for all the components
+        self.asset_listings = {}
+        # (repo_name, path prefix) changed since the repo was listed
+        self.changed_asset_prefixes = set()
+
+    def create_session(self):
+        # One keep-alive connection per upload thread, reused for every request instead of a new one per rpm.
+        session = requests.Session()
+        session.auth = self.auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.upload_threads, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        self.session.close()
 
     def get_nexus_url(self):
         return f"http://{self.server_host}:{self.server_por}"
@@ -57,47 +134,41 @@ class NexusClient:
         base_url = f"{self.get_nexus_url()}/repository/{repo_name}/{relative_dir}/{component_dir_name}"
         return base_url
 
-    def retry(max_retries):
-        def decorator(func):
-            @wraps(func)
-            def wrapper(*args, **kwargs):
-                for i in range(max_retries):
-                    result = func(*args, **kwargs)
-                    if result:
-                        return result
-                    else:
-                        logger.info(f"Retry {i + 1}/{max_retries}")
-                return False
-
-            return wrapper
-
-        return decorator
-
-    def upload_rpm_to_yum_repo(self, file_path, repo_name, yum_directory):
+    @retry()
+    def post_yum_asset(self, file_path, repo_name, yum_directory):
         url = f"{self.get_nexus_url()}/service/rest/v1/components?repository={repo_name}"
-        files = {'yum.asset': (file_path.split('/')[-1], open(file_path, 'rb'))}
         data = {
             'yum.asset.filename': file_path.split('/')[-1],
             'yum.directory': yum_directory
         }
-        response = requests.post(url, auth=self.auth, data=data, files=files)
-        if response.status_code == 204:
-            return True
-        logger.error(
-            f"Upload  failed for {file_path}, {url} Status code:{response.status_code} Headers:  {response.headers}")
-        return True
+        body = MultipartFileBody(data, 'yum.asset', file_path)
+        try:
+            response = self.session.post(url, data=body, headers={'Content-Type': body.content_type},
+                                         timeout=self.timeout)
+        finally:
+            body.close()
+        if response.status_code != 204:
+            logger.error(
+                f"Upload  failed for {file_path}, {url} Status code:{response.status_code} Headers:  {response.headers}")
+        return response.status_code
 
-    @retry(max_retries=3)
-    def upload(self, file_path, base_url):
+    def upload_rpm_to_yum_repo(self, file_path, repo_name, yum_directory):
+        return self.post_yum_asset(file_path, repo_name, yum_directory) == 204
+
+    @retry()
+    def put_file(self, file_path, base_url):
         with open(file_path, 'rb') as f:
-            response = requests.put(base_url, data=f, auth=self.auth)
-            if response.status_code == 200:
-                logger.info(f"Upload completed for {file_path}, {base_url}")
-                return True
-            else:
-                logger.info(
-                    f"Upload failed for {file_path}, {base_url} Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
-                return False
+            response = self.session.put(base_url, data=f, timeout=self.timeout)
+        if response.status_code != 200:
+            logger.info(
+                f"Upload failed for {file_path}, {base_url} Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
+        return response.status_code
+
+    def upload(self, file_path, base_url):
+        if self.put_file(file_path, base_url) == 200:
+            logger.info(f"Upload completed for {file_path}, {base_url}")
+            return True
+        return False
 
     def upload_os_pkgs(self, file_path, os_info):
         is_success = self.upload_rpm_to_yum_repo(file_path, self.get_os_repo_name(os_info),
@@ -109,55 +180,203 @@ class NexusClient:
                                                  self.get_udh_yum_dir(component_dir_name))
         return is_success
 
-    def batch_upload_os_pkgs(self, source_dirs, os_info, num_threads=10):
-        for source_dir in source_dirs:
-            filepaths = glob.glob(os.path.join(source_dir, "**", "*.rpm"), recursive=True)
-            non_src_filepaths = [fp for fp in filepaths if not fp.endswith("src.rpm")]
-
-            with ThreadPoolExecutor(max_workers=num_threads) as executor:
-                futures = {executor.submit(self.upload_os_pkgs, filepath, os_info): filepath for filepath in
-                           non_src_filepaths}
-
-                for future in as_completed(futures):
-                    filepath = futures[future]
-                    try:
-                        success = future.result()
-                        if success:
-                            logger.info(f"Upload was successful for {filepath}")
-                        else:
-                            logger.info(f"Upload failed for {filepath}")
-                    except Exception as e:
-                        logger.error(f"Upload resulted in an exception for {filepath}: {e}")
-        self.rebuild_index(self.get_os_repo_name(os_info))
-        # Wait for Nexus to automatically refresh the repodata build.
-        sleep_with_logging(15 * 60, 10, "waiting nexus rebuild repodata")
-
-    def batch_upload_bigdata_pkgs(self, source_dir, component_dir_name, num_threads=10):
+    def get_rpm_files(self, source_dir):
         filepaths = glob.glob(os.path.join(source_dir, "**", "*.rpm"), recursive=True)
-        non_src_filepaths = [fp for fp in filepaths if not fp.endswith("src.rpm")]
+        return [fp for fp in filepaths if not fp.endswith("src.rpm")]
+
+    def batch_upload(self, items, max_concurrency=None):
+        """Upload (file_path, repo_name, yum_directory) items to yum repos and return the failed ones."""
+        uploader = AsyncUploader(lambda item: self.post_yum_asset(*item), max_concurrency or self.upload_threads,
+                                 self.upload_rate_limit)
+        failed = uploader.run(items, get_host=lambda item: self.server_host)
+        self.ledger.update(items, failed, uploader.failure_statuses)
+        return failed
+
+    def batch_upload_os_pkgs(self, source_dirs, os_info, max_concurrency=None, rpm_names=None):
+        """rpm_names limits the upload to the packages of these file names."""
+        repo_name, yum_dir = self.get_os_repo_name(os_info), self.get_os_yum_dir(os_info)
+        items = [(fp, repo_name, yum_dir) for source_dir in source_dirs for fp in self.get_rpm_files(source_dir)
+                 if rpm_names is None or os.path.basename(fp) in rpm_names]
+        previous_state = self.get_repodata_state(repo_name, yum_dir)
+        failed = self.batch_upload(items, max_concurrency)
+        if failed:
+            logger.error(f"Upload failed for {len(failed)} of {len(items)} os packages: {[i[0] for i in failed]}")
+        failed_items = set(failed)
+        uploaded = [i[0] for i in items if i not in failed_items]
+        if uploaded:
+            self.rebuild_index(repo_name)
+            self.wait_for_repodata(repo_name, yum_dir, previous_state, uploaded)
+        self.ledger.report()
+
+    def list_assets(self, repo_name):
+        """All assets of repo_name: {path: asset}, asset has id and checksum."""
+        url = f"{self.get_nexus_url()}/service/rest/v1/search/assets"
+        params = {"repository": repo_name}
+        assets = {}
+        while True:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code != 200:
+                raise Exception(f"search assets of {repo_name} failed, Status code:{response.status_code} "
+                                f"Body: {response.text}")
+            response_data = response.json()
+            for asset in response_data["items"]:
+                assets[asset["path"].lstrip("/")] = asset
+            if not response_data.get("continuationToken"):
+                return assets
+            params["continuationToken"] = response_data["continuationToken"]
+
+    def search_assets(self, repo_name, path_prefix):
+        """Assets of repo_name whose path starts with path_prefix: {path: asset}, from one listing of the repo."""
+        changed = {(repo, prefix) for repo, prefix in self.changed_asset_prefixes if repo == repo_name and
+                   (prefix.startswith(path_prefix) or path_prefix.startswith(prefix))}
+        if repo_name not in self.asset_listings or changed:
+            self.asset_listings[repo_name] = self.list_assets(repo_name)
+            self.changed_asset_prefixes = {key for key in self.changed_asset_prefixes if key[0] != repo_name}
+        return {path: asset for path, asset in self.asset_listings[repo_name].items() if path.startswith(path_prefix)}
+
+    def mark_assets_changed(self, repo_name, path_prefix):
+        """A later search under path_prefix lists the repo again instead of using the outdated listing."""
+        self.changed_asset_prefixes.add((repo_name, path_prefix))
+
+    def delete_asset(self, asset_id):
+        url = f"{self.get_nexus_url()}/service/rest/v1/assets/{asset_id}"
+        response = self.session.delete(url, timeout=self.timeout)
+        if response.status_code not in (204, 404):
+            logger.error(f"delete asset {asset_id} failed, Status code:{response.status_code} Body: {response.text}")
+            return False
+        return True
+
+    def diff_assets(self, filepaths, remote_assets, yum_dir, num_threads=None):
+        """Compare local rpms with the assets in yum_dir, return the files to upload and the stale assets."""
+        remote_dir = yum_dir.strip("/")
+        with ThreadPoolExecutor(max_workers=num_threads or self.upload_threads) as executor:
+            local_hashes = dict(zip(filepaths, executor.map(sha256_file, filepaths)))
+        to_upload, keep = [], set()
+        for file_path, sha256 in local_hashes.items():
+            path = f"{remote_dir}/{os.path.basename(file_path)}"
+            asset = remote_assets.get(path)
+            if asset and asset.get("checksum", {}).get("sha256") == sha256:
+                keep.add(path)
+            else:
+                to_upload.append(file_path)
+        stale = [asset for path, asset in remote_assets.items() if path not in keep]
+        return to_upload, stale
+
+    def batch_upload_bigdata_pkgs(self, source_dir, component_dir_name, max_concurrency=None):
+        non_src_filepaths = self.get_rpm_files(source_dir)
         logger.debug(f"non_src_filepaths: {non_src_filepaths}")
-        self.delete_folder(UDH_NEXUS_REPO_NAME, f"{UDH_NEXUS_REPO_PACKAGES_PATH}/{component_dir_name}")
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = {executor.submit(self.upload_bigdata_pkgs, filepath, component_dir_name): filepath for filepath in
-                       non_src_filepaths}
-            for future in as_completed(futures):
-                filepath = futures[future]
-                success = future.result()
-                if success:
-                    logger.info(f"Upload was successful for {filepath}")
-                else:
-                    logger.info(f"Upload failed for filepath: {filepath} source_dir:{source_dir}")
-                    raise Exception("upload bigdata components failed,please check the log and update again")
+        yum_dir = self.get_udh_yum_dir(component_dir_name)
+        remote_assets = self.search_assets(UDH_NEXUS_REPO_NAME, f"{yum_dir.strip('/')}/")
+        to_upload, stale = self.diff_assets(non_src_filepaths, remote_assets, yum_dir)
+        logger.info(f"{component_dir_name}: {len(non_src_filepaths) - len(to_upload)} packages unchanged, "
+                    f"{len(to_upload)} to upload, {len(stale)} stale assets to delete")
+        # unchanged packages are in nexus, drop them from the failures of earlier runs
+        changed = set(to_upload)
+        self.ledger.update([(fp, UDH_NEXUS_REPO_NAME, yum_dir) for fp in non_src_filepaths if fp not in changed], [])
+        if not to_upload and not stale:
+            return
+
+        previous_state = self.get_repodata_state(UDH_NEXUS_REPO_NAME, yum_dir)
+        self.mark_assets_changed(UDH_NEXUS_REPO_NAME, f"{yum_dir.strip('/')}/")
+
+        # Changed packages are deleted as well, the repo does not allow redeploying a path.
+        for asset in stale:
+            if not self.delete_asset(asset["id"]):
+                raise Exception(f"delete stale asset {asset['path']} failed, please check the log and update again")
+        failed = self.batch_upload([(fp, UDH_NEXUS_REPO_NAME, yum_dir) for fp in to_upload], max_concurrency)
+        if failed:
+            logger.info(f"Upload failed for filepaths: {[i[0] for i in failed]} source_dir:{source_dir}")
+            self.ledger.report()
+            raise Exception("upload bigdata components failed,please check the log and update again")
+        # deleted stale assets change the repodata too
         self.rebuild_index(UDH_NEXUS_REPO_NAME)
-        # Wait for Nexus to automatically refresh build repodata.
-        sleep_with_logging(15 * 60, 10, "waiting nexus rebuild repodata")
+        self.wait_for_repodata(UDH_NEXUS_REPO_NAME, yum_dir, previous_state, to_upload)
+
+    def upload_failed_packages(self):
+        """Upload again the packages the ledger lists as failed and return the ones that still fail."""
+        items = self.ledger.get_failed_items()
+        if not items:
+            logger.info("no failed uploads to retry")
+            return []
+        logger.info(f"retry the upload of {len(items)} packages")
+        # one repodata per repo and first directory of the yum path
+        repodata = {}
+        for _, repo_name, yum_dir in items:
+            key = (repo_name, yum_dir.strip("/").split("/")[0])
+            if key not in repodata:
+                repodata[key] = (yum_dir, self.get_repodata_state(repo_name, yum_dir))
+        failed = self.batch_upload(items)
+        failed_items = set(failed)
+        uploaded = [i for i in items if i not in failed_items]
+        # only the repos that got packages have new repodata to wait for
+        for repo_name in sorted({i[1] for i in uploaded}):
+            self.rebuild_index(repo_name)
+        for (repo_name, _), (yum_dir, previous_state) in repodata.items():
+            repodata_uploaded = [i[0] for i in uploaded if i[1] == repo_name and
+                                 i[2].strip("/").split("/")[0] == yum_dir.strip("/").split("/")[0]]
+            if repodata_uploaded:
+                self.wait_for_repodata(repo_name, yum_dir, previous_state, repodata_uploaded)
+        self.ledger.report()
+        return failed
+
+    def get_repodata_url(self, repo_name, yum_dir):
+        # Repos are created with repodataDepth 1, the repodata sits under the first directory of the yum path.
+        return f"{self.get_nexus_url()}/repository/{repo_name}/{yum_dir.strip('/').split('/')[0]}/repodata"
+
+    def get_repodata_state(self, repo_name, yum_dir):
+        """(revision, primary href) of the published repomd.xml, None if the repodata does not exist yet."""
+        response = self.session.get(f"{self.get_repodata_url(repo_name, yum_dir)}/repomd.xml", timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        root = ET.fromstring(response.content)
+        revision = root.findtext(f"{REPO_NS}revision")
+        primary_href = None
+        for data in root.findall(f"{REPO_NS}data"):
+            if data.get("type") == "primary":
+                primary_href = data.find(f"{REPO_NS}location").get("href")
+        return revision, primary_href
+
+    def get_primary_packages(self, repo_name, yum_dir, primary_href):
+        """File names of the packages listed in primary.xml."""
+        repo_url = self.get_repodata_url(repo_name, yum_dir).rsplit("/", 1)[0]
+        response = self.session.get(f"{repo_url}/{primary_href}", timeout=self.timeout)
+        if response.status_code != 200:
+            return set()
+        content = gzip.decompress(response.content) if primary_href.endswith(".gz") else response.content
+        root = ET.fromstring(content)
+        return {os.path.basename(location.get("href")) for location in root.iter(f"{COMMON_NS}location")}
+
+    def wait_for_repodata(self, repo_name, yum_dir, previous_state, uploaded_files):
+        """
+        Wait until nexus published new repodata that lists a sample of the uploaded packages, at most
+        repodata_timeout seconds. Nothing uploaded leaves the revision as it is, there is nothing to wait for.
+        """
+        if not uploaded_files:
+            return True
+        sample = [os.path.basename(fp) for fp in random.sample(uploaded_files,
+                                                                min(REPODATA_SAMPLE_SIZE, len(uploaded_files)))]
+        start_time = time.time()
+        while True:
+            state = self.get_repodata_state(repo_name, yum_dir)
+            if state is not None and state != previous_state and state[1]:
+                missing = set(sample) - self.get_primary_packages(repo_name, yum_dir, state[1])
+                if not missing:
+                    logger.info(f"repodata of {repo_name}{yum_dir} is ready after {int(time.time() - start_time)}s, "
+                                f"revision {state[0]}")
+                    return True
+                logger.info(f"repodata of {repo_name} revision {state[0]} does not list {sorted(missing)} yet")
+            if time.time() - start_time > self.repodata_timeout:
+                logger.warning(f"repodata of {repo_name}{yum_dir} not ready after {self.repodata_timeout}s, continue")
+                return False
+            logger.info(f"waiting nexus rebuild repodata of {repo_name}{yum_dir}")
+            time.sleep(REPODATA_POLL_INTERVAL)
 
     def rebuild_index(self, repo_name):
         url = f"{self.get_nexus_url()}/service/rest/v1/repositories/{repo_name}/rebuild-index"
         headers = {
             'Content-Type': 'application/json',
         }
-        response = requests.post(url, headers=headers, auth=self.auth)
+        response = self.session.post(url, headers=headers, timeout=self.timeout)
         logger.info(
             f"nexus rebuild_index url:{url} params:{repo_name}  Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
 
@@ -177,7 +396,7 @@ class NexusClient:
         }
 
         logger.info(f"------data is {data}")
-        response = requests.post(url, headers=headers, json=data, auth=self.auth)
+        response = self.session.post(url, headers=headers, json=data, timeout=self.timeout)
         logger.info(
             f"nexus delete_folder url:{url} params:{repo_name} {relative_path} Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
 
@@ -201,10 +420,52 @@ class NexusClient:
         }
 
         logger.info(f"------data is {data}")
-        response = requests.post(url, headers=headers, json=data, auth=self.auth)
+        response = self.session.post(url, headers=headers, json=data, timeout=self.timeout)
         logger.info(
             f"do_repo_create url:{url} repo_name:{repo_name} Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
 
+    def do_maven_repo_create(self, repo_name, recipe, attributes):
+        url = f"{self.get_nexus_url()}/service/extdirect"
+        headers = {
+            'Content-Type': 'application/json',
+        }
+        base_attributes = {"storage": {"blobStoreName": "default", "strictContentTypeValidation": True},
+                           "maven": {"versionPolicy": "MIXED", "layoutPolicy": "PERMISSIVE"},
+                           "cleanup": {"policyName": []}}
+        base_attributes.update(attributes)
+        data = {
+            "action": "coreui_Repository",
+            "method": "create",
+            "data": [{"attributes": base_attributes, "name": repo_name, "format": "", "type": "", "url": "",
+                      "online": True, "recipe": recipe}],
+            "type": "rpc", "tid": 20
+        }
+        response = self.session.post(url, headers=headers, json=data, timeout=self.timeout)
+        logger.info(
+            f"do_maven_repo_create url:{url} repo_name:{repo_name} recipe:{recipe} Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
+
+    def maven_proxy_repo_create(self, repo_name, remote_url):
+        # Nexus coalesces concurrent requests for the same artifact into one remote download and caches the result.
+        if self.repo_exists(repo_name):
+            logger.info(f"maven proxy repo {repo_name} already exists")
+            return
+        attributes = {"proxy": {"remoteUrl": remote_url, "contentMaxAge": -1, "metadataMaxAge": 1440},
+                      "httpclient": {"blocked": False, "autoBlock": True},
+                      "negativeCache": {"enabled": True, "timeToLive": 1440}}
+        self.do_maven_repo_create(repo_name, "maven2-proxy", attributes)
+
+    def maven_group_repo_create(self, repo_name, member_names):
+        if self.repo_exists(repo_name):
+            logger.info(f"maven group repo {repo_name} already exists")
+            return
+        self.do_maven_repo_create(repo_name, "maven2-group", {"group": {"memberNames": member_names}})
+
+    def get_maven_repo_url(self, repo_name):
+        return f"{self.get_nexus_url()}/repository/{repo_name}/"
+
+    def repo_exists(self, repo_name):
+        return any(repo['name'] == repo_name for repo in self.get_repos())
+
     def repo_create(self, repo_name, remove_old=False, redeploy=False):
         repo_list = self.get_repos()
         result = list(filter(lambda d: d['name'] == repo_name, repo_list))
@@ -224,7 +485,7 @@ class NexusClient:
             'Content-Type': 'application/json',
         }
         data = {"action": "coreui_Repository", "method": "remove", "data": [repo_name], "type": "rpc", "tid": 60}
-        response = requests.post(url, headers=headers, json=data, auth=self.auth)
+        response = self.session.post(url, headers=headers, json=data, timeout=self.timeout)
         logger.info(
             f"repo_remove repo_name:{repo_name}  url:{url} Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
 
@@ -236,7 +497,7 @@ class NexusClient:
         headers = {
             'Content-Type': 'application/json',
         }
-        response = requests.get(url, headers=headers, json=data, auth=self.auth)
+        response = self.session.get(url, headers=headers, json=data, timeout=self.timeout)
 
         if response.status_code == 200:
             response_data = response.json()  # 获取响应体的 JSON 格式内容
@@ -252,11 +513,11 @@ class NexusClient:
         headers = {
             'Content-Type': 'text/plain',
         }
-        response = requests.put(
+        response = self.session.put(
             url,
-            auth=self.auth,
             headers=headers,
-            data=new_pwd
+            data=new_pwd,
+            timeout=self.timeout
         )
         logger.info(f"url: {url} Status code:{response.status_code} Headers:  {response.headers} Body: {response.text}")
 
@@ -272,7 +533,7 @@ class NexusClient:
             "content": script_content
         }
 
-        response = requests.post(
+        response = self.session.post(
             url,
             timeout=30,
             auth=('admin', admin_password),
@@ -291,7 +552,7 @@ class NexusClient:
         script_name = os.path.splitext(os.path.basename(GROOVY_FILE))[0]
         url = f"{self.get_nexus_url()}/service/rest/v1/script/{script_name}/run"
         args = {"new_password": new_pwd}
-        response = requests.post(
+        response = self.session.post(
             url,
             timeout=30,
             auth=('admin', admin_password),
@@ -4,8 +4,10 @@ import shutil
 
 from python.common.basic_logger import get_logger
 from python.common.constants import *
-from python.nexus.nexus_client import NexusClient
+from python.nexus.nexus_client import NexusClient, DEFAULT_UPLOAD_THREADS, DEFAULT_TIMEOUT, \
+    DEFAULT_REPODATA_TIMEOUT
 from python.nexus.nexus_repo_sync import NexusSynchronizer
+from python.nexus.dependency_closure import load_playbook_packages, load_bigtop_capabilities
 from python.install_utils.install_utils import *
 from python.utils.os_utils import *
 from python.utils.filesystem_util import *
@@ -20,11 +22,17 @@ class NexusManager:
         self.os_version = os_info[1]
         self.os_arch = os_info[2]
         self.synchronizer = NexusSynchronizer(os_info, self.ci_conf["nexus"]["os_repo_data_dir"])
-        self.nexus_client = NexusClient(self.ci_conf["nexus"]["host"], self.ci_conf["nexus"]["user_name"],
-                                        self.ci_conf["nexus"]["user_pwd"])
+        nexus_conf = self.ci_conf["nexus"]
+        self.nexus_client = NexusClient(nexus_conf["host"], nexus_conf["user_name"], nexus_conf["user_pwd"],
+                                        upload_threads=nexus_conf.get("upload_threads", DEFAULT_UPLOAD_THREADS),
+                                        timeout=(nexus_conf.get("connect_timeout", DEFAULT_TIMEOUT[0]),
+                                                 nexus_conf.get("read_timeout", DEFAULT_TIMEOUT[1])),
+                                        upload_rate_limit=nexus_conf.get("upload_rate_limit", 0),
+                                        repodata_timeout=nexus_conf.get("repodata_timeout",
+                                                                        DEFAULT_REPODATA_TIMEOUT))
         self.nexus_installer = NexusInstaller(self.ci_conf["nexus"]["local_tar"],
                                               self.ci_conf["nexus"]["install_dir"], self.ci_conf["nexus"]["user_pwd"])
-        self.path_manager = PathManager(ci_conf)
+        self.path_manager = PathManager(ci_conf, os_info)
         self.executor = CommandExecutor
 
     def install_and_configure_nexus(self):
@@ -42,16 +50,45 @@ class NexusManager:
             self.nexus_client.batch_upload_bigdata_pkgs(pkg_dir, comp)
         logger.info(f'start upload bigdata rpms to nexus')
 
+    def retry_failed_uploads(self):
+        failed = self.nexus_client.upload_failed_packages()
+        if failed:
+            raise Exception(f"{len(failed)} packages still failed to upload, please check the log and retry again")
+
+    def get_maven_mirror_url(self):
+        """Create the caching maven proxy shared by all component builds if enabled and return its url."""
+        if not self.ci_conf["nexus"].get("maven_proxy"):
+            return None
+        for repo_name, remote_url in MAVEN_PROXY_REMOTES.items():
+            self.nexus_client.maven_proxy_repo_create(repo_name, remote_url)
+        self.nexus_client.maven_group_repo_create(MAVEN_PROXY_GROUP_NAME, list(MAVEN_PROXY_REMOTES.keys()))
+        mirror_url = self.nexus_client.get_maven_repo_url(MAVEN_PROXY_GROUP_NAME)
+        logger.info(f"component builds resolve maven artifacts through {mirror_url}")
+        return mirror_url
+
+    def get_closure_seeds(self):
+        """Packages the playbooks install and the os packages the bigtop rpms require."""
+        seeds = load_playbook_packages(f"{self.os_type}{self.os_version}")
+        rpm_files = self.nexus_client.get_rpm_files(self.path_manager.compiled_pkg_out_dir)
+        requires, provides = load_bigtop_capabilities(rpm_files)
+        # packages built by bigtop, ambari among them, are not looked up in the os repos
+        return [seed for seed in seeds + requires if seed not in provides]
+
     def sync_os_repositories(self):
         logger.info("Synchronizing OS repositories")
-        self.synchronizer.sync_repository()
+        closure_seeds = self.get_closure_seeds() if self.ci_conf["nexus"].get("sync_closure_only", False) else None
+        self.synchronizer.sync_repository(refresh_meta=self.ci_conf["nexus"].get("refresh_repo_meta", False),
+                                          closure_seeds=closure_seeds,
+                                          prune=self.ci_conf["nexus"].get("prune_superseded_pkgs", False))
 
     def upload_os_packages(self):
         pkgs_dirs = self.synchronizer.get_local_pkgs_dirs()
         logger.info(f'start upload {self.os_type + self.os_version + self.os_arch} os pkgs to local nexus repository')
         # The reponame of the os package equals the os type, for example, redhat.
         self.nexus_client.repo_create(self.os_type, remove_old=True)
-        self.nexus_client.batch_upload_os_pkgs(pkgs_dirs, (self.os_type, self.os_version, self.os_arch))
+        # after a closure sync the pkgs dirs may still hold packages of earlier full syncs
+        self.nexus_client.batch_upload_os_pkgs(pkgs_dirs, (self.os_type, self.os_version, self.os_arch),
+                                               rpm_names=self.synchronizer.get_closure_rpm_names())
 
     def package_nexus(self):
         logger.info(f'start package nexus ')
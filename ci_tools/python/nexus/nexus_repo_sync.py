@@ -10,11 +10,16 @@ import requests
 import argparse
 import logging
 from python.common.constants import *
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 import concurrent.futures
 from python.common.basic_logger import get_logger
 import threading
-import xmltodict
+import time
+from python.nexus.package_downloader import PackageDownloader
+from python.nexus.mirror_selector import MirrorSelector
+from python.nexus.package_manifest import PackageManifest
+from python.nexus.repo_metadata import open_metadata, iter_primary_packages, fetch_primary, get_repomd
+from python.nexus.dependency_closure import DependencyClosure
 
 logger = get_logger(name="nexus_sync", log_file="nexus_sync.log")
 
@@ -23,30 +28,40 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 # centos7.9
 # kylinv10_sp3
 # openeuler22
+# repo_urls lists mirrors of the same repo, downloads are spread over the ones that respond best
 OS_INFO = {
-    "centos7_x86_64": {"base": {"repo_url": "http://mirrors.aliyun.com/centos/7/os/x86_64/Packages/",
+    "centos7_x86_64": {"base": {"repo_urls": ["http://mirrors.aliyun.com/centos/7/os/x86_64/Packages/",
+                                              "https://mirrors.tuna.tsinghua.edu.cn/centos-vault/7.9.2009/os/x86_64/Packages/",
+                                              "https://vault.centos.org/7.9.2009/os/x86_64/Packages/"],
                                 "meta_file": "centos7_x86_64_base-primary.xml"},
-                       "updates": {"repo_url": "http://mirrors.aliyun.com/centos/7/updates/x86_64/Packages/",
+                       "updates": {"repo_urls": ["http://mirrors.aliyun.com/centos/7/updates/x86_64/Packages/",
+                                                 "https://mirrors.tuna.tsinghua.edu.cn/centos-vault/7.9.2009/updates/x86_64/Packages/",
+                                                 "https://vault.centos.org/7.9.2009/updates/x86_64/Packages/"],
                                 "meta_file": "centos7_x86_64_updates-primary.xml"}
                        },
-    "centos8_x86_64": {"base": {"repo_url": "http://mirrors.aliyun.com/centos/8/BaseOS/x86_64/os/Packages",
+    "centos8_x86_64": {"base": {"repo_urls": ["http://mirrors.aliyun.com/centos/8/BaseOS/x86_64/os/Packages/",
+                                              "https://vault.centos.org/8.5.2111/BaseOS/x86_64/os/Packages/"],
                                 "meta_file": "centos8_x86_64_base-primary.xml"}},
     "openeuler22_x86_64": {
-                           "update": {"repo_url": "https://repo.openeuler.org/openEuler-22.03-LTS/update/x86_64/Packages/",
+                           "update": {"repo_urls": ["https://repo.openeuler.org/openEuler-22.03-LTS/update/x86_64/Packages/",
+                                                    "https://mirrors.huaweicloud.com/openeuler/openEuler-22.03-LTS/update/x86_64/Packages/",
+                                                    "https://mirrors.tuna.tsinghua.edu.cn/openeuler/openEuler-22.03-LTS/update/x86_64/Packages/"],
                                        "meta_file": "openeuler22_x86_64_update-primary.xml"},
-                           "other": {"repo_url": "https://repo.openeuler.org/openEuler-22.03-LTS/everything/x86_64/Packages/",
+                           "other": {"repo_urls": ["https://repo.openeuler.org/openEuler-22.03-LTS/everything/x86_64/Packages/",
+                                                   "https://mirrors.huaweicloud.com/openeuler/openEuler-22.03-LTS/everything/x86_64/Packages/",
+                                                   "https://mirrors.tuna.tsinghua.edu.cn/openeuler/openEuler-22.03-LTS/everything/x86_64/Packages/"],
                                       "meta_file": "openeuler22_x86_64_other-primary.xml"}
                          },
     "kylinv10_aarch64": {
-        "base": {"repo_url": "https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/base/aarch64/Packages/",
+        "base": {"repo_urls": ["https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/base/aarch64/Packages/"],
                  "meta_file": "kylinv10_aarch64_base-primary.xml"},
-        "updates": {"repo_url": "https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/updates/aarch64/Packages/",
+        "updates": {"repo_urls": ["https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/updates/aarch64/Packages/"],
                     "meta_file": "kylinv10_aarch64_updates-primary.xml"}
     },
     "kylinv10_x86_64": {
-        "base": {"repo_url": "https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/base/x86_64/Packages/",
+        "base": {"repo_urls": ["https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/base/x86_64/Packages/"],
                  "meta_file": "kylinv10_x86_64_base-primary.xml"},
-        "updates": {"repo_url": "https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/updates/x86_64/Packages/",
+        "updates": {"repo_urls": ["https://update.cs2c.com.cn/NS/V10/V10SP3/os/adv/lic/updates/x86_64/Packages/"],
                     "meta_file": "kylinv10_x86_64_updates-primary.xml"}
     }
 }
@@ -61,11 +76,31 @@ class NexusSynchronizer:
         self.success_file = os.path.join(OUTPUT_DIR, 'success.json')
         self.failure_file = os.path.join(OUTPUT_DIR, 'failure.json')
         self.retry_limit = 3
+        self.download_threads = 10
+        self.downloader = PackageDownloader(pool_size=self.download_threads, max_retries=self.retry_limit)
+        self.mirror_selectors = {}
+        self.manifest = PackageManifest(
+            os.path.join(local_dir, f"{self.os_type}{self.os_version}_{self.os_arch}_manifest.json"), self.sha256sum)
+        # packages of the last dependency closure sync: {repo_key: {rpm_name: sha256}}
+        self.closure_file = os.path.join(local_dir, f"{self.os_type}{self.os_version}_{self.os_arch}_closure.json")
+        # primary metadata read by generate_pkg_meta, fetched ones are compressed and named after the source
+        self.primary_files = {}
+        # repomd revision and primary file of the last fetch of every repo: {repo_key: {revision, primary_file}}
+        self.repo_state_file = os.path.join(local_dir,
+                                            f"{self.os_type}{self.os_version}_{self.os_arch}_repo_state.json")
+        # fetched primary metadata, kept out of the source tree the releases are made from
+        self.repodata_dir = os.path.join(local_dir, f"{self.os_type}{self.os_version}_{self.os_arch}_repodata")
         #self.lock = threading.Lock()
 
     def get_os_info(self, repo_key, key):
         return OS_INFO.get(f"{self.os_type}{self.os_version}_{self.os_arch}").get(repo_key).get(key)
 
+    def get_mirror_selector(self, repo_key):
+        if repo_key not in self.mirror_selectors:
+            self.mirror_selectors[repo_key] = MirrorSelector(self.get_os_info(repo_key, "repo_urls"),
+                                                             session=self.downloader.session)
+        return self.mirror_selectors[repo_key]
+
     def get_repo_meta_infos(self):
         return OS_INFO.get(f"{self.os_type}{self.os_version}_{self.os_arch}")
 
@@ -90,6 +125,7 @@ class NexusSynchronizer:
         return json_data
 
     def write_json_data(self, filepath, json_data):
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
         with open(filepath, 'w') as jsonfile:
             json.dump(json_data, jsonfile, indent=4)
 
@@ -133,42 +169,27 @@ class NexusSynchronizer:
 
     def download_package(self, package_url, local_filepath, md5_hash, by_stream=True):
         logger.info(f"downloading package from {package_url}")
-        retries = 0
-        while retries < self.retry_limit:
-            try:
-                if by_stream:
-                    success, msg = self.download_package_by_stream(package_url, local_filepath, md5_hash)
-                else:
-                    success, msg = self.download_package_by_urlretrieve(package_url, local_filepath, md5_hash)
-
-                return success, msg
-            except Exception as e:
-                return False, str(e)
+        if by_stream:
+            # retries, resumes partial files and splits large packages into range chunks
+            return self.downloader.download(package_url, local_filepath,
+                                            validate=lambda fp: self.validate_md5(fp, md5_hash))
+
+        msg = None
+        for retries in range(self.retry_limit):
+            success, msg = self.download_package_by_urlretrieve(package_url, local_filepath, md5_hash)
+            if success:
+                return True, None
+            logger.info(f"Retry {retries + 1}/{self.retry_limit} {package_url}")
+            sleep(2 ** retries)
         logger.warning("Retry limit exceeded.")
-        return False, 'Retry limit exceeded.'
-
-    def download_package_by_stream(self, package_url, local_filepath, md5_hash):
-        try:
-            response = requests.get(package_url, timeout=10, stream=True)
-            if response.status_code == 200:
-                with open(local_filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                if self.validate_md5(local_filepath, md5_hash):
-                    return True, None
-                else:
-                    os.remove(local_filepath)
-        except Exception as e:
-            return False, str(e)
-        return False, 'Retry limit exceeded.'
+        return False, msg or 'Retry limit exceeded.'
 
     def download_package_by_urlretrieve(self, package_url, local_filepath, md5_hash):
         try:
             res = self.download_file(package_url, local_filepath)
             if res and self.validate_md5(local_filepath, md5_hash):
                 return True, None
-            else:
+            elif os.path.exists(local_filepath):
                 os.remove(local_filepath)
             sleep(0.5)  # delay to prevent being seen as a bot
         except Exception as e:
@@ -178,8 +199,9 @@ class NexusSynchronizer:
     def scan_package(self, pkg_name, pkg_md5,repo_key):
         local_filename = os.path.join(self.get_local_pkgs_dir(repo_key=repo_key), pkg_name)
         if os.path.exists(local_filename):
-            if self.validate_md5(local_filename, pkg_md5):
-                logger.info(f"The {pkg_name} rpm is already downloaded and hash is consistent")
+            # only files changed since the last scan are hashed
+            if self.manifest.get_hash(local_filename) == pkg_md5:
+                logger.debug(f"The {pkg_name} rpm is already downloaded and hash is consistent")
                 return None
             else:
                 logger.info(
@@ -189,11 +211,53 @@ class NexusSynchronizer:
             logger.info(f"The {pkg_name} rpm is not exist,will be downloading")
             return pkg_name
 
-    def concurrent_scan_packages(self):
+    def get_rpm_name(self, pinfo):
+        return f"{pinfo['name']}-{pinfo['ver']}-{pinfo['rel']}.{pinfo['arch']}.rpm"
+
+    def is_synced_package(self, pinfo):
+        return pinfo["type"] == "rpm" and pinfo["arch"] in (self.os_arch.strip(), "noarch")
+
+    def get_primary_file(self, repo_key, repo_metadata_file):
+        """
+        Primary metadata of repo_key with the dependencies of its packages: the one fetched last, else it is
+        fetched from the mirrors, the package json files in the repo do not carry the dependencies.
+        """
+        primary_file = self.primary_files.get(repo_key)
+        if primary_file is None or not os.path.exists(primary_file):
+            primary_file = self.load_json_data(self.repo_state_file).get(repo_key, {}).get("primary_file")
+        if primary_file is None or not os.path.exists(primary_file):
+            logger.info(f"no primary metadata of {repo_key} fetched yet, fetching it for the dependency closure")
+            _, primary_file = self.fetch_primary_metadata(repo_key, repo_metadata_file)
+        self.primary_files[repo_key] = primary_file
+        return primary_file
+
+    def resolve_closure(self, seeds):
+        """Packages of the os repos needed to install seeds: {repo_key: {rpm_name: sha256}}."""
+        closure = DependencyClosure()
+        for repo_key, repo_metadata_file in self.get_meta_files_path(lambda x: x).items():
+            source_file = self.get_primary_file(repo_key, repo_metadata_file)
+            logger.info(f"loading provides and requires of {repo_key} from {source_file}")
+            with open_metadata(source_file) as fd:
+                for pinfo in iter_primary_packages(fd, with_deps=True):
+                    if self.is_synced_package(pinfo):
+                        closure.add_package(repo_key, pinfo)
+        packages = {repo_key: {self.get_rpm_name(pinfo): pinfo["checksum"] for pinfo in repo_pkgs.values()}
+                    for repo_key, repo_pkgs in closure.resolve(seeds).items()}
+        self.write_json_data(self.closure_file, packages)
+        return packages
+
+    def get_closure_rpm_names(self):
+        """File names of the packages of the last closure sync, None if the last sync was a full one."""
+        if not os.path.exists(self.closure_file):
+            return None
+        return {rpm_name for repo_pkgs in self.load_json_data(self.closure_file).values() for rpm_name in repo_pkgs}
+
+    def concurrent_scan_packages(self, repo_packages_dict=None):
         packages_need_download = {}
-        repo_packages_dict = self.get_packages()
+        repo_packages_dict = repo_packages_dict if repo_packages_dict is not None else self.get_packages()
 
-        with ProcessPoolExecutor(max_workers=15) as executor:
+        # hashing releases the GIL while reading, threads share the manifest
+        with ThreadPoolExecutor(max_workers=8) as executor:
             for repo_key, repo_packages in repo_packages_dict.items():
                 future_to_pkg = {executor.submit(self.scan_package, pkg_name, pkg_md5, repo_key): pkg_name for pkg_name, pkg_md5 in repo_packages.items()}
                 for future in concurrent.futures.as_completed(future_to_pkg):
@@ -204,19 +268,59 @@ class NexusSynchronizer:
 
             logger.info(
                 f"repo: {repo_key} scan finished, packages need download {packages_need_download}")
+        logger.info(f"scan finished, {self.manifest.hashed} changed files hashed")
+        self.manifest.save()
         return packages_need_download
 
     def download(self, pkg_name, pkg_md5, repo_key):
-        remote_repo_url = self.get_os_info(repo_key,"repo_url")
-        pkg_url = urljoin(remote_repo_url, pkg_name)
-        logger.info(f"downloading  {pkg_name} from {pkg_url}")
+        selector = self.get_mirror_selector(repo_key)
         local_filename = os.path.join(self.get_local_pkgs_dir(repo_key=repo_key), pkg_name)
-
-        success, msg = self.download_package(pkg_url, local_filename, pkg_md5, by_stream=True)
+        tried = []
+        success, msg = False, None
+        # A failed package moves on to another mirror, the .part file is resumed from there.
+        while not success and len(tried) < len(selector.mirrors):
+            remote_repo_url = selector.pick(exclude=tried)
+            tried.append(remote_repo_url)
+            pkg_url = urljoin(remote_repo_url, pkg_name)
+            logger.info(f"downloading  {pkg_name} from {pkg_url}")
+            start = time.time()
+            success, msg = self.download_package(pkg_url, local_filename, pkg_md5, by_stream=True)
+            size = os.path.getsize(local_filename) if success else 0
+            selector.report(remote_repo_url, success, size, time.time() - start)
+        if success:
+            # the download was validated against this hash
+            self.manifest.record(local_filename, pkg_md5)
         return (pkg_name, success, msg)
 
-    def sync_repository(self):
-        packages_need_download = self.concurrent_scan_packages()
+    def prune_packages(self, changes):
+        """Remove the local files of the packages the refreshed repos no longer list."""
+        for repo_key, (_, superseded) in changes.items():
+            pkgs_dir = self.get_local_pkgs_dir(repo_key=repo_key)
+            removed = 0
+            for pkg_name in superseded:
+                local_filename = os.path.join(pkgs_dir, pkg_name)
+                if os.path.exists(local_filename):
+                    os.remove(local_filename)
+                    removed += 1
+            logger.info(f"repo: {repo_key} pruned {removed} superseded packages")
+
+    def sync_repository(self, refresh_meta=False, closure_seeds=None, prune=False):
+        """
+        Download the packages of the os repos missing or changed locally.
+        refresh_meta fetches the metadata of the repos changed upstream first, prune then removes the packages
+        they dropped. With closure_seeds only the seeds and their dependency closure are synchronized instead of
+        the whole repos.
+        """
+        if refresh_meta:
+            changes = self.generate_pkg_meta(fetch=True)
+            if prune:
+                self.prune_packages(changes)
+        if closure_seeds is not None:
+            packages_need_download = self.concurrent_scan_packages(self.resolve_closure(closure_seeds))
+        else:
+            if os.path.exists(self.closure_file):
+                os.remove(self.closure_file)
+            packages_need_download = self.concurrent_scan_packages()
         if len(packages_need_download) <= 0:
             logger.info(f"all {self.os_type} repo files synchronized successfully")
             return
@@ -227,7 +331,9 @@ class NexusSynchronizer:
 
         # packages_need_download={repo_key: {pkg_name1:pkg_md5,pkg_name2:pkg_md5}}
         for repo_key, repo_pkgs in packages_need_download.items():
-            with ProcessPoolExecutor(max_workers=10) as executor:
+            self.get_mirror_selector(repo_key).probe(next(iter(repo_pkgs)))
+            # downloads wait on the network, threads share the pooled session of the downloader
+            with ThreadPoolExecutor(max_workers=self.download_threads) as executor:
                 future_to_pkg = {executor.submit(self.download, pkg_name, pkg_md5, repo_key): pkg_name for
                                  pkg_name, pkg_md5 in
                                  repo_pkgs.items()}
@@ -242,29 +348,66 @@ class NexusSynchronizer:
 
                 self.write_json_data(self.success_file, success_packages)
                 self.write_json_data(self.failure_file, failure_packages)
-
-    def generate_pkg_meta(self):
+                self.manifest.save()
+
+    def fetch_primary_metadata(self, repo_key, repo_metadata_file, known_revision=None):
+        """
+        Download the current primary metadata of repo_key from the first mirror that serves it.
+        Return (revision, file path), the path is None when the repo is still at known_revision.
+        """
+        for packages_url in self.get_os_info(repo_key, "repo_urls"):
+            try:
+                revision, href = get_repomd(self.downloader.session, packages_url)
+                if revision == known_revision:
+                    return revision, None
+                os.makedirs(self.repodata_dir, exist_ok=True)
+                return revision, fetch_primary(self.downloader.session, packages_url, self.repodata_dir,
+                                               os.path.basename(repo_metadata_file), href=href)
+            except Exception as e:
+                logger.warning(f"fetch {repo_key} metadata from {packages_url} failed: {e}")
+        raise Exception(f"no mirror of {self.os_type} {repo_key} serves its repodata")
+
+    def generate_pkg_meta(self, fetch=False):
+        """
+        Regenerate the package json of the repos from their primary metadata, fetched from the mirrors if fetch.
+        A repo whose repomd revision did not change since its last fetch is skipped.
+        Return {repo_key: (added or updated {rpm_name: sha256}, superseded rpm names)} of the regenerated repos.
+        """
+        repo_state = self.load_json_data(self.repo_state_file)
+        changes = {}
         repo_metadata_files_dict = self.get_meta_files_path(lambda x: x)
         for repo_key, repo_metadata_file in repo_metadata_files_dict.items():
-            logger.info(f"parseing {repo_key} {self.os_type} repo  {repo_metadata_file} file")
-            with open(os.path.join(REPO_FILES_DIR, repo_metadata_file)) as fd:
-                doc = xmltodict.parse(fd.read())
-            rpms = {}
-            for pinfo in doc["metadata"]["package"]:
-                type = pinfo["@type"]  # rpm
-                name = pinfo["name"]
-                arch = pinfo["arch"]
-                ver = pinfo["version"]["@ver"]
-                rel = pinfo["version"]["@rel"]
-                ctype = pinfo["checksum"]["@type"]
-                hash = pinfo["checksum"]["#text"]
-                if type == "rpm" and (arch == self.os_arch.strip() or arch == "noarch"):
-                    rpm_name = f"{name}-{ver}-{rel}.{arch}.rpm"
-                    rpms[rpm_name] = hash
-
-            logger.info(f"generating {self.os_type} repo json file")
             json_path = os.path.join(REPO_FILES_DIR, f'{repo_metadata_file}.json')
+            source_file = repo_metadata_file
+            if fetch:
+                state = repo_state.get(repo_key, {})
+                known = os.path.exists(state.get("primary_file", "")) and os.path.exists(json_path)
+                revision, source_file = self.fetch_primary_metadata(repo_key, repo_metadata_file,
+                                                                    state.get("revision") if known else None)
+                if source_file is None:
+                    logger.info(f"{repo_key} {self.os_type} repo is still at revision {revision}")
+                    self.primary_files[repo_key] = state["primary_file"]
+                    continue
+            self.primary_files[repo_key] = source_file
+            logger.info(f"parseing {repo_key} {self.os_type} repo  {source_file} file")
+            rpms = {}
+            # streamed package by package, the metadata of large repos is never loaded whole
+            with open_metadata(source_file) as fd:
+                for pinfo in iter_primary_packages(fd):
+                    if self.is_synced_package(pinfo):
+                        rpms[self.get_rpm_name(pinfo)] = pinfo["checksum"]
+
+            previous_rpms = self.load_json_data(json_path)
+            added = {rpm_name: sha256 for rpm_name, sha256 in rpms.items() if previous_rpms.get(rpm_name) != sha256}
+            superseded = [rpm_name for rpm_name in previous_rpms if rpm_name not in rpms]
+            changes[repo_key] = (added, superseded)
+            logger.info(f"generating {self.os_type} repo json file, {len(added)} packages added or updated, "
+                        f"{len(superseded)} superseded")
             self.write_json_data(json_path, rpms)
+            if fetch:
+                repo_state[repo_key] = {"revision": revision, "primary_file": source_file}
+                self.write_json_data(self.repo_state_file, repo_state)
+        return changes
 
 
 if __name__ == '__main__':
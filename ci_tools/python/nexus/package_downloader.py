@@ -0,0 +1,151 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger(name="nexus_sync", log_file="nexus_sync.log")
+
+BUFFER_SIZE = 1024 * 1024
+# files at least this large are fetched as parallel range chunks
+CHUNKED_DOWNLOAD_THRESHOLD = 64 * 1024 * 1024
+CHUNK_SIZE = 16 * 1024 * 1024
+CHUNK_THREADS = 4
+
+
+class DownloadError(Exception):
+    pass
+
+
+class PackageDownloader:
+    """
+    Download files over a pooled HTTP session into <file>.part and move them in place once complete and valid.
+    An interrupted download continues from the bytes already in the .part file with a Range request, large files are
+    fetched as parallel range chunks whose progress is kept next to the .part file, and failed attempts are retried
+    with exponential backoff and jitter.
+    """
+
+    def __init__(self, pool_size=10, max_retries=5, base_delay=2, max_delay=60, timeout=(10, 60)):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_size * CHUNK_THREADS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def probe(self, url):
+        """Return (size, accepts_ranges) of url, size is None when the server does not tell."""
+        response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        if response.status_code != 200:
+            # some mirrors do not answer HEAD, the GET tells whether the file exists
+            return None, False
+        size = response.headers.get("Content-Length")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        return (int(size) if size is not None else None), accepts_ranges
+
+    def write_response(self, response, f):
+        for chunk in response.iter_content(chunk_size=BUFFER_SIZE):
+            if chunk:
+                f.write(chunk)
+
+    def download_resumable(self, url, part_file):
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # the .part file already holds the whole file
+                return
+            if response.status_code == 206:
+                logger.info(f"resume {url} from byte {offset}")
+                mode = 'ab'
+            elif response.status_code == 200:
+                mode = 'wb'
+            else:
+                raise DownloadError(f"GET {url} status code {response.status_code}")
+            with open(part_file, mode, buffering=BUFFER_SIZE) as f:
+                self.write_response(response, f)
+
+    def download_chunk(self, url, part_file, start, end):
+        headers = {"Range": f"bytes={start}-{end}"}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 206:
+                raise DownloadError(f"GET {url} range {start}-{end} status code {response.status_code}")
+            with open(part_file, 'r+b', buffering=BUFFER_SIZE) as f:
+                f.seek(start)
+                self.write_response(response, f)
+                if f.tell() != end + 1:
+                    raise DownloadError(f"GET {url} range {start}-{end} ended at byte {f.tell()}")
+
+    def download_chunks(self, url, part_file, size):
+        state_file = f"{part_file}.chunks"
+        done = set()
+        if os.path.exists(part_file) and os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                done = set(json.load(f))
+        else:
+            with open(part_file, 'wb') as f:
+                f.truncate(size)
+        chunks = [(start, min(start + CHUNK_SIZE, size) - 1) for start in range(0, size, CHUNK_SIZE)]
+        pending = [chunk for chunk in chunks if chunk[0] not in done]
+        logger.info(f"download {url} in {len(chunks)} chunks, {len(chunks) - len(pending)} already done")
+        lock = threading.Lock()
+
+        def fetch(chunk):
+            self.download_chunk(url, part_file, *chunk)
+            with lock:
+                done.add(chunk[0])
+                with open(state_file, 'w') as f:
+                    json.dump(sorted(done), f)
+
+        with ThreadPoolExecutor(max_workers=CHUNK_THREADS) as executor:
+            # list() raises the first chunk failure after the other chunks finished
+            list(executor.map(fetch, pending))
+        os.remove(state_file)
+
+    def discard(self, part_file):
+        for fp in [part_file, f"{part_file}.chunks"]:
+            if os.path.exists(fp):
+                os.remove(fp)
+
+    def download(self, url, local_filepath, validate=None):
+        """Download url to local_filepath, validate(path) checks the complete file. Return (success, message)."""
+        part_file = f"{local_filepath}.part"
+        message = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                size, accepts_ranges = self.probe(url)
+                if accepts_ranges and size is not None and size >= CHUNKED_DOWNLOAD_THRESHOLD:
+                    self.download_chunks(url, part_file, size)
+                else:
+                    self.download_resumable(url, part_file)
+
+                downloaded = os.path.getsize(part_file)
+                if size is not None and downloaded != size:
+                    if downloaded > size:
+                        # left over from another version of the file
+                        self.discard(part_file)
+                    raise DownloadError(f"{url} size {downloaded} differs from {size}")
+                if validate is not None and not validate(part_file):
+                    # the content is wrong, resuming it would keep the corrupt bytes
+                    self.discard(part_file)
+                    raise DownloadError(f"{url} checksum mismatch")
+                os.replace(part_file, local_filepath)
+                return True, None
+            except (requests.RequestException, OSError, DownloadError) as e:
+                message = str(e)
+            if attempt < self.max_retries:
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logger.info(f"download {url} failed: {message}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+        logger.warning(f"download {url} failed after {self.max_retries} retries: {message}")
+        return False, message
@@ -0,0 +1,60 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import json
+import os
+import threading
+
+
+class PackageManifest:
+    """
+    Persistent index of local packages: path -> size, mtime and sha256.
+    A file whose size and mtime did not change since it was hashed is not read again.
+    """
+
+    def __init__(self, manifest_file, hash_func):
+        self.manifest_file = manifest_file
+        self.hash_func = hash_func
+        self.lock = threading.Lock()
+        self.entries = self.load()
+        self.hashed = 0
+
+    def load(self):
+        if not os.path.exists(self.manifest_file):
+            return {}
+        try:
+            with open(self.manifest_file, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            # unreadable manifest, the files are hashed again
+            return {}
+
+    def save(self):
+        with self.lock:
+            entries = {path: entry for path, entry in self.entries.items() if os.path.exists(path)}
+            self.entries = entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_file)), exist_ok=True)
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    def get_hash(self, path):
+        """sha256 of path, None if it does not exist."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        sha256 = self.hash_func(path)
+        self.record(path, sha256, stat)
+        with self.lock:
+            self.hashed += 1
+        return sha256
+
+    def record(self, path, sha256, stat=None):
+        stat = stat or os.stat(path)
+        with self.lock:
+            self.entries[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
@@ -0,0 +1,119 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import bz2
+import contextlib
+import gzip
+import lzma
+import os
+import subprocess
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger(name="nexus_sync", log_file="nexus_sync.log")
+
+REPO_NS = "{http://linux.duke.edu/metadata/repo}"
+COMMON_NS = "{http://linux.duke.edu/metadata/common}"
+RPM_NS = "{http://linux.duke.edu/metadata/rpm}"
+
+
+@contextlib.contextmanager
+def open_metadata(file_path):
+    """Open a repodata file for reading, decompressing .gz, .xz, .bz2 and .zst (through the zstd command) on the fly."""
+    if file_path.endswith(".zst"):
+        process = subprocess.Popen(["zstd", "-dc", file_path], stdout=subprocess.PIPE)
+        try:
+            yield process.stdout
+        finally:
+            process.stdout.close()
+            if process.wait() != 0:
+                raise Exception(f"zstd failed to decompress {file_path}")
+        return
+
+    openers = {".gz": gzip.open, ".xz": lzma.open, ".bz2": bz2.open}
+    opener = openers.get(os.path.splitext(file_path)[1], open)
+    with opener(file_path, 'rb') as f:
+        yield f
+
+
+def get_entry_names(format_elem, tag):
+    entries = format_elem.find(f"{RPM_NS}{tag}") if format_elem is not None else None
+    return [] if entries is None else [entry.get("name") for entry in entries.findall(f"{RPM_NS}entry")]
+
+
+def iter_primary_packages(fileobj, with_deps=False):
+    """
+    Stream the <package> elements of a primary.xml as dicts, each element is cleared once read so memory stays
+    constant whatever the size of the repo.
+    with_deps adds the names of the provides, the requires and the files listed for the package.
+    """
+    context = ET.iterparse(fileobj, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end" or elem.tag != f"{COMMON_NS}package":
+            continue
+        version = elem.find(f"{COMMON_NS}version")
+        checksum = elem.find(f"{COMMON_NS}checksum")
+        location = elem.find(f"{COMMON_NS}location")
+        pinfo = {
+            "type": elem.get("type"),
+            "name": elem.findtext(f"{COMMON_NS}name"),
+            "arch": elem.findtext(f"{COMMON_NS}arch"),
+            "epoch": version.get("epoch") or "0",
+            "ver": version.get("ver"),
+            "rel": version.get("rel"),
+            "checksum_type": checksum.get("type"),
+            "checksum": checksum.text,
+            "location": location.get("href") if location is not None else None,
+        }
+        if with_deps:
+            format_elem = elem.find(f"{COMMON_NS}format")
+            pinfo["provides"] = get_entry_names(format_elem, "provides")
+            pinfo["requires"] = get_entry_names(format_elem, "requires")
+            pinfo["files"] = [] if format_elem is None else [f.text for f in format_elem.findall(f"{COMMON_NS}file")]
+        yield pinfo
+        elem.clear()
+        # drop the reference the root keeps to the finished package
+        root.clear()
+
+
+def get_repodata_url(packages_url):
+    """Mirror urls point at the Packages dir, the repodata dir is its sibling."""
+    return urljoin(packages_url if packages_url.endswith("/") else f"{packages_url}/", "../repodata/")
+
+
+def get_repomd(session, packages_url, timeout=(10, 300)):
+    """(revision, primary href) from the repomd.xml of a mirror, the href is relative to the repo root."""
+    repodata_url = get_repodata_url(packages_url)
+    response = session.get(urljoin(repodata_url, "repomd.xml"), timeout=timeout)
+    if response.status_code != 200:
+        raise Exception(f"get {repodata_url}repomd.xml failed, status code {response.status_code}")
+    root = ET.fromstring(response.content)
+    href = None
+    for data in root.findall(f"{REPO_NS}data"):
+        if data.get("type") == "primary":
+            href = data.find(f"{REPO_NS}location").get("href")
+    if href is None:
+        raise Exception(f"{repodata_url}repomd.xml lists no primary metadata")
+    # repos without a revision change the primary href whenever they change
+    return root.findtext(f"{REPO_NS}revision") or href, href
+
+
+def fetch_primary(session, packages_url, dest_dir, name_prefix, timeout=(10, 300), href=None):
+    """Download the primary metadata listed in the repomd.xml of a mirror and return the local file path."""
+    if href is None:
+        _, href = get_repomd(session, packages_url, timeout)
+    primary_url = urljoin(urljoin(get_repodata_url(packages_url), "../"), href)
+    extension = os.path.splitext(href)[1] if os.path.splitext(href)[1] in (".gz", ".xz", ".bz2", ".zst") else ""
+    dest = os.path.join(dest_dir, f"{name_prefix}{extension}")
+    logger.info(f"fetch primary metadata {primary_url} to {dest}")
+    with session.get(primary_url, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise Exception(f"get {primary_url} failed, status code {response.status_code}")
+        tmp_file = f"{dest}.tmp"
+        with open(tmp_file, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        os.replace(tmp_file, dest)
+    return dest
@@ -0,0 +1,65 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import json
+import os
+import threading
+from datetime import datetime
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger(name="nexus_client", log_file="nexus_client.log")
+
+UPLOAD_LEDGER_FILE_NAME = "nexus_upload_failures.json"
+
+
+class UploadLedger:
+    """
+    Packages that could not be uploaded to nexus, kept across runs in a json file.
+    An entry is added when an upload gives up and dropped when the package is uploaded later.
+    """
+
+    def __init__(self, ledger_file):
+        self.ledger_file = ledger_file
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    def load(self):
+        if not os.path.exists(self.ledger_file):
+            return {}
+        with open(self.ledger_file, 'r') as f:
+            return {entry["file_path"]: entry for entry in json.load(f)}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.ledger_file), exist_ok=True)
+        tmp_file = f"{self.ledger_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(list(self.entries.values()), f, indent=4)
+        os.replace(tmp_file, self.ledger_file)
+
+    def update(self, items, failed_items, statuses=None):
+        """Record the result of uploading items, (file_path, repo_name, yum_directory) tuples."""
+        statuses = statuses or {}
+        failed_paths = {item[0] for item in failed_items}
+        with self.lock:
+            for file_path, repo_name, yum_directory in items:
+                if file_path in failed_paths:
+                    self.entries[file_path] = {"file_path": file_path, "repo_name": repo_name,
+                                               "yum_directory": yum_directory,
+                                               "status": statuses.get(file_path),
+                                               "time": datetime.now().isoformat()}
+                else:
+                    self.entries.pop(file_path, None)
+            self.save()
+
+    def get_failed_items(self):
+        with self.lock:
+            return [(e["file_path"], e["repo_name"], e["yum_directory"]) for e in self.entries.values()]
+
+    def report(self):
+        if not self.entries:
+            logger.info("all packages were uploaded to nexus")
+            return
+        lines = [f"{e['file_path']} -> {e['repo_name']}{e['yum_directory']} (status {e['status']})"
+                 for e in self.entries.values()]
+        logger.error(f"{len(lines)} packages were not uploaded, listed in {self.ledger_file}, "
+                     f"re-upload them with -retry-failed-uploads:\n" + "\n".join(lines))
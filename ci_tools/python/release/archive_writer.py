@@ -0,0 +1,205 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import contextlib
+import hashlib
+import io
+import os
+import subprocess
+import tarfile
+import time
+
+from python.common.basic_logger import get_logger
+from python.release.seekable_zstd import SeekableZstdWriter
+
+logger = get_logger()
+
+COMPRESSOR_EXTENSIONS = {"gzip": ".tar.gz", "zstd": ".tar.zst"}
+
+
+def get_decompress_command(archive, pigz_path="pigz"):
+    return ["zstd", "-dcq", "--long=31", archive] if archive.endswith(".zst") else [pigz_path, "-dc", archive]
+
+
+@contextlib.contextmanager
+def read_archive(archive, pigz_path="pigz"):
+    """Open a compressed tar archive as a stream, its members can only be read in order."""
+    process = subprocess.Popen(get_decompress_command(archive, pigz_path), stdout=subprocess.PIPE)
+    try:
+        with tarfile.open(fileobj=process.stdout, mode="r|") as tar:
+            yield tar
+    finally:
+        process.stdout.close()
+        return_code = process.wait()
+    # a reader stopping early gets a broken pipe, only a complete read has to succeed
+    if return_code not in (0, -13):
+        raise Exception(f"failed to read {archive}")
+
+
+class HashingReader:
+    """File object computing the sha256 of the data read through it."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.hash.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+def get_entry(info, sha256=None):
+    """Manifest entry of a tar member."""
+    if info.isdir():
+        return {"type": "dir"}
+    if info.issym():
+        return {"type": "symlink", "target": info.linkname}
+    # gettarinfo keeps the file type bits in mode, the members read from an archive only have the permissions
+    return {"type": "file", "size": info.size, "mode": info.mode & 0o7777, "sha256": sha256}
+
+
+class ArchiveWriter:
+    """
+    Write a tar archive straight into a parallel compressor process, the files are read from where they are and no
+    staging copy of the tree is needed. The files are hashed while they are read, manifest maps every archive path to
+    its entry and sources to the path it was read from.
+    gzip archives are compressed by pigz, zstd ones are written in the seekable format of SeekableZstdWriter.
+    usage:
+        with ArchiveWriter(dest, "zstd", level=5, threads=16) as writer:
+            writer.add_manifest([(source_path, archive_path), ...])
+    """
+
+    def __init__(self, dest, compressor="gzip", level=5, threads=16, pigz_path="pigz", frame_size=128 * 1024 ** 2,
+                 long_matching=True):
+        if compressor not in COMPRESSOR_EXTENSIONS:
+            raise Exception(f"unsupported compressor {compressor}, use one of {list(COMPRESSOR_EXTENSIONS)}")
+        self.dest = dest
+        self.compressor = compressor
+        self.level = level
+        self.threads = threads
+        self.pigz_path = pigz_path
+        self.frame_size = frame_size
+        self.long_matching = long_matching
+        self.command = [pigz_path, f"-{level}", "-p", str(threads)]
+        self.process = None
+        self.seekable = None
+        self.tar = None
+        self.entries = 0
+        self.manifest = {}
+        self.sources = {}
+
+    def __enter__(self):
+        if self.compressor == "zstd":
+            self.seekable = SeekableZstdWriter(self.dest, self.level, self.threads, self.frame_size,
+                                               self.long_matching)
+            # "w" mode writes every member straight through, frames can be cut between members
+            self.tar = tarfile.open(fileobj=self.seekable, mode="w", format=tarfile.GNU_FORMAT)
+            return self
+        with open(self.dest, 'wb') as out:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=out)
+        # stream mode, tarfile writes blocks in order and never seeks
+        self.tar = tarfile.open(fileobj=self.process.stdin, mode="w|", format=tarfile.GNU_FORMAT)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.seekable is not None:
+            try:
+                if exc_type is None:
+                    self.tar.close()
+                    self.seekable.close()
+            finally:
+                if exc_type is not None:
+                    self.seekable.abort()
+                    os.remove(self.dest)
+            if exc_type is None:
+                logger.info(f"wrote {self.entries} entries in {len(self.seekable.frames)} frames to {self.dest}")
+            return
+        try:
+            self.tar.close()
+        finally:
+            self.process.stdin.close()
+            return_code = self.process.wait()
+        if exc_type is not None or return_code != 0:
+            os.remove(self.dest)
+            if exc_type is None:
+                raise Exception(f"{' '.join(self.command)} failed with exit code {return_code}")
+        else:
+            logger.info(f"wrote {self.entries} entries to {self.dest}")
+
+    def add_member(self, info, fileobj=None, source=None):
+        sha256 = None
+        if self.seekable is not None:
+            self.seekable.start_member()
+        start = self.tar.offset
+        if info.isreg():
+            fileobj = HashingReader(fileobj)
+            self.tar.addfile(info, fileobj)
+            sha256 = fileobj.hexdigest()
+        else:
+            self.tar.addfile(info)
+        if self.seekable is not None:
+            self.seekable.add_member(info.name, start, self.tar.offset)
+        self.manifest[info.name] = get_entry(info, sha256)
+        self.sources[info.name] = source
+        self.entries += 1
+
+    def add(self, source, arcname):
+        """Add one file, directory entry or symlink, directories are not recursed into."""
+        info = self.tar.gettarinfo(source, arcname=arcname)
+        if info.islnk():
+            # another path of a hard linked file, stored in full so every file has its own content and hash
+            info.type = tarfile.REGTYPE
+            info.linkname = ""
+            info.size = os.lstat(source).st_size
+        if info.isreg():
+            with open(source, 'rb') as f:
+                self.add_member(info, f, source)
+        else:
+            self.add_member(info, source=source)
+
+    def add_bytes(self, arcname, data, mode=0o644):
+        info = tarfile.TarInfo(arcname)
+        info.size = len(data)
+        info.mode = mode
+        info.mtime = time.time()
+        self.add_member(info, io.BytesIO(data))
+
+    def add_dir(self, arcname, mode=0o755):
+        """Add a directory entry that has no source directory."""
+        info = tarfile.TarInfo(arcname)
+        info.type = tarfile.DIRTYPE
+        info.mode = mode
+        info.mtime = time.time()
+        self.add_member(info)
+
+    def add_manifest(self, manifest):
+        """Add (source path, archive path) entries, a None source stands for a directory created in the archive."""
+        for source, arcname in manifest:
+            if source is None:
+                self.add_dir(arcname)
+            else:
+                self.add(source, arcname)
+
+    def copy_members(self, archive, member_filter):
+        """Copy the members of an existing archive for which member_filter(name) is true."""
+        with read_archive(archive, self.pigz_path) as source:
+            for member in source:
+                if member_filter(member.name):
+                    self.add_member(member, source.extractfile(member) if member.isreg() else None)
+
+
+def walk_tree(source_dir, arcname, exclude=()):
+    """Manifest entries of a tree, directories before their content, paths under exclude are left out."""
+    exclude = {os.path.normpath(path) for path in exclude}
+    yield source_dir, arcname
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) not in exclude)
+        relative_root = os.path.relpath(root, source_dir)
+        for name in dirs + sorted(files):
+            path = os.path.join(root, name)
+            if path in exclude:
+                continue
+            yield path, os.path.normpath(os.path.join(arcname, relative_root, name))
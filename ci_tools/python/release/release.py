@@ -11,6 +11,9 @@ import os
 from datetime import datetime
 import shutil
 from python.install_utils.install_utils import *
+from python.release.archive_writer import ArchiveWriter, COMPRESSOR_EXTENSIONS, walk_tree
+from python.release.release_manifest import ReleaseManifest, RELEASE_MANIFEST_NAME, DELTA_MANIFEST_NAME
+import json
 
 logger = get_logger()
 
@@ -23,84 +26,69 @@ class Release:
         self.os_arch = os_info[2]
         self.comps = comps
         self.incremental_release_src_tar = incremental_release_src_tar
-        self.path_manager = PathManager(ci_config)
+        self.path_manager = PathManager(ci_config, os_info)
         self.release_prj_dir = self.path_manager.release_project_dir
         self.pigz_path = self.path_manager.pigz_path
         self.executor = CommandExecutor()
-
-    def get_release_name(self):
+        release_conf = ci_config.get("release") or {}
+        self.compressor = release_conf.get("compressor", "gzip")
+        self.compress_level = release_conf.get("compress_level", 5)
+        self.compress_threads = release_conf.get("compress_threads", 16)
+        self.zstd_frame_size = release_conf.get("zstd_frame_mb", 128) * 1024 ** 2
+        self.zstd_long = release_conf.get("zstd_long", True)
+
+    def get_release_name(self, prefix="UDH_RELEASE"):
         time_dir_name = datetime.now().isoformat().replace(':', '-').replace('.', '-')
-        release_name = f"UDH_RELEASE_{self.os_type}{self.os_version}_{self.os_arch}-{time_dir_name}.tar.gz"
+        extension = COMPRESSOR_EXTENSIONS[self.compressor]
+        release_name = f"{prefix}_{self.os_type}{self.os_version}_{self.os_arch}-{time_dir_name}{extension}"
         return release_name
 
-    def incremental_package(self):
-        self.setup_temp_dir()
-        self.extract_existing_release()
-        if len(self.comps) > 0:
-            self.update_components()
-        else:
-            print(f"incremental packaging: no component specified ,will just move {self.path_manager.incremental_rpm_dir} to {self.path_manager.release_project_rpm_dir}")
-        shutil.move(self.path_manager.incremental_rpm_dir, self.path_manager.release_project_rpm_dir)
-        FilesystemUtil.delete(self.path_manager.incremental_release_dir)
-
-    def setup_temp_dir(self):
-        udh_release_output_dir = self.path_manager.incremental_release_dir
-        FilesystemUtil.create_dir(udh_release_output_dir, empty_if_exists=True)
-
-    def extract_existing_release(self):
-        command = f"tar -I {self.pigz_path} -xf {self.incremental_release_src_tar} -C {self.path_manager.incremental_release_dir}"
-        self.executor.execute_command(command, shell=True)
-
-    def update_components(self):
-        print(f"update components {self.comps}")
-        for comp in self.comps:
-            self.package_component(self.path_manager.incremental_rpm_dir, comp)
-
-    def package_component(self, rpms_dir, comp):
-        comp_dir = os.path.join(rpms_dir, comp)
-        FilesystemUtil.create_dir(comp_dir, empty_if_exists=True)
-
-        non_src_filepaths = self.get_compiled_packages(comp)
-        for filepath in non_src_filepaths:
-            dest_path = os.path.join(comp_dir, os.path.basename(filepath))
-            print(f"copy {filepath}  to  {dest_path}")
-            shutil.copy(filepath, dest_path)
-
-    def compress_and_cleanup_dir(self, source_dir, dest_tar):
-        print(f"compress_and_cleanup_dir source:{source_dir} dest:{dest_tar}")
-
-        parent_dir = self.path_manager.get_parent_dir(source_dir)
-        print(f"compress_and_cleanup_dir parent_dir: {parent_dir} ")
-        os.chdir(parent_dir)
-
-        source_last_dir = os.path.basename(os.path.normpath(source_dir))
-        dest_last_dir = os.path.basename(os.path.normpath(dest_tar))
-
-        command = f"tar cf - {source_last_dir} | {self.pigz_path} -k -5 -p 16 > {dest_last_dir}"
-        self.executor.execute_command(command, shell=True)
-        FilesystemUtil.delete(source_dir)
-
-    def compress_release_directory(self):
-        release_name = self.get_release_name()
-        self.compress_and_cleanup_dir(self.path_manager.release_project_dir, release_name)
-        logger.info(f"Release packaged successfully, removing {os.path.basename(self.release_prj_dir)}")
-
-    def package_bigdata_rpms(self):
-        FilesystemUtil.create_dir(self.path_manager.release_project_rpm_dir, empty_if_exists=True)
-        self.package_all_components()
-        self.handle_special_conditions()
-
-    def package_trino_jdk(self):
-        # Based on the architecture, copy JDK to the resource directory. During generation, dynamically generate the JDK file location and fill it into Ansible.
+    def get_arcname(self, path):
+        """Archive path of a path of the release project dir."""
+        return os.path.relpath(path, self.path_manager.release_output_dir)
+
+    def get_project_manifest(self):
+        # the rpm dir is always rebuilt from the compiled packages
+        exclude = self.get_unnecessary_paths(PRJDIR) + [self.path_manager.get_rpm_dir(PRJDIR),
+                                                        os.path.join(PRJDIR, RELEASE_MANIFEST_NAME)]
+        return walk_tree(PRJDIR, os.path.basename(PRJDIR), exclude=exclude)
+
+    def get_component_manifest(self, comp):
+        comp_dir = os.path.join(self.path_manager.release_project_rpm_dir, comp)
+        manifest = [(None, self.get_arcname(comp_dir))]
+        for filepath in self.get_compiled_packages(comp):
+            manifest.append((filepath, self.get_arcname(os.path.join(comp_dir, os.path.basename(filepath)))))
+        return manifest
+
+    def get_rpm_dir_manifest(self, comps):
+        rpms_dir = self.path_manager.release_project_rpm_dir
+        manifest = [(None, self.get_arcname(rpms_dir))]
+        for comp in comps:
+            manifest.extend(self.get_component_manifest(comp))
+        return manifest
+
+    def get_trino_jdk_manifest(self):
+        # Based on the architecture, add the JDK to the resource directory. During generation, dynamically generate the JDK file location and fill it into Ansible.
         jdk_source = self.path_manager.get_trino_jdk_source_path(self.os_arch)
         dest_path = os.path.join(self.release_prj_dir, PKG_RELATIVE_PATH, os.path.basename(jdk_source))
-        logger.info(f"trino jdk will copy from  {jdk_source} to {dest_path} ")
-        shutil.copy(jdk_source, dest_path)
+        logger.info(f"trino jdk will be added from  {jdk_source} as {dest_path} ")
+        return [(jdk_source, self.get_arcname(dest_path))]
 
-    def package_all_components(self):
-        rpms_dir = self.path_manager.release_project_rpm_dir
-        for comp in ALL_COMPONENTS:
-            self.package_component(rpms_dir, comp)
+    def get_centos7_special_manifest(self):
+        pg_dir = os.path.join(self.path_manager.release_project_rpm_dir, "pg10")
+        pg_rpm_source = self.path_manager.centos7_pg_10_source_dir
+        manifest = [(None, self.get_arcname(pg_dir))]
+        pg_filepaths = FilesystemUtil.recursive_glob(pg_rpm_source, suffix=".rpm")
+        for filepath in pg_filepaths:
+            manifest.append((filepath, self.get_arcname(os.path.join(pg_dir, os.path.basename(filepath)))))
+        return manifest
+
+    def get_special_conditions_manifest(self):
+        manifest = []
+        if self.os_type.lower().strip() == "centos" and self.os_version.strip() == "7":
+            manifest.extend(self.get_centos7_special_manifest())
+        manifest.extend(self.get_trino_jdk_manifest())
+        return manifest
 
     def get_compiled_packages(self, comp):
         # Search the build output directory of the Bigtop project to find the path of the compiled rpm package for a specific component, excluding "src.rpm" files.
@@ -109,61 +97,111 @@ class Release:
                                                           filter_func=lambda fp: not fp.endswith("src.rpm"))
         return non_src_filepaths
 
-    def handle_special_conditions(self):
-        if self.os_type.lower().strip() == "centos" and self.os_version.strip() == "7":
-            self.handle_centos7_special()
-        self.package_trino_jdk()
-
-    def handle_centos7_special(self):
-        pg_dir = os.path.join(self.path_manager.release_project_rpm_dir, "pg10")
-        FilesystemUtil.create_dir(pg_dir)
-        pg_rpm_source = self.path_manager.centos7_pg_10_source_dir
-        pg_filepaths = FilesystemUtil.recursive_glob(pg_rpm_source, suffix=".rpm")
-        for filepath in pg_filepaths:
-            dest_path = os.path.join(pg_dir, os.path.basename(filepath))
-            FilesystemUtil.copy(filepath, dest_path)
-
-    def create_yum_repository(self):
-        # Need to execute a specific command to create a YUM repository # Ensure the system has the tools required for such operations.
-        res = create_yum_repository(self.path_manager.release_project_rpm_dir)
-        if not res:
-            raise Exception("Create YUM repository failed, check the log.")
+    def get_incremental_member_filter(self):
+        """Members of the existing release kept by an incremental release: its rpms but the updated components."""
+        rpms_dir = self.get_arcname(self.path_manager.release_project_rpm_dir)
+        replaced = [os.path.join(rpms_dir, comp) for comp in self.comps + ["pg10"]]
+
+        def member_filter(name):
+            name = os.path.normpath(name)
+            if not name.startswith(rpms_dir + os.sep):
+                return False
+            return not any(name == path or name.startswith(path + os.sep) for path in replaced)
+
+        return member_filter
+
+    def write_release_archive(self, release_tar):
+        """Write the release and return its manifest and the source path of every archive path."""
+        logger.info(f"writing release {release_tar} with {self.compressor} level {self.compress_level} "
+                    f"threads {self.compress_threads}")
+        prj_name = os.path.basename(PRJDIR)
+        with ArchiveWriter(release_tar, self.compressor, self.compress_level, self.compress_threads,
+                           self.pigz_path, self.zstd_frame_size, self.zstd_long) as writer:
+            writer.add_manifest(self.get_project_manifest())
+            if self.should_perform_incremental_packaging():
+                print("will perform incremental packaging")
+                if not self.comps:
+                    print(f"incremental packaging: no component specified ,will just keep the rpms of {self.incremental_release_src_tar}")
+                writer.add_manifest([(None, self.get_arcname(self.path_manager.release_project_rpm_dir))])
+                writer.copy_members(self.incremental_release_src_tar, self.get_incremental_member_filter())
+                writer.add_manifest([entry for comp in self.comps for entry in self.get_component_manifest(comp)])
+            else:
+                print("will perform all packaging")
+                writer.add_manifest(self.get_rpm_dir_manifest(ALL_COMPONENTS))
+            writer.add_manifest(self.get_special_conditions_manifest())
+            manifest = ReleaseManifest.from_archive_entries(writer.manifest, prj_name, os.path.basename(release_tar))
+            writer.add_bytes(os.path.join(prj_name, RELEASE_MANIFEST_NAME), manifest.to_json().encode())
+        # read by the next incremental release without opening the archive
+        with open(f"{release_tar}.manifest.json", 'w') as f:
+            f.write(manifest.to_json())
+        return manifest, writer.sources
+
+    def get_base_manifest(self):
+        manifest_file = f"{self.incremental_release_src_tar}.manifest.json"
+        if os.path.exists(manifest_file):
+            return ReleaseManifest.from_file(manifest_file)
+        return ReleaseManifest.from_archive(self.incremental_release_src_tar, self.pigz_path)
+
+    def write_delta_archive(self, manifest, sources, base, delta_tar):
+        """Write the paths changed since the base release, apply_delta brings a base release to manifest with it."""
+        changed, removed = manifest.diff(base)
+        delta = {"base": base.get_id(), "base_name": base.name, "target": manifest.get_id(),
+                 "target_name": manifest.name, "changed": {path: manifest.entries[path] for path in changed},
+                 "removed": removed}
+        prj_name = os.path.basename(PRJDIR)
+        with ArchiveWriter(delta_tar, self.compressor, self.compress_level, self.compress_threads,
+                           self.pigz_path, self.zstd_frame_size, self.zstd_long) as writer:
+            # first, the delta is checked against the target release before anything is extracted
+            writer.add_bytes(DELTA_MANIFEST_NAME, json.dumps(delta, indent=1).encode())
+            for path in changed:
+                source = sources.get(os.path.join(prj_name, path))
+                if source is not None:
+                    writer.add(source, path)
+                elif manifest.entries[path]["type"] == "dir":
+                    writer.add_dir(path)
+                else:
+                    raise Exception(f"{path} differs from {base.name} but was copied from it")
+            writer.add_bytes(RELEASE_MANIFEST_NAME, manifest.to_json().encode())
+        logger.info(f"delta {base.name} -> {manifest.name}: {len(changed)} changed, {len(removed)} removed paths, "
+                    f"{os.path.getsize(delta_tar) // 1024 ** 2}MB written to {delta_tar}")
 
     def package(self):
-        self.install_pigz()
+        if self.compressor == "gzip" or (self.incremental_release_src_tar
+                                         and not self.incremental_release_src_tar.endswith(".zst")):
+            self.install_pigz()
         self.prepare_release_directory()
-        self.copy_project_to_release_directory()
-        self.cleanup_unnecessary_files()
-
+        release_tar = os.path.join(self.path_manager.release_output_dir, self.get_release_name())
+        manifest, sources = self.write_release_archive(release_tar)
+        logger.info(f"Release packaged successfully to {release_tar}")
         if self.should_perform_incremental_packaging():
-            print("will perform incremental packaging")
-            self.incremental_package()
-            self.handle_special_conditions()
-        else:
-            print("will perform all packaging")
-            self.package_bigdata_rpms()
-        self.compress_release_directory()
+            base = self.get_base_manifest()
+            if base is None:
+                logger.warning(f"{self.incremental_release_src_tar} has no release manifest, no delta can be made")
+                return
+            delta_tar = os.path.join(self.path_manager.release_output_dir,
+                                     self.get_release_name(prefix="UDH_RELEASE_DELTA"))
+            self.write_delta_archive(manifest, sources, base, delta_tar)
 
     def prepare_release_directory(self):
         # Prepare the release directory as needed, such as creating or cleaning it up.
         release_output_dir = self.path_manager.release_output_dir
         FilesystemUtil.create_dir(release_output_dir, empty_if_exists=True)
 
-    def copy_project_to_release_directory(self):
-        shutil.copytree(PRJDIR, self.path_manager.release_project_dir, symlinks=True, ignore=None)
-
-    def cleanup_unnecessary_files(self):
-        base_dir = self.path_manager.release_project_dir
-        # Clean up unnecessary files and directories in the project directory, such as .git directory,
-        unnecessary_paths = [os.path.join(base_dir, ".git"),
-                             os.path.join(base_dir, "bin/portable-ansible"),
-                             os.path.join(base_dir, "bin/ansible-playbook"),
-                             os.path.join(base_dir, "conf/base_conf.yml"),
-                             os.path.join(base_dir, "conf/conf.yml"),
-                             os.path.join(base_dir, "conf/hosts_info.yml"),
-                             ]
-        for path in unnecessary_paths:
-            FilesystemUtil.delete(path)
+    def get_unnecessary_paths(self, base_dir):
+        # Unnecessary files and directories in the project directory, such as .git directory,
+        return [os.path.join(base_dir, ".git"),
+                os.path.join(base_dir, "bin/portable-ansible"),
+                os.path.join(base_dir, "bin/ansible-playbook"),
+                os.path.join(base_dir, "conf/base_conf.yml"),
+                os.path.join(base_dir, "conf/conf.yml"),
+                os.path.join(base_dir, "conf/hosts_info.yml"),
+                ]
+
+    def create_yum_repository(self):
+        # Need to execute a specific command to create a YUM repository # Ensure the system has the tools required for such operations.
+        res = create_yum_repository(self.path_manager.release_project_rpm_dir)
+        if not res:
+            raise Exception("Create YUM repository failed, check the log.")
 
     def should_perform_incremental_packaging(self):
         # Decide whether to perform incremental packaging.
@@ -171,4 +209,4 @@ class Release:
 
     def install_pigz(self):
         pigz_installer = PigzInstaller(PIGZ_SOURC_CODE_PATH, PRJ_BIN_DIR)
-        pigz_installer.install()
\ No newline at end of file
+        pigz_installer.install()
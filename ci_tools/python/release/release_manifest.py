@@ -0,0 +1,115 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import hashlib
+import json
+import os
+import shutil
+
+from python.common.basic_logger import get_logger
+from python.release.archive_writer import read_archive
+from python.release.seekable_zstd import EXTRACT_ARGS
+from python.utils.os_utils import sha256_file
+
+logger = get_logger()
+
+# both live at the root of the release project dir
+RELEASE_MANIFEST_NAME = "release_manifest.json"
+DELTA_MANIFEST_NAME = "delta_manifest.json"
+
+
+class ReleaseManifest:
+    """
+    Every path of a release relative to its project dir with its entry: type, and size, mode and sha256 of the
+    files or target of the symlinks. Two releases with the same entries have the same id.
+    """
+
+    def __init__(self, entries, name=""):
+        self.entries = entries
+        self.name = name
+
+    @staticmethod
+    def from_json(data):
+        content = json.loads(data)
+        return ReleaseManifest(content["entries"], content.get("name", ""))
+
+    @staticmethod
+    def from_file(manifest_file):
+        with open(manifest_file, 'r') as f:
+            return ReleaseManifest.from_json(f.read())
+
+    @staticmethod
+    def from_archive(archive, pigz_path="pigz"):
+        """Read the manifest a release archive carries, None for releases made before manifests."""
+        with read_archive(archive, pigz_path) as tar:
+            for member in tar:
+                if os.path.basename(member.name) == RELEASE_MANIFEST_NAME and member.name.count("/") == 1:
+                    return ReleaseManifest.from_json(tar.extractfile(member).read())
+        return None
+
+    @staticmethod
+    def from_archive_entries(archive_entries, prefix, name=""):
+        """Manifest of the archive entries of an ArchiveWriter under prefix, the project dir in the archive."""
+        entries = {arcname[len(prefix) + 1:]: entry for arcname, entry in archive_entries.items()
+                   if arcname.startswith(prefix + "/") and arcname != f"{prefix}/{RELEASE_MANIFEST_NAME}"}
+        return ReleaseManifest(entries, name)
+
+    def to_json(self):
+        return json.dumps({"name": self.name, "id": self.get_id(), "entries": self.entries}, indent=1,
+                          sort_keys=True)
+
+    def get_id(self):
+        return hashlib.sha256(json.dumps(self.entries, sort_keys=True).encode()).hexdigest()
+
+    def diff(self, base):
+        """(paths added or changed since base, paths removed since base), parents before their content."""
+        changed = [path for path, entry in self.entries.items() if base.entries.get(path) != entry]
+        removed = [path for path in base.entries if path not in self.entries]
+        return sorted(changed), sorted(removed)
+
+
+def check_member_path(name):
+    if os.path.isabs(name) or ".." in name.split("/"):
+        raise Exception(f"refusing to extract {name} outside the release dir")
+
+
+def apply_delta(delta_archive, release_dir, pigz_path="pigz"):
+    """Bring the release in release_dir to the release a delta archive was made for."""
+    current = ReleaseManifest.from_file(os.path.join(release_dir, RELEASE_MANIFEST_NAME))
+    delta = None
+    with read_archive(delta_archive, pigz_path) as tar:
+        for member in tar:
+            if delta is None:
+                # the delta manifest comes first, nothing is extracted before it is checked
+                if member.name != DELTA_MANIFEST_NAME:
+                    raise Exception(f"{delta_archive} is not a release delta")
+                delta = json.loads(tar.extractfile(member).read())
+                if current.get_id() != delta["base"]:
+                    raise Exception(f"{release_dir} is release {current.name}, "
+                                    f"the delta applies to {delta['base_name']}")
+                logger.info(f"applying delta {current.name} -> {delta['target_name']}: "
+                            f"{len(delta['changed'])} changed, {len(delta['removed'])} removed paths")
+                continue
+            check_member_path(member.name)
+            dest = os.path.join(release_dir, member.name)
+            if os.path.isdir(dest) and not os.path.islink(dest):
+                if not member.isdir():
+                    shutil.rmtree(dest)
+            elif os.path.lexists(dest):
+                # a symlink in place of the file would be written through
+                os.remove(dest)
+            tar.extract(member, release_dir, **EXTRACT_ARGS)
+
+    if delta is None:
+        raise Exception(f"{delta_archive} is empty")
+    # children are removed before their directory
+    for path in sorted(delta["removed"], reverse=True):
+        full_path = os.path.join(release_dir, path)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            shutil.rmtree(full_path)
+        elif os.path.lexists(full_path):
+            os.remove(full_path)
+
+    for path, entry in delta["changed"].items():
+        if entry["type"] == "file" and sha256_file(os.path.join(release_dir, path)) != entry["sha256"]:
+            raise Exception(f"{path} does not match the delta after applying it")
+    logger.info(f"{release_dir} is now release {delta['target_name']}")
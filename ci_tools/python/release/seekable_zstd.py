@@ -0,0 +1,252 @@
+# -*- coding:utf8 -*-
+# !/usr/bin/python3
+import json
+import os
+import struct
+import subprocess
+import tarfile
+import threading
+
+from python.common.basic_logger import get_logger
+
+logger = get_logger()
+
+# zstd seekable format: the seek table is a skippable frame at the end of the file ending with a 9 bytes footer
+SEEK_TABLE_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+# skippable frame holding the tar member index, listed in the seek table with a decompressed size of 0
+INDEX_MAGIC = 0x184D2A50
+FOOTER_SIZE = 9
+# frame sizes are 32 bits in the seek table, a frame is cut inside a member beyond this
+MAX_FRAME_SIZE = 1024 ** 3
+LONG_WINDOW_LOG = 27
+# the tar filter of python 3.12+ strips unsafe modes and paths
+EXTRACT_ARGS = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+
+
+class SeekableZstdWriter:
+    """
+    Write-only file object compressing what is written into independent zstd frames, for a tarfile in "w" mode.
+    A frame is cut at the next tar member once it holds frame_size bytes, so a member can be decompressed
+    starting at its frame. The offsets of the members are kept in an index frame before the seek table.
+    Every frame is compressed by a zstd process using threads threads and long distance matching.
+    The file is still a plain zstd stream for zstd -d, which skips the index and the seek table.
+    """
+
+    def __init__(self, dest, level=5, threads=16, frame_size=128 * 1024 ** 2, long_matching=True,
+                 max_frame_size=MAX_FRAME_SIZE):
+        self.command = ["zstd", "-q", f"-{level}", f"-T{threads}"]
+        if long_matching:
+            self.command.append(f"--long={LONG_WINDOW_LOG}")
+        self.frame_size = frame_size
+        self.max_frame_size = max_frame_size
+        self.file = open(dest, 'wb', buffering=0)
+        self.process = None
+        self.frame_start = 0
+        self.frame_bytes = 0
+        self.position = 0
+        # (compressed size, decompressed size) of every frame
+        self.frames = []
+        # [name, start, end] of every tar member in the decompressed stream
+        self.members = []
+
+    def start_frame(self):
+        self.frame_start = os.lseek(self.file.fileno(), 0, os.SEEK_CUR)
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=self.file)
+
+    def end_frame(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise Exception(f"{' '.join(self.command)} failed with exit code {self.process.returncode}")
+        compressed = os.lseek(self.file.fileno(), 0, os.SEEK_CUR) - self.frame_start
+        self.frames.append((compressed, self.frame_bytes))
+        self.process = None
+        self.frame_bytes = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while len(view):
+            if self.process is None:
+                self.start_frame()
+            size = min(len(view), self.max_frame_size - self.frame_bytes)
+            self.process.stdin.write(view[:size])
+            self.frame_bytes += size
+            self.position += size
+            view = view[size:]
+            if self.frame_bytes >= self.max_frame_size:
+                self.end_frame()
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def start_member(self):
+        if self.process is not None and self.frame_bytes >= self.frame_size:
+            self.end_frame()
+
+    def add_member(self, name, start, end):
+        self.members.append([name, start, end])
+
+    def write_skippable_frame(self, magic, content):
+        self.file.write(struct.pack("<II", magic, len(content)) + content)
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            if self.process is not None:
+                self.end_frame()
+            index = json.dumps({"members": self.members}).encode()
+            self.write_skippable_frame(INDEX_MAGIC, index)
+            self.frames.append((8 + len(index), 0))
+            entries = b"".join(struct.pack("<II", compressed, decompressed) for compressed, decompressed in self.frames)
+            footer = struct.pack("<IBI", len(self.frames), 0, SEEKABLE_MAGIC)
+            self.write_skippable_frame(SEEK_TABLE_MAGIC, entries + footer)
+        finally:
+            self.file.close()
+
+    def abort(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.file.close()
+
+
+def read_seek_table(archive):
+    """[(offset, compressed size, decompressed offset, decompressed size)] of the frames, None if not seekable."""
+    with open(archive, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        if file_size < FOOTER_SIZE + 8:
+            return None
+        f.seek(file_size - FOOTER_SIZE)
+        num_frames, descriptor, magic = struct.unpack("<IBI", f.read(FOOTER_SIZE))
+        if magic != SEEKABLE_MAGIC:
+            return None
+        entry_size = 12 if descriptor & 0x80 else 8
+        table_size = num_frames * entry_size + FOOTER_SIZE
+        f.seek(file_size - table_size - 8)
+        frame_magic, frame_size = struct.unpack("<II", f.read(8))
+        if frame_magic != SEEK_TABLE_MAGIC or frame_size != table_size:
+            raise Exception(f"{archive} has a corrupt seek table")
+        table = f.read(num_frames * entry_size)
+    frames = []
+    offset, decompressed_offset = 0, 0
+    for i in range(num_frames):
+        compressed, decompressed = struct.unpack_from("<II", table, i * entry_size)
+        frames.append((offset, compressed, decompressed_offset, decompressed))
+        offset += compressed
+        decompressed_offset += decompressed
+    return frames
+
+
+def read_index(archive, frames=None):
+    """[name, start, end] of the tar members of a seekable archive, None if it has no index."""
+    frames = frames if frames is not None else read_seek_table(archive)
+    if not frames:
+        return None
+    offset, compressed, _, _ = frames[-1]
+    with open(archive, 'rb') as f:
+        f.seek(offset)
+        magic, size = struct.unpack("<II", f.read(8))
+        if magic != INDEX_MAGIC:
+            return None
+        return json.loads(f.read(size))["members"]
+
+
+class BoundedReader:
+    """Read at most size bytes of fileobj."""
+
+    def __init__(self, fileobj, size):
+        self.fileobj = fileobj
+        self.remaining = size
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def skip(fileobj, size):
+    while size > 0:
+        data = fileobj.read(min(size, 1024 ** 2))
+        if not data:
+            raise Exception("unexpected end of the decompressed frames")
+        size -= len(data)
+
+
+def decompress_frames(archive, first, last):
+    """zstd process decompressing the frames first..last of archive, read its stdout."""
+    process = subprocess.Popen(["zstd", "-dcq", f"--long={LONG_WINDOW_LOG}"], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    start, end = first[0], last[0] + last[1]
+
+    def feed():
+        try:
+            with open(archive, 'rb') as f:
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    data = f.read(min(remaining, 1024 ** 2))
+                    process.stdin.write(data)
+                    remaining -= len(data)
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    threading.Thread(target=feed, daemon=True).start()
+    return process
+
+
+def extract_members(archive, member_filter, dest_dir):
+    """
+    Extract the members of a seekable archive for which member_filter(name) is true, only the frames holding
+    them are decompressed. Return the number of extracted members.
+    """
+    frames = read_seek_table(archive)
+    index = read_index(archive, frames)
+    if index is None:
+        raise Exception(f"{archive} is not a seekable release archive")
+    data_frames = [frame for frame in frames if frame[3] > 0]
+
+    def frame_of(position):
+        return next(i for i, frame in enumerate(data_frames) if frame[2] <= position < frame[2] + frame[3])
+
+    # consecutive frames are decompressed in one run
+    runs = []
+    for name, start, end in index:
+        if not member_filter(name):
+            continue
+        first, last = frame_of(start), frame_of(end - 1)
+        if runs and first <= runs[-1][1] + 1:
+            runs[-1][1] = max(runs[-1][1], last)
+            runs[-1][2].append((start, end))
+        else:
+            runs.append([first, last, [(start, end)]])
+
+    extracted = 0
+    for first, last, members in runs:
+        process = decompress_frames(archive, data_frames[first], data_frames[last])
+        position = data_frames[first][2]
+        try:
+            for start, end in members:
+                skip(process.stdout, start - position)
+                reader = BoundedReader(process.stdout, end - start)
+                with tarfile.open(fileobj=reader, mode="r|") as tar:
+                    for member in tar:
+                        tar.extract(member, dest_dir, **EXTRACT_ARGS)
+                        extracted += 1
+                skip(reader, reader.remaining)
+                position = end
+        finally:
+            process.stdout.close()
+            process.wait()
+    logger.info(f"extracted {extracted} members of {archive} from {sum(r[1] - r[0] + 1 for r in runs)} of "
+                f"{len(data_frames)} frames")
+    return extracted
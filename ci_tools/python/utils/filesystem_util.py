@@ -1,5 +1,6 @@
 # -*- coding:utf8 -*-
 # !/usr/bin/python3
+import fcntl
 import json
 import shutil
 
@@ -11,6 +12,10 @@ import os
 import shutil
 
 logger = get_logger()
+# ioctl cloning a whole file, linux/fs.h
+FICLONE = 0x40049409
+
+
 class FilesystemUtil:
     @staticmethod
     def create_dir(path, empty_if_exists=True):
@@ -41,6 +46,39 @@ class FilesystemUtil:
         else:
             shutil.copy2(src, dest)
 
+    @staticmethod
+    def reflink(src, dest):
+        """Clone src to dest sharing its data blocks copy-on-write, raise OSError where the filesystem can not."""
+        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdest:
+            try:
+                fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                fdest.close()
+                os.remove(dest)
+                raise
+        shutil.copystat(src, dest)
+
+    @staticmethod
+    def link_or_copy(src, dest):
+        """
+        Hard link src to dest, or reflink it where hard links are not allowed, falling back to a copy when both are
+        not on the same filesystem. Return how the file was placed: link, reflink or copy.
+        The files must not be modified in place afterwards, a hard link shares them with src.
+        """
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            os.link(src, dest)
+            return "link"
+        except OSError:
+            pass
+        try:
+            FilesystemUtil.reflink(src, dest)
+            return "reflink"
+        except OSError:
+            shutil.copy2(src, dest)
+            return "copy"
+
     @staticmethod
     def recursive_glob(rootdir='.', prefix=None, suffix=None, filter_func=None):
         """Recursively glob files from rootdir with specific prefix and/or suffix, and apply an optional filter."""
@@ -1,5 +1,8 @@
 import platform
 #import distro
+import fcntl
+import hashlib
+import signal
 import subprocess
 import sys
 from contextlib import contextmanager
@@ -116,6 +119,35 @@ def kill_user_processes(username):
         subprocess.run(['kill', '-9', pid])
 
 
+def get_descendant_pids(root_pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # the command name may contain spaces, the parent pid follows the closing parenthesis
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    descendants, stack = [], list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        descendants.append(pid)
+        stack.extend(children.get(pid, []))
+    return descendants
+
+
+def kill_process_tree(root_pid, sig=signal.SIGTERM):
+    for pid in get_descendant_pids(root_pid) + [root_pid]:
+        try:
+            os.kill(pid, sig)
+        except (ProcessLookupError, PermissionError) as e:
+            logger.info(f"kill {pid} failed: {e}")
+
+
 def copy_file(src, dst):
     with open(src, 'rb') as fsrc:
         with open(dst, 'wb') as fdst:
@@ -134,6 +166,28 @@ def smart_open(file: str, mode: str, *args, **kwargs):
         yield fh
 
 
+@contextmanager
+def file_lock(lock_file):
+    """Exclusive flock on lock_file, shared by all processes and containers that see the same file."""
+    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+    with open(lock_file, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield fh
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def sha256_file(file_path):
+    h = hashlib.sha256()
+    b = bytearray(1024 * 1024)
+    mv = memoryview(b)
+    with open(file_path, 'rb', buffering=0) as f:
+        for n in iter(lambda: f.readinto(mv), 0):
+            h.update(mv[:n])
+    return h.hexdigest()
+
+
 def run_shell_command(command, shell=False, retries=0, retry_interval=1):
     for attempt in range(retries + 1):
         try:
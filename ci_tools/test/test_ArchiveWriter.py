@@ -0,0 +1,126 @@
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+
+import pytest
+
+from python.release.archive_writer import ArchiveWriter, read_archive, walk_tree
+
+requires_zstd = pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+# stands in for pigz, gzip takes the same level and -dc options but no thread count
+FAKE_PIGZ = """#!/bin/sh
+args=""
+while [ $# -gt 0 ]; do
+  case "$1" in
+    -p) shift 2 ;;
+    *) args="$args $1"; shift ;;
+  esac
+done
+exec gzip $args
+"""
+
+
+def write_fake_pigz(tmp_path, script=FAKE_PIGZ):
+    path = tmp_path / "pigz"
+    path.write_text(script)
+    path.chmod(0o755)
+    return str(path)
+
+
+def list_members(archive):
+    data = subprocess.check_output(["zstd", "-dcq", archive])
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        return {member.name: tar.extractfile(member).read() if member.isfile() else None for member in tar}
+
+
+class TestArchiveWriter:
+
+    #  the manifest is streamed into the compressor, excluded paths and no staging dir involved
+    @requires_zstd
+    def test_write_manifest(self, tmp_path):
+        src = tmp_path / "prj"
+        (src / "conf").mkdir(parents=True)
+        (src / "conf" / "a.yml").write_text("a")
+        (src / ".git").mkdir()
+        (src / ".git" / "HEAD").write_text("ref")
+        (tmp_path / "x.rpm").write_bytes(b"rpm")
+        archive = str(tmp_path / "release.tar.zst")
+
+        with ArchiveWriter(archive, "zstd", level=3, threads=2) as writer:
+            writer.add_manifest(walk_tree(str(src), "prj", exclude=[str(src / ".git")]))
+            writer.add_manifest([(None, "prj/rpms"), (str(tmp_path / "x.rpm"), "prj/rpms/x.rpm")])
+
+        assert list_members(archive) == {"prj": None, "prj/conf": None, "prj/conf/a.yml": b"a",
+                                         "prj/rpms": None, "prj/rpms/x.rpm": b"rpm"}
+
+    #  every path of a hard linked file is stored and hashed as a regular file
+    @requires_zstd
+    def test_hard_links(self, tmp_path):
+        src = tmp_path / "prj"
+        (src / "d").mkdir(parents=True)
+        (src / "d" / "f").write_bytes(b"data")
+        os.link(str(src / "d" / "f"), str(src / "d" / "g"))
+        archive = str(tmp_path / "release.tar.zst")
+
+        with ArchiveWriter(archive, "zstd") as writer:
+            writer.add_manifest(walk_tree(str(src), "prj"))
+
+        assert list_members(archive)["prj/d/g"] == b"data"
+        assert writer.manifest["prj/d/g"] == writer.manifest["prj/d/f"]
+        assert writer.manifest["prj/d/g"]["size"] == 4 and writer.manifest["prj/d/g"]["sha256"] is not None
+
+    #  members of an existing archive are copied through without extracting it
+    @requires_zstd
+    def test_copy_members(self, tmp_path):
+        (tmp_path / "x.rpm").write_bytes(b"rpm")
+        (tmp_path / "y.rpm").write_bytes(b"old")
+        old = str(tmp_path / "old.tar.zst")
+        with ArchiveWriter(old, "zstd") as writer:
+            writer.add_manifest([(str(tmp_path / "x.rpm"), "rpms/x.rpm"), (str(tmp_path / "y.rpm"), "rpms/y.rpm")])
+
+        new = str(tmp_path / "new.tar.zst")
+        with ArchiveWriter(new, "zstd") as writer:
+            writer.copy_members(old, lambda name: name != "rpms/y.rpm")
+
+        assert list_members(new) == {"rpms/x.rpm": b"rpm"}
+
+    #  a failed archive is not left behind
+    @requires_zstd
+    def test_failure_removes_archive(self, tmp_path):
+        archive = str(tmp_path / "release.tar.zst")
+        with pytest.raises(FileNotFoundError):
+            with ArchiveWriter(archive, "zstd") as writer:
+                writer.add(str(tmp_path / "missing"), "missing")
+        assert not os.path.exists(archive)
+
+    #  gzip archives are streamed into pigz and read back through it
+    def test_gzip(self, tmp_path):
+        pigz = write_fake_pigz(tmp_path)
+        (tmp_path / "x.rpm").write_bytes(b"rpm")
+        archive = str(tmp_path / "release.tar.gz")
+
+        with ArchiveWriter(archive, "gzip", level=1, threads=2, pigz_path=pigz) as writer:
+            writer.add_manifest([(None, "prj"), (str(tmp_path / "x.rpm"), "prj/x.rpm")])
+
+        with tarfile.open(archive, "r:gz") as tar:
+            assert tar.getnames() == ["prj", "prj/x.rpm"]
+        with read_archive(archive, pigz) as tar:
+            assert [(member.name, tar.extractfile(member).read() if member.isfile() else None)
+                    for member in tar] == [("prj", None), ("prj/x.rpm", b"rpm")]
+
+    #  a failing compressor or a failing write leaves no gzip archive behind
+    def test_gzip_failure_removes_archive(self, tmp_path):
+        archive = str(tmp_path / "release.tar.gz")
+        failing_pigz = write_fake_pigz(tmp_path, "#!/bin/sh\ncat > /dev/null\nexit 1\n")
+        with pytest.raises(Exception, match="failed with exit code 1"):
+            with ArchiveWriter(archive, "gzip", pigz_path=failing_pigz) as writer:
+                writer.add_bytes("a", b"a")
+        assert not os.path.exists(archive)
+
+        pigz = write_fake_pigz(tmp_path)
+        with pytest.raises(FileNotFoundError):
+            with ArchiveWriter(archive, "gzip", pigz_path=pigz) as writer:
+                writer.add(str(tmp_path / "missing"), "missing")
+        assert not os.path.exists(archive)
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import requests
+
+from python.nexus.async_uploader import AsyncUploader, MultipartFileBody
+
+
+def write_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"pkg-{i}.rpm"
+        path.write_bytes(b"x" * (1000 + i))
+        paths.append(str(path))
+    return paths
+
+
+class TestAsyncUploader:
+
+    #  the streamed body is the same multipart document requests would build in memory
+    def test_multipart_body(self, tmp_path):
+        path = write_files(tmp_path, 1)[0]
+        body = MultipartFileBody({"yum.directory": "/7/os"}, "yum.asset", path, chunk_size=100)
+        content = b"".join(iter(lambda: body.read(100), b""))
+        assert len(content) == len(body)
+
+        prepared = requests.Request("POST", "http://localhost/", data=content,
+                                    headers={"Content-Type": body.content_type}).prepare()
+        assert b'name="yum.directory"\r\n\r\n/7/os\r\n' in prepared.body
+        assert b'filename="pkg-0.rpm"' in prepared.body and b"x" * 1000 in prepared.body
+        assert content.endswith(f"--{body.boundary}--\r\n".encode())
+
+    #  uploads overlap up to the bound, in flight uploads never exceed it and failures are returned
+    def test_bounded_concurrency(self, tmp_path):
+        paths = write_files(tmp_path, 20)
+        in_flight, peak = [0], [0]
+        lock = threading.Lock()
+
+        def upload(item):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            # hold the slot so that the next uploads start before this one ends
+            time.sleep(0.1)
+            with lock:
+                in_flight[0] -= 1
+            return 500 if item[0].endswith("pkg-19.rpm") else 204
+
+        uploader = AsyncUploader(upload, 4)
+        failed = uploader.run([(p,) for p in paths])
+        assert [item[0] for item in failed] == [paths[19]]
+        assert peak[0] == uploader.limiter.max_limit == 4
+
+    #  server errors halve the concurrency
+    def test_backoff_on_server_errors(self, tmp_path):
+        paths = write_files(tmp_path, 10)
+        uploader = AsyncUploader(lambda item: 503, 8)
+        assert len(uploader.run([(p,) for p in paths])) == 10
+        assert uploader.limiter.limit == 1
+
+    #  scheduling stays linear in the number of items
+    def test_many_items(self, tmp_path):
+        path = write_files(tmp_path, 1)[0]
+        start = time.monotonic()
+        failed = AsyncUploader(lambda item: 204, 32).run([(path,)] * 5000)
+        assert failed == []
+        assert time.monotonic() - start < 10
@@ -0,0 +1,119 @@
+import os
+import threading
+
+from python.build.build_cache import BuildCache
+
+import pytest
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def bigtop_dir(tmp_path):
+    bigtop = tmp_path / "bigtop"
+    write(str(bigtop / "bigtop.bom"),
+          "'hadoop' { name = 'hadoop'\n version { base = '3.3.6'; pkg = base }\n"
+          " tarball { destination = \"${name}-${version.base}.tar.gz\" } }\n"
+          "'hadoop-lzo' { version { base = '0.4.20' }\n tarball { destination = \"$name-${version.base}.tar.gz\" } }\n"
+          "'tez' { version { base = '0.10.2' } }\n")
+    write(str(bigtop / "bigtop-packages/src/common/hadoop/patch0.diff"), "patch")
+    write(str(bigtop / "bigtop-packages/src/rpm/hadoop/SPECS/hadoop.spec"), "spec")
+    write(str(bigtop / "bigtop-packages/src/rpm/tez/SPECS/tez.spec"), "spec")
+    write(str(bigtop / "dl/hadoop-3.3.6.tar.gz"), "source")
+    return str(bigtop)
+
+
+def new_cache(tmp_path, bigtop_dir):
+    return BuildCache(str(tmp_path / "cache"), bigtop_dir, os.path.join(bigtop_dir, "dl"), {"tez": ["hadoop"]})
+
+
+class TestBuildCache:
+
+    #  keys are stable for unchanged inputs
+    def test_key_is_stable(self, tmp_path, bigtop_dir):
+        assert new_cache(tmp_path, bigtop_dir).compute_key("tez", "stack=ambari") == \
+               new_cache(tmp_path, bigtop_dir).compute_key("tez", "stack=ambari")
+
+    #  a patch change invalidates the component and its dependents, but not unrelated bom entries
+    def test_change_propagates_to_dependents(self, tmp_path, bigtop_dir):
+        cache = new_cache(tmp_path, bigtop_dir)
+        hadoop_key, tez_key = cache.compute_key("hadoop", "f"), cache.compute_key("tez", "f")
+
+        write(os.path.join(bigtop_dir, "bigtop-packages/src/common/hadoop/patch0.diff"), "changed patch")
+        cache = new_cache(tmp_path, bigtop_dir)
+        assert cache.compute_key("hadoop", "f") != hadoop_key
+        assert cache.compute_key("tez", "f") != tez_key
+
+    #  a source tarball change invalidates the component
+    def test_source_tarball_change(self, tmp_path, bigtop_dir):
+        key = new_cache(tmp_path, bigtop_dir).compute_key("hadoop", "f")
+        write(os.path.join(bigtop_dir, "dl/hadoop-3.3.6.tar.gz"), "other source")
+        assert new_cache(tmp_path, bigtop_dir).compute_key("hadoop", "f") != key
+
+    #  only the tarballs named in the bom entry of a component are its sources
+    def test_source_files_from_bom(self, tmp_path, bigtop_dir):
+        write(os.path.join(bigtop_dir, "dl/hadoop-lzo-0.4.20.tar.gz"), "lzo source")
+        cache = new_cache(tmp_path, bigtop_dir)
+        assert [os.path.basename(f) for f in cache.get_source_files("hadoop")] == ["hadoop-3.3.6.tar.gz"]
+        assert [os.path.basename(f) for f in cache.get_source_files("hadoop-lzo")] == ["hadoop-lzo-0.4.20.tar.gz"]
+        assert cache.get_source_files("tez") == []
+
+    #  keys computed by concurrent workers while keys are refreshed match the keys of a fresh cache
+    def test_concurrent_refresh(self, tmp_path, bigtop_dir):
+        expected = new_cache(tmp_path, bigtop_dir).compute_key("tez", "f")
+        cache = new_cache(tmp_path, bigtop_dir)
+        keys = []
+
+        def work():
+            for _ in range(50):
+                cache.refresh_keys()
+                keys.append(cache.compute_key("tez", "f"))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert set(keys) == {expected}
+
+    #  a key is hashed without holding the lock, other components and refreshes do not wait for it
+    def test_hash_outside_lock(self, tmp_path, bigtop_dir, monkeypatch):
+        cache = new_cache(tmp_path, bigtop_dir)
+        hash_inputs = cache.hash_inputs
+        locked = []
+
+        def check_lock(component, build_flavor):
+            locked.append(cache.keys_lock.locked())
+            return hash_inputs(component, build_flavor)
+
+        monkeypatch.setattr(cache, "hash_inputs", check_lock)
+        cache.compute_key("tez", "f")
+        assert locked == [False, False]
+
+    #  stored outputs are restored after the output dir was cleaned
+    def test_store_and_restore(self, tmp_path, bigtop_dir):
+        cache = new_cache(tmp_path, bigtop_dir)
+        rpm = os.path.join(bigtop_dir, "output/hadoop/x86_64/hadoop-3.3.6-1.x86_64.rpm")
+        write(rpm, "rpm")
+        key = cache.compute_key("hadoop", "f")
+        assert not cache.lookup("hadoop", key)
+
+        cache.store("hadoop", key)
+        os.remove(rpm)
+        assert cache.lookup("hadoop", key)
+        cache.restore("hadoop", key)
+        with open(rpm) as f:
+            assert f.read() == "rpm"
+
+    #  invalidate drops every cached entry of the component
+    def test_invalidate(self, tmp_path, bigtop_dir):
+        cache = new_cache(tmp_path, bigtop_dir)
+        write(os.path.join(bigtop_dir, "output/hadoop/hadoop.rpm"), "rpm")
+        key = cache.compute_key("hadoop", "f")
+        cache.store("hadoop", key)
+        cache.invalidate("hadoop")
+        assert not cache.lookup("hadoop", key)
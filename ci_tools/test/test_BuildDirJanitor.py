@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+import python.build.build_janitor as build_janitor
+from python.build.build_janitor import BuildDirJanitor
+
+
+def make_build_dir(build_root, component, size, mtime):
+    build_dir = os.path.join(build_root, component)
+    os.makedirs(build_dir)
+    with open(os.path.join(build_dir, "data"), "wb") as f:
+        f.write(b"0" * size)
+    os.utime(build_dir, (mtime, mtime))
+
+
+class TestBuildDirJanitor:
+
+    #  released dirs of verified builds are removed, failed builds are kept for resume
+    def test_remove_released(self, tmp_path):
+        build_root = str(tmp_path)
+        make_build_dir(build_root, "hadoop", 10, time.time())
+        make_build_dir(build_root, "hive", 10, time.time())
+        janitor = BuildDirJanitor(build_root, 1024)
+        janitor.start()
+        janitor.acquire("hadoop")
+        janitor.acquire("hive")
+        janitor.release("hadoop", remove=True)
+        janitor.release("hive")
+        janitor.stop()
+        assert sorted(os.listdir(build_root)) == ["hive"]
+
+    #  over the budget the oldest dirs go first, running builds are never touched
+    def test_budget(self, tmp_path):
+        build_root = str(tmp_path)
+        now = time.time()
+        make_build_dir(build_root, "hadoop", 100, now - 300)
+        make_build_dir(build_root, "hive", 100, now - 200)
+        make_build_dir(build_root, "spark", 100, now - 100)
+        janitor = BuildDirJanitor(build_root, 150)
+        janitor.acquire("hadoop")
+        janitor.enforce_budget()
+        assert sorted(os.listdir(build_root)) == ["hadoop"]
+
+    #  a build acquired while the budget is enforced keeps its dir
+    def test_acquire_during_budget(self, tmp_path, monkeypatch):
+        build_root = str(tmp_path)
+        now = time.time()
+        make_build_dir(build_root, "hadoop", 100, now - 300)
+        make_build_dir(build_root, "hive", 100, now - 200)
+        janitor = BuildDirJanitor(build_root, 50)
+        get_dir_size = build_janitor.get_dir_size
+
+        def acquire_while_measuring(path):
+            janitor.acquire("hadoop")
+            return get_dir_size(path)
+
+        monkeypatch.setattr(build_janitor, "get_dir_size", acquire_while_measuring)
+        janitor.enforce_budget()
+        assert sorted(os.listdir(build_root)) == ["hadoop"]
+
+    #  a removal does not hold the lock, other builds acquire meanwhile and the removed component waits for it
+    def test_acquire_during_removal(self, tmp_path, monkeypatch):
+        build_root = str(tmp_path)
+        make_build_dir(build_root, "hadoop", 10, time.time())
+        janitor = BuildDirJanitor(build_root, 1024)
+        started, proceed = threading.Event(), threading.Event()
+        rmtree = build_janitor.shutil.rmtree
+
+        def slow_rmtree(path, ignore_errors=False):
+            started.set()
+            proceed.wait(5)
+            rmtree(path, ignore_errors=ignore_errors)
+
+        monkeypatch.setattr(build_janitor.shutil, "rmtree", slow_rmtree)
+        remover = threading.Thread(target=janitor.remove, args=("hadoop",))
+        remover.start()
+        assert started.wait(5)
+        janitor.acquire("hive")
+        acquirer = threading.Thread(target=janitor.acquire, args=("hadoop",))
+        acquirer.start()
+        acquirer.join(0.2)
+        assert acquirer.is_alive()
+        proceed.set()
+        remover.join(5)
+        acquirer.join(5)
+        assert janitor.in_use == {"hive", "hadoop"}
+        assert not os.path.exists(os.path.join(build_root, "hadoop"))
@@ -0,0 +1,45 @@
+import gzip
+import io
+
+from python.build.build_log import BuildLogMultiplexer
+
+
+class TestBuildLogMultiplexer:
+
+    #  gradle and maven markers become the progress of the component
+    def test_progress_from_phase_markers(self, tmp_path):
+        multiplexer = BuildLogMultiplexer()
+        component_log = multiplexer.open("hadoop", str(tmp_path / "hadoop.log.gz"))
+        component_log.pump(io.BytesIO(b"> Task :hadoop-download\n"))
+        assert ":hadoop-download" in multiplexer.get_progress_line()
+
+        component_log.pump(io.BytesIO(b"[INFO] Building Apache Hadoop Common 3.3.6                         [12/110]\n"))
+        assert "maven 12/110 Apache Hadoop Common 3.3.6" in multiplexer.get_progress_line()
+        multiplexer.close("hadoop", True)
+        multiplexer.stop()
+        assert multiplexer.get_progress_line() == ""
+
+    #  the log is written compressed
+    def test_log_is_compressed(self, tmp_path):
+        multiplexer = BuildLogMultiplexer()
+        log_path = str(tmp_path / "kafka.log.gz")
+        component_log = multiplexer.open("kafka", log_path)
+        component_log.pump(io.BytesIO(b"line 1\nline 2\n"))
+        multiplexer.close("kafka", True)
+        multiplexer.stop()
+        with gzip.open(log_path, "rt") as f:
+            assert f.read() == "line 1\nline 2\n"
+
+    #  the last error blocks are kept for the failure report
+    def test_error_excerpt(self, tmp_path):
+        multiplexer = BuildLogMultiplexer()
+        component_log = multiplexer.open("hive", str(tmp_path / "hive.log.gz"))
+        lines = [b"[INFO] ok\n"] * 100 + [b"[ERROR] Failed to execute goal compile\n", b"[ERROR] symbol not found\n"] + \
+                [b"[INFO] noise\n"] * 50 + [b"FAILURE: Build failed with an exception.\n", b"* What went wrong:\n"]
+        component_log.pump(io.BytesIO(b"".join(lines)))
+        excerpt = component_log.get_error_excerpt()
+        assert "[ERROR] symbol not found" in excerpt
+        assert "* What went wrong:" in excerpt
+        assert excerpt.count("[INFO] noise") < 50
+        multiplexer.close("hive", False)
+        multiplexer.stop()
@@ -0,0 +1,61 @@
+import threading
+
+from python.build.build_scheduler import BuildScheduler
+
+import pytest
+
+
+class TestBuildScheduler:
+
+    #  a component is only started after all of its prerequisites finished successfully
+    def test_prerequisites_finish_before_dependents(self):
+        deps = {"tez": ["hadoop"], "hive": ["hadoop", "tez"], "spark": ["hive"]}
+        finished = []
+        lock = threading.Lock()
+
+        def build(comp):
+            for dep in deps.get(comp, []):
+                assert dep in finished
+            with lock:
+                finished.append(comp)
+            return True
+
+        scheduler = BuildScheduler(["spark", "hive", "tez", "hadoop", "kafka"], deps, 3)
+        succeeded, failed, skipped = scheduler.run(build)
+        assert sorted(succeeded) == ["hadoop", "hive", "kafka", "spark", "tez"]
+        assert failed == [] and skipped == []
+
+    #  the component heading the longest chain is started first
+    def test_critical_path_gets_priority(self):
+        deps = {"tez": ["hadoop"], "hive": ["tez"]}
+        started = []
+        scheduler = BuildScheduler(["kafka", "zookeeper", "hadoop", "tez", "hive"], deps, 1)
+        scheduler.run(lambda comp: started.append(comp) or True)
+        assert started[:2] == ["hadoop", "tez"]
+
+    #  historical weights change the critical path
+    def test_weights_change_priority(self):
+        started = []
+        scheduler = BuildScheduler(["kafka", "hadoop"], {}, 1, weights={"hadoop": 10, "kafka": 1})
+        scheduler.run(lambda comp: started.append(comp) or True)
+        assert started == ["hadoop", "kafka"]
+
+    #  dependents of a failed component are skipped, independent components still build
+    def test_failed_component_skips_dependents(self):
+        deps = {"tez": ["hadoop"], "hive": ["tez"]}
+        scheduler = BuildScheduler(["hadoop", "tez", "hive", "kafka"], deps, 2)
+        succeeded, failed, skipped = scheduler.run(lambda comp: comp != "hadoop")
+        assert succeeded == ["kafka"]
+        assert failed == ["hadoop"]
+        assert sorted(skipped) == ["hive", "tez"]
+
+    #  prerequisites that are not part of the requested set are treated as already built
+    def test_prerequisites_outside_requested_set_are_ignored(self):
+        scheduler = BuildScheduler(["hive"], {"hive": ["hadoop", "tez"]}, 2)
+        succeeded, failed, skipped = scheduler.run(lambda comp: True)
+        assert succeeded == ["hive"]
+
+    #  a dependency cycle is rejected before anything is built
+    def test_cycle_detection(self):
+        with pytest.raises(Exception):
+            BuildScheduler(["a", "b"], {"a": ["b"], "b": ["a"]}, 2)
@@ -0,0 +1,40 @@
+from python.build.build_telemetry import BuildTelemetry
+
+
+def record_builds(telemetry, component, durations, exit_status=0):
+    for i, duration in enumerate(durations):
+        telemetry.record(component, 1000.0 * i, 1000.0 * i + duration, exit_status, peak_rss_mb=4000 + i)
+
+
+class TestBuildTelemetry:
+
+    #  median durations only count successful builds that were not cache hits
+    def test_median_durations(self, tmp_path):
+        telemetry = BuildTelemetry(str(tmp_path / "telemetry.db"), "centos_7_x86_64")
+        record_builds(telemetry, "hadoop", [300, 100, 200])
+        record_builds(telemetry, "hadoop", [5000], exit_status=1)
+        telemetry.record("hadoop", 9000, 9000, 0, cache_hit=True)
+        assert telemetry.get_median_durations(["hadoop", "kafka"]) == {"hadoop": 200}
+
+    #  targets of a matrix build keep separate histories
+    def test_targets_are_separate(self, tmp_path):
+        db = str(tmp_path / "telemetry.db")
+        record_builds(BuildTelemetry(db, "centos_7_x86_64"), "hadoop", [100])
+        assert BuildTelemetry(db, "centos_8_x86_64").get_median_durations(["hadoop"]) == {}
+        assert BuildTelemetry(db).get_targets() == ["centos_7_x86_64"]
+
+    #  the latest peak rss is used as memory budget
+    def test_peak_rss(self, tmp_path):
+        telemetry = BuildTelemetry(str(tmp_path / "telemetry.db"))
+        record_builds(telemetry, "hive", [100, 100])
+        assert telemetry.get_peak_rss(["hive", "spark"]) == {"hive": 4001}
+
+    #  a build much slower than its median is reported as a regression
+    def test_report_regression(self, tmp_path):
+        telemetry = BuildTelemetry(str(tmp_path / "telemetry.db"))
+        record_builds(telemetry, "spark", [600, 620, 610, 1200])
+        record_builds(telemetry, "kafka", [60, 61])
+        report = telemetry.get_report()
+        assert report["spark"]["regression"] and not report["kafka"]["regression"]
+        assert report["spark"]["median_duration"] == 610
+        assert "REGRESSION" in telemetry.format_report(["spark"])
@@ -0,0 +1,175 @@
+import threading
+
+import docker
+import pytest
+
+import python.container.container_manager as container_manager
+from python.container.container_manager import ContainerManager, ENV_FINGERPRINT_LABEL
+
+OS_INFO = ("centos", "8", "x86_64")
+
+
+class FakePathManager:
+    bigtop_project_dir = "/bigtop"
+    bigtop_docker_volume_dir = "/ws"
+    bigtop_local_maven_repo_dir = "/m2"
+    bigtop_dl_dir = "/dl"
+    bigtop_dl_docker_volume_dir = "/ws/dl"
+    prj_docker_volume_dir = "/prj"
+    ci_config = {"docker": {"max_container_builds": 20}}
+
+    def get_current_prj_dir(self):
+        return "/prj"
+
+
+class FakeImage:
+    def __init__(self, image_id):
+        self.id = image_id
+
+
+class FakeContainer:
+    def __init__(self, image_id="sha256:1", labels=None, status="running"):
+        self.id = "c1"
+        self.short_id = "c1"
+        self.image = FakeImage(image_id)
+        self.labels = labels or {}
+        self.status = status
+        self.calls = []
+
+    def reload(self):
+        pass
+
+    def start(self):
+        self.calls.append("start")
+        self.status = "running"
+
+    def stop(self):
+        self.calls.append("stop")
+
+    def remove(self):
+        self.calls.append("remove")
+
+    def exec_run(self, cmd):
+        return 0, b""
+
+
+class FakeContainers:
+    def __init__(self, existing=None):
+        self.existing = existing
+        self.created = []
+
+    def get(self, name):
+        if self.existing is None:
+            raise docker.errors.NotFound("no such container")
+        return self.existing
+
+    def run(self, **kwargs):
+        self.created.append(kwargs)
+        return FakeContainer(labels=kwargs["labels"])
+
+
+class FakeImages:
+    def get(self, image):
+        return FakeImage("sha256:1")
+
+
+class FakeApi:
+    def __init__(self, chunks, exit_code=0, block=False):
+        self.chunks = chunks
+        self.exit_code = exit_code
+        self.killed = threading.Event()
+        if not block:
+            self.killed.set()
+
+    def exec_create(self, container_id, cmd, workdir=None):
+        return {"Id": "e1"}
+
+    def exec_start(self, exec_id, stream=False):
+        for chunk in self.chunks:
+            yield chunk
+        self.killed.wait(5)
+
+    def exec_inspect(self, exec_id):
+        return {"ExitCode": self.exit_code, "Pid": 123}
+
+
+class FakeClient:
+    def __init__(self, existing=None, api=None):
+        self.containers = FakeContainers(existing)
+        self.images = FakeImages()
+        self.api = api
+
+
+@pytest.fixture
+def new_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(container_manager, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(container_manager, "CONTAINER_POOL_STATE_FILE", str(tmp_path / "container_pool.json"))
+
+    def create(client):
+        monkeypatch.setattr(container_manager.docker, "from_env", lambda: client)
+        manager = ContainerManager(OS_INFO, FakePathManager())
+        manager.setup_calls = []
+        manager.setup_environment = lambda: manager.setup_calls.append(True)
+        return manager
+
+    return create
+
+
+class TestContainerManager:
+
+    #  a healthy container of the same image and environment is reused without provisioning
+    def test_reuse_warm_container(self, new_manager):
+        client = FakeClient()
+        fingerprint = new_manager(client).get_env_fingerprint()
+        existing = FakeContainer(labels={ENV_FINGERPRINT_LABEL: fingerprint})
+        client.containers.existing = existing
+        manager = new_manager(client)
+
+        manager.create_container()
+
+        assert manager.container is existing
+        assert existing.calls == [] and client.containers.created == [] and manager.setup_calls == []
+
+    #  a container provisioned for another environment is replaced by a fresh one
+    def test_fingerprint_mismatch(self, new_manager):
+        existing = FakeContainer(labels={ENV_FINGERPRINT_LABEL: "other"})
+        client = FakeClient(existing)
+        manager = new_manager(client)
+
+        manager.create_container()
+
+        assert existing.calls == ["stop", "remove"]
+        assert client.containers.created[0]["labels"] == {ENV_FINGERPRINT_LABEL: manager.get_env_fingerprint()}
+        assert manager.container is not existing and manager.setup_calls == [True]
+        assert manager.load_pool_state()[manager.name]["builds"] == 0
+
+    #  exec output is streamed to the log file while only its tail is returned
+    def test_streamed_output(self, new_manager, tmp_path, monkeypatch):
+        monkeypatch.setattr(container_manager, "EXEC_OUTPUT_TAIL_BYTES", 8)
+        manager = new_manager(FakeClient(api=FakeApi([b"first\n", b"second\n", b"third\n"])))
+        manager.container = FakeContainer()
+        log_file = str(tmp_path / "build.log")
+
+        exit_code, output = manager.execute_command("make", log_file=log_file)
+
+        assert exit_code == 0 and output == "third\n"
+        assert open(log_file, "rb").read() == b"first\nsecond\nthird\n"
+
+    #  a command running past its timeout gets its process tree killed and reports its exit code
+    def test_timeout_kills_exec(self, new_manager, monkeypatch):
+        api = FakeApi([b"building\n"], exit_code=137, block=True)
+        killed = []
+
+        def kill_process_tree(pid):
+            killed.append(pid)
+            api.killed.set()
+
+        monkeypatch.setattr(container_manager, "EXEC_POLL_INTERVAL", 0.05)
+        monkeypatch.setattr(container_manager, "kill_process_tree", kill_process_tree)
+        manager = new_manager(FakeClient(api=api))
+        manager.container = FakeContainer()
+
+        exit_code, output = manager.execute_command("make", timeout=0.1)
+
+        assert killed == [123]
+        assert exit_code == 137 and output == "building\n"
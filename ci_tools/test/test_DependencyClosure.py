@@ -0,0 +1,70 @@
+import io
+
+from python.nexus.dependency_closure import DependencyClosure, load_playbook_packages, rpm_vercmp
+from python.nexus.repo_metadata import iter_primary_packages
+
+PRIMARY = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="5">
+<package type="rpm">
+  <name>curl</name><arch>x86_64</arch><version epoch="0" ver="7.29.0" rel="59.el7"/>
+  <checksum type="sha256" pkgid="YES">curl1</checksum>
+  <format>
+    <rpm:provides><rpm:entry name="curl"/></rpm:provides>
+    <rpm:requires><rpm:entry name="libcurl"/><rpm:entry name="/bin/sh"/><rpm:entry name="rpmlib(FileDigests)"/>
+    </rpm:requires>
+  </format>
+</package>
+<package type="rpm">
+  <name>libcurl</name><arch>x86_64</arch><version epoch="0" ver="7.29.0" rel="9.el7"/>
+  <checksum type="sha256" pkgid="YES">libcurl-old</checksum>
+  <format><rpm:provides><rpm:entry name="libcurl.so.4()(64bit)"/></rpm:provides></format>
+</package>
+<package type="rpm">
+  <name>libcurl</name><arch>x86_64</arch><version epoch="0" ver="7.29.0" rel="59.el7"/>
+  <checksum type="sha256" pkgid="YES">libcurl-new</checksum>
+  <format>
+    <rpm:provides><rpm:entry name="libcurl.so.4()(64bit)"/></rpm:provides>
+    <rpm:requires><rpm:entry name="libssh2"/></rpm:requires>
+  </format>
+</package>
+<package type="rpm">
+  <name>bash</name><arch>x86_64</arch><version epoch="0" ver="4.2.46" rel="34.el7"/>
+  <checksum type="sha256" pkgid="YES">bash</checksum>
+  <format><file>/bin/sh</file><file>/bin/bash</file></format>
+</package>
+<package type="rpm">
+  <name>unzip</name><arch>x86_64</arch><version epoch="0" ver="6.0" rel="24.el7"/>
+  <checksum type="sha256" pkgid="YES">unzip</checksum>
+</package>
+</metadata>
+"""
+
+
+class TestDependencyClosure:
+
+    #  versions compare segment by segment, numbers numerically and tilde before everything
+    def test_rpm_vercmp(self):
+        assert rpm_vercmp("1.10", "1.9") == 1
+        assert rpm_vercmp("59.el7", "9.el7") == 1
+        assert rpm_vercmp("1.0~rc1", "1.0") == -1
+        assert rpm_vercmp("1.0a", "1.0") == 1
+        assert rpm_vercmp("2.0", "2.0") == 0
+
+    #  the closure follows requires through provides and file lists and keeps the newest version of a package
+    def test_resolve(self):
+        closure = DependencyClosure()
+        for pinfo in iter_primary_packages(io.BytesIO(PRIMARY.encode()), with_deps=True):
+            closure.add_package("base", pinfo)
+
+        result = closure.resolve(["curl"])
+
+        assert set(result["base"]) == {"curl", "libcurl", "bash"}
+        assert result["base"]["libcurl"]["checksum"] == "libcurl-new"
+        assert closure.missing == {"libssh2"}
+
+    #  the seeds come from the package lists of the playbook vars
+    def test_load_playbook_packages(self):
+        packages = load_playbook_packages("centos7")
+        assert {"ambari-agent", "ambari-server", "curl", "openssl-devel", "zlib-devel",
+                "postgresql10-server"} <= set(packages)
+        assert not [p for p in packages if "{{" in p]
@@ -0,0 +1,19 @@
+import os
+
+from python.utils.filesystem_util import FilesystemUtil
+
+
+class TestFilesystemUtil:
+
+    #  without hard links or reflinks the file is copied
+    def test_link_or_copy_falls_back_to_copy(self, tmp_path, monkeypatch):
+        def fail(*args):
+            raise OSError(18, "Invalid cross-device link")
+
+        monkeypatch.setattr(os, "link", fail)
+        monkeypatch.setattr(FilesystemUtil, "reflink", staticmethod(fail))
+        (tmp_path / "a.rpm").write_bytes(b"rpm")
+
+        assert FilesystemUtil.link_or_copy(str(tmp_path / "a.rpm"), str(tmp_path / "b.rpm")) == "copy"
+        assert (tmp_path / "b.rpm").read_bytes() == b"rpm"
+        assert os.stat(str(tmp_path / "b.rpm")).st_ino != os.stat(str(tmp_path / "a.rpm")).st_ino
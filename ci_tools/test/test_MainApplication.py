@@ -0,0 +1,63 @@
+import argparse
+
+import pytest
+
+import python.build.bigtop_utils as bigtop_utils
+from main import MainApplication
+from python.build.bigtop_utils import BigtopBuilder
+
+TARGETS = [("centos", "7", "x86_64"), ("openeuler", "22", "x86_64")]
+
+
+class FakeNexusManager:
+    def get_maven_mirror_url(self):
+        return "http://nexus/maven"
+
+
+def new_app(matrix_prj_dirs, parallel=8):
+    app = object.__new__(MainApplication)
+    app.args = argparse.Namespace(parallel=parallel)
+    app.ci_config = {"udh_release_output_dir": "/out", "centos7_pg_10_dir": "",
+                     "bigtop": {"prj_dir": "/bigtop", "matrix_prj_dirs": matrix_prj_dirs, "local_maven_repo_dir": "",
+                                "dl_dir": "", "use_docker": True},
+                     "docker": {"volumes": {"bigtop": "/ws", "prj": "/prj"}}}
+    app.nexus_manager = FakeNexusManager()
+    app.built = []
+    app.build_target = lambda *args: app.built.append(args)
+    return app
+
+
+class TestMainApplication:
+
+    #  -parallel and the host resources are split evenly between the targets of a matrix build
+    def test_matrix_split(self):
+        app = new_app({"centos_7_x86_64": "/bigtop-centos7", "openeuler_22_x86_64": "/bigtop-openeuler22"})
+
+        app.build_matrix(TARGETS)
+
+        assert sorted(app.built) == [(os_info, 4, 0.5, "http://nexus/maven") for os_info in TARGETS]
+
+    #  a target always gets at least one build slot
+    def test_matrix_split_minimum(self):
+        app = new_app({"centos_7_x86_64": "/bigtop-centos7", "openeuler_22_x86_64": "/bigtop-openeuler22"}, parallel=1)
+
+        app.build_matrix(TARGETS)
+
+        assert [args[1] for args in app.built] == [1, 1]
+
+    #  targets sharing a bigtop tree are rejected before anything is built
+    def test_matrix_shared_bigtop_dir(self):
+        app = new_app({})
+
+        with pytest.raises(Exception, match="matrix_prj_dirs"):
+            app.build_matrix(TARGETS)
+        assert app.built == []
+
+    #  the builder of a target only uses its share of the host cpus and memory
+    def test_resource_share(self, monkeypatch):
+        monkeypatch.setattr(bigtop_utils, "get_host_cpus", lambda: 16)
+        monkeypatch.setattr(bigtop_utils, "get_host_memory_mb", lambda: 32000)
+        builder = object.__new__(BigtopBuilder)
+        builder.conf = {"resource_share": 0.5}
+
+        assert builder.get_cpu_share() == 8 and builder.get_memory_share() == 16000
@@ -0,0 +1,63 @@
+import python.nexus.mirror_selector as mirror_selector
+from python.nexus.mirror_selector import MirrorSelector
+
+MIRRORS = ["http://a/Packages/", "http://b/Packages/", "http://c/Packages/"]
+
+
+def measured_selector():
+    selector = MirrorSelector(MIRRORS)
+    for mirror, throughput in zip(selector.mirrors, [10e6, 8e6, 6e6]):
+        mirror.throughput = throughput
+    return selector
+
+
+class TestMirrorSelector:
+
+    #  downloads are spread over all healthy mirrors
+    def test_pick_spreads_downloads(self):
+        selector = measured_selector()
+        picked = {selector.pick() for _ in range(200)}
+        assert picked == set(MIRRORS)
+        assert selector.pick(exclude=MIRRORS[:2]) == MIRRORS[2]
+
+    #  a mirror failing repeatedly is demoted
+    def test_demote_failing_mirror(self):
+        selector = measured_selector()
+        for _ in range(3):
+            selector.report(MIRRORS[0], False)
+        assert MIRRORS[0] not in {selector.pick() for _ in range(100)}
+        assert selector.get_ranking()[-1].url == MIRRORS[0]
+
+    #  a mirror that becomes much slower than the others is demoted mid sync
+    def test_demote_slow_mirror(self):
+        selector = measured_selector()
+        for _ in range(10):
+            selector.report(MIRRORS[1], True, size=100000, seconds=1)
+        assert MIRRORS[1] not in {selector.pick() for _ in range(100)}
+
+    #  when every mirror is demoted the best one is still used
+    def test_all_demoted(self):
+        selector = measured_selector()
+        for url in MIRRORS:
+            for _ in range(3):
+                selector.report(url, False)
+        assert selector.pick() == MIRRORS[0]
+
+    #  a mirror whose probe failed is tried again after its demotion and promoted by a successful download
+    def test_failed_probe_recovers(self, monkeypatch):
+        class FailingSession:
+            def get(self, url, **kwargs):
+                raise ConnectionError("refused")
+
+        now = [1000.0]
+        monkeypatch.setattr(mirror_selector.time, "time", lambda: now[0])
+        selector = measured_selector()
+        selector.session = FailingSession()
+        selector.probe_mirror(selector.mirrors[2], "a.rpm")
+        assert MIRRORS[2] not in {selector.pick() for _ in range(100)}
+
+        now[0] += mirror_selector.DEMOTE_SECONDS + 1
+        assert MIRRORS[2] in {selector.pick() for _ in range(200)}
+        selector.report(MIRRORS[2], True, size=9e6, seconds=1)
+        assert selector.mirrors[2].throughput == 9e6
+        assert selector.get_ranking()[1].url == MIRRORS[2]
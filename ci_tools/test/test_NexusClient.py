@@ -0,0 +1,123 @@
+import gzip
+
+import requests
+
+from python.nexus.nexus_client import NexusClient, retry
+from python.utils.os_utils import sha256_file
+
+
+REPOMD = """<?xml version="1.0" encoding="UTF-8"?>
+<repomd xmlns="http://linux.duke.edu/metadata/repo"><revision>{revision}</revision>
+<data type="primary"><location href="repodata/{revision}-primary.xml.gz"/></data></repomd>"""
+PRIMARY = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" packages="1">
+<package type="rpm"><name>hadoop</name><location href="Packages/hadoop/hadoop-1.rpm"/></package></metadata>"""
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.status_code = status_code
+        self.data = data
+        self.content = data
+        self.text = ""
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.requests += 1
+        return FakeResponse(self.pages[params.get("continuationToken", "")])
+
+
+class FakeRepoSession:
+    def __init__(self, files):
+        self.files = files
+
+    def get(self, url, timeout=None):
+        for path, content in self.files.items():
+            if url.endswith(path):
+                return FakeResponse(content)
+        return FakeResponse(b"", 404)
+
+
+class TestNexusClient:
+
+    #  only new and changed packages are uploaded, changed and removed ones are deleted
+    def test_diff_assets(self, tmp_path):
+        files = {}
+        for name in ["hadoop-1.rpm", "hadoop-2.rpm", "hadoop-3.rpm"]:
+            (tmp_path / name).write_text(name)
+            files[name] = str(tmp_path / name)
+        remote = {
+            "udh3/Packages/hadoop/hadoop-1.rpm": {"id": "a1", "checksum": {"sha256": sha256_file(files["hadoop-1.rpm"])}},
+            "udh3/Packages/hadoop/hadoop-2.rpm": {"id": "a2", "checksum": {"sha256": "changed"}},
+            "udh3/Packages/hadoop/hadoop-0.rpm": {"id": "a0", "checksum": {"sha256": "old"}},
+        }
+        client = NexusClient("localhost", "admin", "admin")
+        to_upload, stale = client.diff_assets(sorted(files.values()), remote, "/udh3/Packages/hadoop")
+        assert to_upload == [files["hadoop-2.rpm"], files["hadoop-3.rpm"]]
+        assert sorted(asset["id"] for asset in stale) == ["a0", "a2"]
+
+    #  search follows the continuation token and keeps the assets under the prefix
+    def test_search_assets(self):
+        client = NexusClient("localhost", "admin", "admin")
+        client.session = FakeSession({
+            "": {"items": [{"path": "udh3/Packages/hive/hive.rpm"}, {"path": "udh3/Packages/hadoop/h1.rpm"}],
+                 "continuationToken": "next"},
+            "next": {"items": [{"path": "/udh3/Packages/hadoop/h2.rpm"}], "continuationToken": None},
+        })
+        assets = client.search_assets("yum", "udh3/Packages/hadoop/")
+        assert sorted(assets) == ["udh3/Packages/hadoop/h1.rpm", "udh3/Packages/hadoop/h2.rpm"]
+        #  the other components reuse the listing until their assets change
+        assert sorted(client.search_assets("yum", "udh3/Packages/hive/")) == ["udh3/Packages/hive/hive.rpm"]
+        assert client.session.requests == 2
+        client.mark_assets_changed("yum", "udh3/Packages/hive/")
+        client.search_assets("yum", "udh3/Packages/hadoop/")
+        assert client.session.requests == 2
+        client.search_assets("yum", "udh3/Packages/hive/")
+        assert client.session.requests == 4
+
+    #  the wait ends as soon as a new revision lists the uploaded packages
+    def test_wait_for_repodata(self):
+        client = NexusClient("localhost", "admin", "admin", repodata_timeout=-1)
+        client.session = FakeRepoSession({"/yum/udh3/repodata/repomd.xml": REPOMD.format(revision=2).encode(),
+                                          "/yum/udh3/repodata/2-primary.xml.gz": gzip.compress(PRIMARY.encode())})
+        assert client.get_repodata_state("yum", "/udh3/Packages/hadoop") == ("2", "repodata/2-primary.xml.gz")
+        assert client.wait_for_repodata("yum", "/udh3/Packages/hadoop", ("1", "repodata/1-primary.xml.gz"),
+                                        ["/out/hadoop-1.rpm"])
+        #  the revision did not change or the package is not listed: give up at the ceiling
+        assert not client.wait_for_repodata("yum", "/udh3/Packages/hadoop", ("2", "repodata/2-primary.xml.gz"),
+                                            ["/out/hadoop-1.rpm"])
+        assert not client.wait_for_repodata("yum", "/udh3/Packages/hadoop", None, ["/out/hadoop-2.rpm"])
+        #  nothing uploaded, nothing to wait for
+        client.repodata_timeout = 3600
+        assert client.wait_for_repodata("yum", "/udh3/Packages/hadoop", ("2", "repodata/2-primary.xml.gz"), [])
+
+    #  retryable statuses and connection errors are retried, other statuses are final
+    def test_retry(self):
+        results = [503, requests.ConnectionError("reset"), 204]
+        calls = []
+
+        @retry(max_retries=4, base_delay=0)
+        def post():
+            calls.append(1)
+            result = results[len(calls) - 1]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        assert post() == 204 and len(calls) == 3
+
+        @retry(max_retries=4, base_delay=0)
+        def forbidden():
+            calls.append(1)
+            return 400
+
+        calls.clear()
+        assert forbidden() == 400 and len(calls) == 1
@@ -0,0 +1,68 @@
+import os
+
+import python.nexus.nexus_repo_sync as nexus_repo_sync
+from python.nexus.nexus_repo_sync import NexusSynchronizer
+
+PACKAGE = """<package type="rpm">
+  <name>{name}</name><arch>x86_64</arch><version epoch="0" ver="{ver}" rel="1.el8"/>
+  <checksum type="sha256" pkgid="YES">{name}-{ver}</checksum>
+</package>"""
+
+
+def write_primary(path, packages):
+    body = "".join(PACKAGE.format(name=name, ver=ver) for name, ver in packages)
+    with open(path, "w") as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?><metadata xmlns="http://linux.duke.edu/metadata/common" '
+                f'xmlns:rpm="http://linux.duke.edu/metadata/rpm">{body}</metadata>')
+
+
+class TestNexusSynchronizer:
+
+    #  only repos whose repomd revision changed are fetched again, their diff is returned and pruned
+    def test_incremental_refresh(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(nexus_repo_sync, "REPO_FILES_DIR", str(tmp_path))
+        upstream = {"revision": "1", "packages": [("bash", "4.4"), ("curl", "7.61")]}
+        fetched = []
+
+        def fake_fetch_primary(session, packages_url, dest_dir, name_prefix, href=None):
+            dest = os.path.join(dest_dir, name_prefix)
+            write_primary(dest, upstream["packages"])
+            fetched.append(upstream["revision"])
+            return dest
+
+        monkeypatch.setattr(nexus_repo_sync, "get_repomd", lambda session, url: (upstream["revision"], "primary.xml"))
+        monkeypatch.setattr(nexus_repo_sync, "fetch_primary", fake_fetch_primary)
+        synchronizer = NexusSynchronizer(("centos", "8", "x86_64"), str(tmp_path / "sync"))
+
+        changes = synchronizer.generate_pkg_meta(fetch=True)
+        assert set(changes["base"][0]) == {"bash-4.4-1.el8.x86_64.rpm", "curl-7.61-1.el8.x86_64.rpm"}
+
+        assert synchronizer.generate_pkg_meta(fetch=True) == {}
+        assert fetched == ["1"]
+
+        upstream.update(revision="2", packages=[("bash", "4.4"), ("curl", "7.62")])
+        old_rpm = os.path.join(synchronizer.get_local_pkgs_dir("base"), "curl-7.61-1.el8.x86_64.rpm")
+        open(old_rpm, "w").close()
+        changes = synchronizer.generate_pkg_meta(fetch=True)
+        assert changes["base"] == ({"curl-7.62-1.el8.x86_64.rpm": "curl-7.62"}, ["curl-7.61-1.el8.x86_64.rpm"])
+        synchronizer.prune_packages(changes)
+        assert not os.path.exists(old_rpm)
+
+    #  a closure sync fetches the primary metadata when no refresh fetched it before
+    def test_closure_fetches_primary(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(nexus_repo_sync, "REPO_FILES_DIR", str(tmp_path))
+
+        def fake_fetch_primary(session, packages_url, dest_dir, name_prefix, href=None):
+            dest = os.path.join(dest_dir, name_prefix)
+            write_primary(dest, [("bash", "4.4"), ("curl", "7.61")])
+            return dest
+
+        monkeypatch.setattr(nexus_repo_sync, "get_repomd", lambda session, url: ("1", "primary.xml"))
+        monkeypatch.setattr(nexus_repo_sync, "fetch_primary", fake_fetch_primary)
+        synchronizer = NexusSynchronizer(("centos", "8", "x86_64"), str(tmp_path / "sync"))
+        assert synchronizer.primary_files == {}
+
+        packages = synchronizer.resolve_closure(["curl"])
+        assert os.path.dirname(synchronizer.primary_files["base"]) == synchronizer.repodata_dir
+
+        assert packages["base"] == {"curl-7.61-1.el8.x86_64.rpm": "curl-7.61"}
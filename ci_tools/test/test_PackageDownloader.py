@@ -0,0 +1,84 @@
+import hashlib
+import http.server
+import re
+import threading
+
+import pytest
+
+from python.nexus import package_downloader
+from python.nexus.package_downloader import PackageDownloader
+
+CONTENT = bytes(range(256)) * 4096
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        self.requests_seen.append(range_header)
+        if range_header:
+            start, end = re.match(r"bytes=(\d+)-(\d*)", range_header).groups()
+            start, end = int(start), int(end) if end else len(CONTENT) - 1
+            body = CONTENT[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+        else:
+            body = CONTENT
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    RangeHandler.requests_seen = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/pkg.rpm"
+    server.shutdown()
+
+
+def is_valid(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).digest() == hashlib.sha256(CONTENT).digest()
+
+
+class TestPackageDownloader:
+
+    #  a partial download continues where it stopped
+    def test_resume_partial_file(self, tmp_path, server_url):
+        dest = str(tmp_path / "pkg.rpm")
+        with open(f"{dest}.part", "wb") as f:
+            f.write(CONTENT[:1000])
+        assert PackageDownloader(base_delay=0).download(server_url, dest, validate=is_valid) == (True, None)
+        assert RangeHandler.requests_seen == ["bytes=1000-"]
+        assert is_valid(dest)
+
+    #  large files are fetched as parallel range chunks
+    def test_chunked_download(self, tmp_path, server_url, monkeypatch):
+        monkeypatch.setattr(package_downloader, "CHUNKED_DOWNLOAD_THRESHOLD", 1024)
+        monkeypatch.setattr(package_downloader, "CHUNK_SIZE", 300000)
+        dest = str(tmp_path / "pkg.rpm")
+        assert PackageDownloader(base_delay=0).download(server_url, dest, validate=is_valid) == (True, None)
+        assert len(RangeHandler.requests_seen) == 4
+        assert is_valid(dest)
+
+    #  a corrupt file is discarded and every retry is used before giving up
+    def test_retries_checksum_mismatch(self, tmp_path, server_url):
+        dest = str(tmp_path / "pkg.rpm")
+        success, message = PackageDownloader(max_retries=2, base_delay=0).download(server_url, dest,
+                                                                                 validate=lambda fp: False)
+        assert not success and "checksum" in message
+        assert len(RangeHandler.requests_seen) == 3
+        assert not (tmp_path / "pkg.rpm.part").exists()
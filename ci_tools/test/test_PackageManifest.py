@@ -0,0 +1,49 @@
+import os
+
+from python.nexus.package_manifest import PackageManifest
+from python.utils.os_utils import sha256_file
+
+
+class CountingHash:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return sha256_file(path)
+
+
+class TestPackageManifest:
+
+    #  unchanged files are not hashed again by the next run
+    def test_unchanged_files_skip_hashing(self, tmp_path):
+        rpm = tmp_path / "a.rpm"
+        rpm.write_bytes(b"rpm")
+        manifest_file = str(tmp_path / "manifest.json")
+        hash_func = CountingHash()
+
+        manifest = PackageManifest(manifest_file, hash_func)
+        expected = manifest.get_hash(str(rpm))
+        manifest.save()
+        assert PackageManifest(manifest_file, hash_func).get_hash(str(rpm)) == expected
+        assert hash_func.calls == 1
+
+    #  a file rewritten with a different size or mtime is hashed again
+    def test_changed_file_is_rehashed(self, tmp_path):
+        rpm = tmp_path / "a.rpm"
+        rpm.write_bytes(b"rpm")
+        manifest = PackageManifest(str(tmp_path / "manifest.json"), sha256_file)
+        manifest.get_hash(str(rpm))
+        rpm.write_bytes(b"other rpm")
+        assert manifest.get_hash(str(rpm)) == sha256_file(str(rpm))
+        assert manifest.get_hash(str(tmp_path / "missing.rpm")) is None
+
+    #  entries of removed files are dropped on save
+    def test_save_drops_removed_files(self, tmp_path):
+        rpm = tmp_path / "a.rpm"
+        rpm.write_bytes(b"rpm")
+        manifest = PackageManifest(str(tmp_path / "manifest.json"), sha256_file)
+        manifest.get_hash(str(rpm))
+        os.remove(str(rpm))
+        manifest.save()
+        assert manifest.entries == {}
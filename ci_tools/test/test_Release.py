@@ -0,0 +1,100 @@
+import os
+import tarfile
+
+import python.common.path_manager as path_manager
+import python.release.release as release
+from python.release.release import Release
+from python.release.release_manifest import ReleaseManifest, apply_delta, RELEASE_MANIFEST_NAME, \
+    DELTA_MANIFEST_NAME
+
+FAKE_PIGZ = """#!/bin/sh
+args=""
+while [ $# -gt 0 ]; do
+  case "$1" in
+    -p) shift 2 ;;
+    *) args="$args $1"; shift ;;
+  esac
+done
+exec gzip $args
+"""
+RPMS_DIR = "prj/ci_tools/resources/pkgs/udh-packages"
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+    with open(str(path), "wb") as f:
+        f.write(content)
+
+
+def new_release(tmp_path, comps=None, incremental_tar=""):
+    ci_config = {"udh_release_output_dir": str(tmp_path / "out"), "centos7_pg_10_dir": "",
+                 "jdk17_x86_location": str(tmp_path / "jdk.tar.gz"),
+                 "bigtop": {"prj_dir": str(tmp_path / "bigtop"), "local_maven_repo_dir": "", "dl_dir": "",
+                            "use_docker": False},
+                 "docker": {"volumes": {"bigtop": "", "prj": ""}},
+                 "release": {"compressor": "gzip", "compress_level": 1, "compress_threads": 2}}
+    rel = Release(("rocky", "8", "x86_64"), ci_config, comps, incremental_tar)
+    rel.pigz_path = str(tmp_path / "pigz")
+    return rel
+
+
+def list_members(archive):
+    with tarfile.open(archive, "r:gz") as tar:
+        return {member.name: tar.extractfile(member).read() if member.isfile() else None for member in tar}
+
+
+class TestRelease:
+
+    #  an incremental release keeps the rpms of the base but the rebuilt components, its delta updates the base
+    def test_incremental_release_and_delta(self, tmp_path, monkeypatch):
+        prj_dir = tmp_path / "prj"
+        monkeypatch.setattr(release, "PRJDIR", str(prj_dir))
+        monkeypatch.setattr(path_manager, "PRJDIR", str(prj_dir))
+        write(tmp_path / "pigz", FAKE_PIGZ.encode())
+        os.chmod(str(tmp_path / "pigz"), 0o755)
+        write(tmp_path / "jdk.tar.gz", b"jdk")
+        write(prj_dir / "README", b"v1")
+        write(prj_dir / ".git" / "HEAD", b"ref")
+        write(prj_dir / "ci_tools/resources/pkgs/udh-packages/stale.rpm", b"stale")
+        write(tmp_path / "bigtop/output/hadoop/x86_64/hadoop-1.rpm", b"hadoop")
+        write(tmp_path / "bigtop/output/hive/x86_64/hive-1.rpm", b"hive1")
+        os.makedirs(str(tmp_path / "out"))
+
+        base_tar = str(tmp_path / "out" / "base.tar.gz")
+        base, _ = new_release(tmp_path).write_release_archive(base_tar)
+        base_members = list_members(base_tar)
+        assert base_members[f"{RPMS_DIR}/hadoop/hadoop-1.rpm"] == b"hadoop"
+        assert base_members[f"{RPMS_DIR}/hive/hive-1.rpm"] == b"hive1"
+        assert "prj/.git/HEAD" not in base_members and f"{RPMS_DIR}/stale.rpm" not in base_members
+        assert ReleaseManifest.from_json(base_members[f"prj/{RELEASE_MANIFEST_NAME}"]).get_id() == base.get_id()
+
+        write(prj_dir / "README", b"v2")
+        os.remove(str(tmp_path / "bigtop/output/hive/x86_64/hive-1.rpm"))
+        write(tmp_path / "bigtop/output/hive/x86_64/hive-2.rpm", b"hive2")
+        incremental = new_release(tmp_path, ["hive"], base_tar)
+        filter_members = incremental.get_incremental_member_filter()
+        assert filter_members(f"{RPMS_DIR}/hadoop/hadoop-1.rpm")
+        assert not filter_members(f"{RPMS_DIR}/hive/hive-1.rpm") and not filter_members("prj/README")
+
+        new_tar = str(tmp_path / "out" / "new.tar.gz")
+        manifest, sources = incremental.write_release_archive(new_tar)
+        new_members = list_members(new_tar)
+        assert new_members[f"{RPMS_DIR}/hadoop/hadoop-1.rpm"] == b"hadoop"
+        assert new_members[f"{RPMS_DIR}/hive/hive-2.rpm"] == b"hive2"
+        assert f"{RPMS_DIR}/hive/hive-1.rpm" not in new_members
+        assert new_members["prj/README"] == b"v2"
+
+        delta_tar = str(tmp_path / "out" / "delta.tar.gz")
+        incremental.write_delta_archive(manifest, sources, incremental.get_base_manifest(), delta_tar)
+        delta_members = list_members(delta_tar)
+        assert list(delta_members)[0] == DELTA_MANIFEST_NAME
+        assert set(delta_members) == {DELTA_MANIFEST_NAME, RELEASE_MANIFEST_NAME, "README",
+                                      "ci_tools/resources/pkgs/udh-packages/hive/hive-2.rpm"}
+
+        installed = tmp_path / "installed"
+        with tarfile.open(base_tar, "r:gz") as tar:
+            tar.extractall(str(installed))
+        apply_delta(delta_tar, str(installed / "prj"), str(tmp_path / "pigz"))
+        assert (installed / "prj" / "README").read_bytes() == b"v2"
+        assert not os.path.exists(str(installed / RPMS_DIR / "hive" / "hive-1.rpm"))
+        assert ReleaseManifest.from_file(str(installed / "prj" / RELEASE_MANIFEST_NAME)).get_id() == manifest.get_id()
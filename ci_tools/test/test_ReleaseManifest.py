@@ -0,0 +1,52 @@
+import hashlib
+import json
+import os
+import shutil
+
+import pytest
+
+from python.release.archive_writer import ArchiveWriter
+from python.release.release_manifest import ReleaseManifest, apply_delta, RELEASE_MANIFEST_NAME, \
+    DELTA_MANIFEST_NAME
+
+
+def file_entry(data):
+    return {"type": "file", "size": len(data), "mode": 0o644, "sha256": hashlib.sha256(data).hexdigest()}
+
+
+class TestReleaseManifest:
+
+    #  the diff lists changed and added paths and the removed ones
+    def test_diff(self):
+        base = ReleaseManifest({"a": file_entry(b"a"), "b": file_entry(b"b"), "d": {"type": "dir"}})
+        target = ReleaseManifest({"a": file_entry(b"a2"), "d": {"type": "dir"}, "d/c": file_entry(b"c")})
+
+        assert target.diff(base) == (["a", "d/c"], ["b"])
+        assert base.get_id() == ReleaseManifest(dict(base.entries)).get_id() != target.get_id()
+
+    #  a delta updates its base release in place and is refused by any other release
+    @pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+    def test_apply_delta(self, tmp_path):
+        release_dir = tmp_path / "release"
+        release_dir.mkdir()
+        (release_dir / "a").write_bytes(b"a")
+        (release_dir / "b").write_bytes(b"b")
+        base = ReleaseManifest({"a": file_entry(b"a"), "b": file_entry(b"b")}, "base")
+        (release_dir / RELEASE_MANIFEST_NAME).write_text(base.to_json())
+        target = ReleaseManifest({"a": file_entry(b"a2")}, "target")
+
+        delta_tar = str(tmp_path / "delta.tar.zst")
+        delta = {"base": base.get_id(), "base_name": "base", "target": target.get_id(), "target_name": "target",
+                 "changed": {"a": target.entries["a"]}, "removed": ["b"]}
+        with ArchiveWriter(delta_tar, "zstd") as writer:
+            writer.add_bytes(DELTA_MANIFEST_NAME, json.dumps(delta).encode())
+            writer.add_bytes("a", b"a2")
+            writer.add_bytes(RELEASE_MANIFEST_NAME, target.to_json().encode())
+
+        apply_delta(delta_tar, str(release_dir))
+
+        assert (release_dir / "a").read_bytes() == b"a2"
+        assert not os.path.exists(str(release_dir / "b"))
+        assert ReleaseManifest.from_file(str(release_dir / RELEASE_MANIFEST_NAME)).get_id() == target.get_id()
+        with pytest.raises(Exception, match="the delta applies to base"):
+            apply_delta(delta_tar, str(release_dir))
@@ -0,0 +1,58 @@
+import gzip
+import shutil
+import subprocess
+
+import pytest
+
+from python.nexus.repo_metadata import get_repodata_url, iter_primary_packages, open_metadata
+
+PRIMARY = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="2">
+<package type="rpm">
+  <name>bash</name><arch>x86_64</arch><version epoch="0" ver="4.2.46" rel="34.el7"/>
+  <checksum type="sha256" pkgid="YES">abc</checksum>
+  <location href="Packages/bash-4.2.46-34.el7.x86_64.rpm"/>
+  <format><rpm:requires><rpm:entry name="libc.so.6"/></rpm:requires></format>
+</package>
+<package type="rpm">
+  <name>tzdata</name><arch>noarch</arch><version epoch="0" ver="2020a" rel="1.el7"/>
+  <checksum type="sha256" pkgid="YES">def</checksum>
+  <location href="Packages/tzdata-2020a-1.el7.noarch.rpm"/>
+</package>
+</metadata>
+"""
+
+
+def parse(path):
+    with open_metadata(path) as f:
+        return [(p["name"], p["arch"], p["ver"], p["rel"], p["checksum"]) for p in iter_primary_packages(f)]
+
+
+EXPECTED = [("bash", "x86_64", "4.2.46", "34.el7", "abc"), ("tzdata", "noarch", "2020a", "1.el7", "def")]
+
+
+class TestRepoMetadata:
+
+    #  plain and gzip metadata are streamed package by package
+    def test_parse_plain_and_gz(self, tmp_path):
+        plain = tmp_path / "primary.xml"
+        plain.write_text(PRIMARY)
+        with gzip.open(str(tmp_path / "primary.xml.gz"), "wt") as f:
+            f.write(PRIMARY)
+        assert parse(str(plain)) == EXPECTED
+        assert parse(str(tmp_path / "primary.xml.gz")) == EXPECTED
+
+    #  zstd metadata is read through the zstd command
+    @pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+    def test_parse_zst(self, tmp_path):
+        plain = tmp_path / "primary.xml"
+        plain.write_text(PRIMARY)
+        subprocess.check_call(["zstd", "-q", str(plain), "-o", str(tmp_path / "primary.xml.zst")])
+        assert parse(str(tmp_path / "primary.xml.zst")) == EXPECTED
+
+    #  the repodata dir is the sibling of the Packages dir of a mirror
+    def test_repodata_url(self):
+        assert get_repodata_url("http://mirrors.aliyun.com/centos/7/os/x86_64/Packages/") == \
+               "http://mirrors.aliyun.com/centos/7/os/x86_64/repodata/"
+        assert get_repodata_url("http://m/centos/8/BaseOS/x86_64/os/Packages") == \
+               "http://m/centos/8/BaseOS/x86_64/os/repodata/"
@@ -0,0 +1,48 @@
+import os
+import threading
+
+from python.build.resource_allocator import ResourceAllocator, get_process_tree_rss_kb
+
+
+class TestResourceAllocator:
+
+    #  concurrent builds split the host cpus instead of each asking for all of them
+    def test_cpus_split_across_slots(self):
+        allocator = ResourceAllocator(3, total_cpus=32, total_memory_mb=66000)
+        threads = [allocator.acquire(comp, 3)["threads"] for comp in ["hadoop", "kafka", "zookeeper"]]
+        assert sum(threads) <= 32
+        assert threads[0] == 10
+
+    #  cpus released by a finished build go to the build started after it
+    def test_rebalance_after_release(self):
+        allocator = ResourceAllocator(2, total_cpus=16, total_memory_mb=66000)
+        allocator.acquire("hadoop", 3)
+        allocator.acquire("kafka", 2)
+        allocator.release("kafka")
+        assert allocator.acquire("hive", 1)["threads"] == 8
+        allocator.release("hadoop")
+        assert allocator.acquire("spark", 1)["threads"] == 8
+
+    #  recorded peak rss becomes the memory budget of the next run
+    def test_peak_rss_history(self):
+        allocator = ResourceAllocator(2, {"hadoop": 10000}, total_cpus=8, total_memory_mb=34000)
+        assert allocator.acquire("hadoop", 1)["memory_mb"] == 12000
+        assert allocator.acquire("kafka", 1)["memory_mb"] == 15976
+
+    #  a build waits while the memory it needs is held by running builds
+    def test_memory_admission(self):
+        allocator = ResourceAllocator(2, {"hadoop": 8000, "hive": 8000}, total_cpus=8, total_memory_mb=12000,
+                                      reserved_memory_mb=0)
+        allocator.acquire("hadoop", 2)
+
+        started = threading.Event()
+        waiter = threading.Thread(target=lambda: allocator.acquire("hive", 1) and started.set())
+        waiter.start()
+        assert not started.wait(0.2)
+        allocator.release("hadoop")
+        assert started.wait(2)
+        waiter.join()
+
+    #  the rss of the current process tree is visible
+    def test_process_tree_rss(self):
+        assert get_process_tree_rss_kb(os.getpid()) > 0
@@ -0,0 +1,63 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from python.release.archive_writer import ArchiveWriter, read_archive
+from python.release.seekable_zstd import read_seek_table, read_index, extract_members
+
+pytestmark = pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+
+
+def write_release(archive, frame_size):
+    with ArchiveWriter(archive, "zstd", level=1, threads=1, frame_size=frame_size) as writer:
+        writer.add_dir("prj")
+        for comp in ["hadoop", "hive", "spark"]:
+            writer.add_dir(f"prj/rpms/{comp}")
+            writer.add_bytes(f"prj/rpms/{comp}/{comp}.rpm", os.urandom(64 * 1024))
+        writer.add_bytes("prj/README", b"readme")
+
+
+class TestSeekableZstd:
+
+    #  a seekable release is still a plain tar.zst for zstd -d and tar
+    def test_plain_zstd_compatible(self, tmp_path):
+        archive = str(tmp_path / "release.tar.zst")
+        write_release(archive, 32 * 1024)
+
+        subprocess.run(["tar", "-I", "zstd", "-xf", archive, "-C", str(tmp_path)], check=True)
+
+        assert (tmp_path / "prj" / "README").read_bytes() == b"readme"
+        with read_archive(archive) as tar:
+            assert len([member for member in tar]) == 8
+
+    #  frames are cut at members and the index lists every member in the decompressed stream
+    def test_index(self, tmp_path):
+        archive = str(tmp_path / "release.tar.zst")
+        write_release(archive, 32 * 1024)
+
+        frames = read_seek_table(archive)
+        index = read_index(archive, frames)
+
+        assert len([frame for frame in frames if frame[3] > 0]) > 1
+        assert [name for name, _, _ in index][:3] == ["prj", "prj/rpms/hadoop", "prj/rpms/hadoop/hadoop.rpm"]
+        assert all(end > start for _, start, end in index)
+
+    #  only the selected members are extracted, including members split across frames
+    def test_extract_members(self, tmp_path):
+        archive = str(tmp_path / "release.tar.zst")
+        with ArchiveWriter(archive, "zstd", level=1, threads=1, frame_size=1) as writer:
+            writer.seekable.max_frame_size = 16 * 1024
+            writer.add_bytes("prj/rpms/hive/hive.rpm", os.urandom(64 * 1024))
+            writer.add_bytes("prj/rpms/spark/spark.rpm", b"spark")
+            writer.add_bytes("prj/rpms/spark/spark-sql.rpm", os.urandom(40 * 1024))
+
+        dest = tmp_path / "out"
+        dest.mkdir()
+        count = extract_members(archive, lambda name: name.startswith("prj/rpms/spark/"), str(dest))
+
+        assert count == 2
+        assert (dest / "prj" / "rpms" / "spark" / "spark.rpm").read_bytes() == b"spark"
+        assert os.path.getsize(str(dest / "prj" / "rpms" / "spark" / "spark-sql.rpm")) == 40 * 1024
+        assert not (dest / "prj" / "rpms" / "hive").exists()
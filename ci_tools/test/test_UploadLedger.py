@@ -0,0 +1,20 @@
+import json
+
+from python.nexus.upload_ledger import UploadLedger
+
+
+class TestUploadLedger:
+
+    #  failures are kept across runs until the package is uploaded
+    def test_failures_survive_until_uploaded(self, tmp_path):
+        ledger_file = str(tmp_path / "failures.json")
+        items = [("/out/a.rpm", "yum", "/udh3/Packages/a"), ("/out/b.rpm", "yum", "/udh3/Packages/b")]
+        UploadLedger(ledger_file).update(items, items[1:], {"/out/b.rpm": 503})
+
+        ledger = UploadLedger(ledger_file)
+        assert ledger.get_failed_items() == [items[1]]
+        with open(ledger_file) as f:
+            assert json.load(f)[0]["status"] == 503
+
+        ledger.update(items[1:], [])
+        assert UploadLedger(ledger_file).get_failed_items() == []